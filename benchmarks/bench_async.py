@@ -0,0 +1,60 @@
+"""
+Benchmark of `async def` python actions: `n_tasks` tasks each wait for `io_ms` of simulated I/O (`asyncio.sleep`).
+With doit threads, the coroutines of several tasks overlap on the shared event loop.
+
+    python benchmarks/bench_async.py [n_tasks] [io_ms] [n_threads]
+"""
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+from timeit import default_timer
+
+from doit.doit_cmd import DoitMain
+
+from doit_api import doit_config, task, taskgen
+from doit_api.loader import DoitApiTaskLoader
+
+
+def make_namespace(root, n_tasks, io_ms, use_async):
+    async def fetch_async(i):
+        await asyncio.sleep(io_ms / 1000.)
+
+    def fetch_sync(i):
+        time.sleep(io_ms / 1000.)
+
+    @taskgen
+    def fetch_all():
+        for i in range(n_tasks):
+            yield task(name="f%s" % i, actions=[(fetch_async if use_async else fetch_sync, [i])],
+                       tell_why_am_i_running=False)
+
+    return dict(fetch_all=fetch_all, DOIT_CONFIG=doit_config(dep_file=os.path.join(root, "deps.db"), backend='json'))
+
+
+def run(namespace, args):
+    start = default_timer()
+    assert DoitMain(DoitApiTaskLoader(namespace)).run(['run', '--reporter', 'zero'] + args) == 0
+    return default_timer() - start
+
+
+if __name__ == '__main__':
+    n_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    io_ms = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    n_threads = int(sys.argv[3]) if len(sys.argv) > 3 else 16
+
+    print("%s tasks, %sms of I/O each" % (n_tasks, io_ms))
+    root = tempfile.mkdtemp()
+    try:
+        for use_async in (False, True):
+            namespace = make_namespace(root, n_tasks, io_ms, use_async)
+            serial = run(namespace, [])
+            threaded = run(namespace, ['-n', str(n_threads), '-P', 'thread'])
+            # (python actions executed in doit threads swap sys.stdout in any order: restore it)
+            sys.stdout = sys.__stdout__
+            print("  %-5s  serial: %.2fs   %s threads: %.2fs"
+                  % ("async" if use_async else "sync", serial, n_threads, threaded))
+    finally:
+        shutil.rmtree(root)
@@ -0,0 +1,56 @@
+"""
+Benchmark of the 'async' parallel type: `n_tasks` command tasks each wait for `io_ms` (`sleep`), and are run with
+`n_tasks` threads (`-P thread`) or on one event loop (`-P async`). The peak number of threads is printed too (the
+thread runner starts one per task in progress, plus two per command to read its outputs).
+
+    python benchmarks/bench_async_runner.py [n_tasks] [io_ms]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from timeit import default_timer
+
+from doit.doit_cmd import DoitMain
+
+from doit_api import doit_config, task, taskgen
+from doit_api.loader import DoitApiTaskLoader
+
+
+def make_namespace(root, n_tasks, io_ms):
+    @taskgen
+    def fetch_all():
+        for i in range(n_tasks):
+            yield task(name="f%s" % i, actions=["sleep %s && echo done" % (io_ms / 1000.)], tell_why_am_i_running=False)
+
+    return dict(fetch_all=fetch_all, DOIT_CONFIG=doit_config(dep_file=os.path.join(root, "deps.db"), backend='json'))
+
+
+if __name__ == '__main__':
+    n_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    io_ms = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+    print("%s tasks, %sms of I/O each" % (n_tasks, io_ms))
+    root = tempfile.mkdtemp()
+    try:
+        namespace = make_namespace(root, n_tasks, io_ms)
+        for par_type in ('thread', 'async'):
+            peak = [threading.active_count()]
+            stop = threading.Event()
+
+            def monitor():
+                while not stop.wait(0.01):
+                    peak[0] = max(peak[0], threading.active_count())
+
+            t = threading.Thread(target=monitor)
+            t.start()
+            start = default_timer()
+            assert DoitMain(DoitApiTaskLoader(namespace)).run(['run', '--reporter', 'zero', '-n', str(n_tasks),
+                                                               '-P', par_type]) == 0
+            elapsed = default_timer() - start
+            stop.set()
+            t.join()
+            print("  -P %-6s  %.2fs   peak threads: %s" % (par_type, elapsed, peak[0]))
+    finally:
+        shutil.rmtree(root)
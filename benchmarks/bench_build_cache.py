@@ -0,0 +1,67 @@
+"""
+Benchmark of the build cache (`cache=True`): `n_tasks` tasks compress their input file. The inputs are modified (as
+when switching to another branch) and then restored (switching back): without the cache all tasks run again, with the
+cache their targets are restored.
+
+    python benchmarks/bench_build_cache.py [n_tasks] [input_kb]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import zlib
+from timeit import default_timer
+
+from doit.doit_cmd import DoitMain
+
+from doit_api import doit_config, task, taskgen
+from doit_api.loader import DoitApiTaskLoader
+
+
+def compress(dependencies, targets):
+    with open(dependencies[0], 'rb') as f:
+        data = f.read()
+    with open(targets[0], 'wb') as f:
+        f.write(zlib.compress(data * 8, 9))
+
+
+def make_namespace(root, n_tasks, cache):
+    @taskgen
+    def compress_all():
+        for i in range(n_tasks):
+            yield task(name="c%s" % i, actions=[compress], file_dep=[os.path.join(root, "in%s" % i)],
+                       targets=[os.path.join(root, "out%s.z" % i)], cache=cache, tell_why_am_i_running=False)
+
+    return dict(compress_all=compress_all,
+                DOIT_CONFIG=doit_config(build_cache_dir=os.path.join(root, "cache"),
+                                        dep_file=os.path.join(root, "deps.db"), backend='json'))
+
+
+def write_inputs(root, n_tasks, input_kb, version):
+    for i in range(n_tasks):
+        with open(os.path.join(root, "in%s" % i), 'wb') as f:
+            f.write(("%s-%s" % (version, i)).encode('ascii') * (input_kb * 100))
+
+
+def run(namespace):
+    start = default_timer()
+    assert DoitMain(DoitApiTaskLoader(namespace)).run(['run', '--reporter', 'zero']) == 0
+    return default_timer() - start
+
+
+if __name__ == '__main__':
+    n_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    input_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+
+    print("%s tasks, inputs of ~%sKB" % (n_tasks, input_kb))
+    for cache in (False, True):
+        root = tempfile.mkdtemp()
+        try:
+            namespace = make_namespace(root, n_tasks, cache)
+            times = []
+            for version in ("main", "branch", "main"):
+                write_inputs(root, n_tasks, input_kb, version)
+                times.append(run(namespace))
+            print("  cache=%-5s  build: %.2fs   switch branch: %.2fs   switch back: %.2fs" % ((cache,) + tuple(times)))
+        finally:
+            shutil.rmtree(root)
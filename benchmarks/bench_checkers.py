@@ -0,0 +1,48 @@
+"""
+Benchmark of the doit_api `FastChecker` against doit's default `MD5Checker`, on a large data file:
+
+ - "unchanged": the file was not touched since the last run (no hashing with both checkers)
+ - "touched": the modification time changed but not the contents, e.g. after a checkout (both checkers hash it)
+ - "get_state": computing the state to save after a task execution
+
+    python benchmarks/bench_checkers.py [size_mb]
+"""
+import os
+import sys
+import tempfile
+from timeit import default_timer
+
+from doit.dependency import MD5Checker
+
+from doit_api.checkers import FastChecker, DEFAULT_DIGEST
+
+
+def timed(f, *args):
+    start = default_timer()
+    res = f(*args)
+    return default_timer() - start, res
+
+
+if __name__ == '__main__':
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+
+    fd, path = tempfile.mkstemp()
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            chunk = os.urandom(1024 * 1024)
+            for _ in range(size_mb):
+                f.write(chunk)
+
+        print("%sMB file, fast digest: %s" % (size_mb, DEFAULT_DIGEST))
+        for checker in (MD5Checker(), FastChecker()):
+            t_state, state = timed(checker.get_state, path, None)
+            t_same, modified = timed(checker.check_modified, path, os.stat(path), state)
+            assert not modified
+            st = os.stat(path)
+            os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+            t_touched, modified = timed(checker.check_modified, path, os.stat(path), state)
+            assert not modified
+            print("  %-12s get_state %.0fms (%.2fGB/s), unchanged %.3fms, touched %.0fms"
+                  % (type(checker).__name__, t_state * 1e3, size_mb / 1024 / t_state, t_same * 1e3, t_touched * 1e3))
+    finally:
+        os.remove(path)
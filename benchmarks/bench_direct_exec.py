@@ -0,0 +1,64 @@
+"""
+Benchmark of the per-command spawn latency of `direct_exec`: a simple command (`cp a b`) is executed with a shell
+(`Popen(cmd, shell=True)`) or directly (`Popen(argv)`), and then `n_tasks` `@cmdtask` tasks running such commands (two
+lines each) are executed by doit with `direct_exec=False` (the default) or `direct_exec=True`.
+
+    python benchmarks/bench_direct_exec.py [n_tasks]
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from timeit import default_timer
+
+from doit.doit_cmd import DoitMain
+
+from doit_api import cmdtask, doit_config, taskgen
+from doit_api.loader import DoitApiTaskLoader
+
+
+def make_namespace(root, n_tasks, direct_exec):
+    @taskgen
+    def copies():
+        for i in range(n_tasks):
+            @cmdtask(name="c%s" % i, tell_why_am_i_running=False, direct_exec=direct_exec)
+            def copy():
+                return """
+                cp a.txt b.txt
+                cp b.txt c.txt
+                """
+            yield copy
+
+    return dict(copies=copies, DOIT_CONFIG=doit_config(dep_file=os.path.join(root, "deps.db"), backend='json'))
+
+
+if __name__ == '__main__':
+    n_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    n_spawns = 1000
+
+    root = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    os.chdir(root)
+    try:
+        with open("a.txt", "w") as f:
+            f.write("a")
+
+        print("spawn latency of 'cp a.txt b.txt' (%s commands)" % n_spawns)
+        for label, cmd, shell in (("shell", "cp a.txt b.txt", True), ("direct", ["cp", "a.txt", "b.txt"], False)):
+            start = default_timer()
+            for _ in range(n_spawns):
+                subprocess.check_call(cmd, shell=shell)
+            elapsed = default_timer() - start
+            print("  %-8s  %.3fms per command" % (label, elapsed * 1000 / n_spawns))
+
+        print("%s @cmdtask tasks with 2 commands" % n_tasks)
+        for direct_exec in (False, True):
+            namespace = make_namespace(root, n_tasks, direct_exec)
+            start = default_timer()
+            assert DoitMain(DoitApiTaskLoader(namespace)).run(['run', '--reporter', 'zero']) == 0
+            elapsed = default_timer() - start
+            print("  direct_exec=%-5s  %.2fs   (%.2fms per task)" % (direct_exec, elapsed, elapsed * 1000 / n_tasks))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(root)
@@ -0,0 +1,72 @@
+"""
+Benchmark of `early_cutoff=True`: a "generate" task writes a header from a source file, and `n_tasks` tasks depend
+on the header. A comment is then edited in the source: the header is regenerated byte-identical, so with early cutoff
+none of the dependents runs again.
+
+    python benchmarks/bench_early_cutoff.py [n_tasks] [task_ms] [checker]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from timeit import default_timer
+
+from doit.doit_cmd import DoitMain
+
+from doit_api import doit_config, task, taskgen
+from doit_api.loader import DoitApiTaskLoader
+
+
+def generate(dependencies, targets):
+    with open(dependencies[0]) as f:
+        lines = [line for line in f if not line.startswith('#')]
+    with open(targets[0], 'w') as f:
+        f.writelines(lines)
+
+
+def make_namespace(root, n_tasks, task_ms, early_cutoff, checker):
+    header = os.path.join(root, "header.h")
+
+    def compile_(targets):
+        time.sleep(task_ms / 1000.)
+        with open(targets[0], 'w') as f:
+            f.write("ok")
+
+    @taskgen
+    def compile_all():
+        for i in range(n_tasks):
+            yield task(name="c%s" % i, actions=[compile_], file_dep=[header],
+                       targets=[os.path.join(root, "out%s" % i)], tell_why_am_i_running=False)
+
+    return dict(generate=task(name="generate", actions=[generate], file_dep=[os.path.join(root, "src.txt")],
+                              targets=[header], early_cutoff=early_cutoff, tell_why_am_i_running=False),
+                compile_all=compile_all,
+                DOIT_CONFIG=doit_config(check_file_uptodate=checker, dep_file=os.path.join(root, "deps.db"),
+                                        backend='json'))
+
+
+def run(namespace):
+    start = default_timer()
+    assert DoitMain(DoitApiTaskLoader(namespace)).run(['run', '--reporter', 'zero']) == 0
+    return default_timer() - start
+
+
+if __name__ == '__main__':
+    n_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    task_ms = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    checker = sys.argv[3] if len(sys.argv) > 3 else 'timestamp'
+
+    print("%s dependent tasks of %sms, checker=%s" % (n_tasks, task_ms, checker))
+    for early_cutoff in (False, True):
+        root = tempfile.mkdtemp()
+        try:
+            namespace = make_namespace(root, n_tasks, task_ms, early_cutoff, checker)
+            times = []
+            for comment in ("# v1\n", "# v2\n"):
+                with open(os.path.join(root, "src.txt"), 'w') as f:
+                    f.write(comment + "int x;\n")
+                times.append(run(namespace))
+            print("  early_cutoff=%-5s  build: %.2fs   comment edit: %.2fs" % ((early_cutoff,) + tuple(times)))
+        finally:
+            shutil.rmtree(root)
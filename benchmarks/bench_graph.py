@@ -0,0 +1,48 @@
+"""
+Benchmark of the dependency graph analysis on a large synthetic graph: each task depends on a few random tasks
+defined before it (task_dep) and on the target of another one (file_dep).
+
+    python benchmarks/bench_graph.py [n_tasks]
+"""
+import random
+import sys
+from timeit import default_timer
+
+from doit_api.graph import TaskGraph
+
+
+def make_task_dicts(n, seed=0):
+    rnd = random.Random(seed)
+    tasks = []
+    for i in range(n):
+        deps = ["t%s" % rnd.randrange(i) for _ in range(3)] if i > 0 else []
+        file_dep = ["t%s.out" % rnd.randrange(i)] if i > 0 else []
+        tasks.append(dict(basename="t%s" % i, actions=[], task_dep=deps, file_dep=file_dep, targets=["t%s.out" % i]))
+    return tasks
+
+
+def timed(f, *args):
+    start = default_timer()
+    res = f(*args)
+    return default_timer() - start, res
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    tasks = make_task_dicts(n)
+
+    t_build, graph = timed(TaskGraph.from_tasks, tasks)
+    t_cycles, cycles = timed(graph.find_cycles)
+    t_levels, levels = timed(graph.levels)
+    t_crit, (crit_len, _) = timed(graph.critical_path)
+    assert cycles == []
+    print("%s tasks: build %.0fms, cycles %.0fms, levels %.0fms (%s levels, max parallelism %s), "
+          "critical path %.0fms (length %s)"
+          % (n, t_build * 1e3, t_cycles * 1e3, t_levels * 1e3, len(levels), graph.max_parallelism(),
+             t_crit * 1e3, crit_len))
+
+    # a cycle is found as fast
+    tasks[0]['task_dep'] = ["t%s" % (n - 1)]
+    graph = TaskGraph.from_tasks(tasks)
+    t_cycles, cycles = timed(graph.find_cycles)
+    print("with a cycle: found %s cycle(s) in %.0fms" % (len(cycles), t_cycles * 1e3))
@@ -0,0 +1,51 @@
+"""
+Benchmark of `output_limit`: a command task prints `size_mb` MB of log lines, and the peak memory (max RSS) of the doit
+process is measured with all the output captured in memory, or with only its last 64KB (the full output being written
+to a spill file). Each run is executed in a new process.
+
+    python benchmarks/bench_output_limit.py [size_mb]
+"""
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+from timeit import default_timer
+
+
+def run_doit(root, size_mb, output_limit):
+    """Executed in the child process: runs the task and prints the max RSS"""
+    from doit.doit_cmd import DoitMain
+
+    from doit_api import doit_config, task
+    from doit_api.loader import DoitApiTaskLoader
+
+    n_lines = size_mb * 1024 * 1024 // 64
+    cmd = "%s -c \"import sys; [sys.stdout.write('x' * 63 + chr(10)) for _ in range(%s)]\"" % (sys.executable, n_lines)
+    namespace = dict(
+        DOIT_CONFIG=doit_config(dep_file=os.path.join(root, "deps.db"), backend='json', verbosity=0),
+        logs=task(name="logs", actions=[cmd], output_limit=output_limit, tell_why_am_i_running=False),
+    )
+    os.chdir(root)
+    assert DoitMain(DoitApiTaskLoader(namespace)).run(['run', '--reporter', 'zero']) == 0
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        run_doit(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]))
+        sys.exit(0)
+
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print("%sMB of output" % size_mb)
+    root = tempfile.mkdtemp()
+    try:
+        for label, output_limit in (("in memory", 0), ("output_limit=64KB", 64 * 1024)):
+            start = default_timer()
+            rss_kb = int(subprocess.check_output([sys.executable, __file__, '--child', root, str(size_mb),
+                                                  str(output_limit)]))
+            elapsed = default_timer() - start
+            print("  %-18s  %.2fs   peak memory: %sMB" % (label, elapsed, rss_kb // 1024))
+    finally:
+        shutil.rmtree(root)
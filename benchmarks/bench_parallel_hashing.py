@@ -0,0 +1,64 @@
+"""
+Benchmark of the concurrent hashing of file dependencies (`hash_workers` in `doit_config`): hashing many small files
+and a few large files one at a time with `FastChecker.get_state`, or in advance with `prefetch_digests` and a pool
+of threads. Note that the speedup depends on the number of cores and on the storage.
+
+    python benchmarks/bench_parallel_hashing.py [n_small] [n_large] [large_mb]
+"""
+import os
+import shutil
+import sys
+import tempfile
+from timeit import default_timer
+
+from doit_api import checkers
+from doit_api.checkers import FastChecker, prefetch_digests
+
+
+def make_files(root, n_small, n_large, large_mb):
+    paths = []
+    for i in range(n_small):
+        d = os.path.join(root, "d%s" % (i // 1000))
+        if i % 1000 == 0:
+            os.mkdir(d)
+        p = os.path.join(d, "s%s" % i)
+        with open(p, 'wb') as f:
+            f.write(os.urandom(1024))
+        paths.append(p)
+    chunk = os.urandom(1024 * 1024)
+    for i in range(n_large):
+        p = os.path.join(root, "large%s" % i)
+        with open(p, 'wb') as f:
+            for _ in range(large_mb):
+                f.write(chunk)
+        paths.append(p)
+    return paths
+
+
+if __name__ == '__main__':
+    n_small = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    n_large = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    large_mb = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+
+    root = tempfile.mkdtemp()
+    try:
+        paths = make_files(root, n_small, n_large, large_mb)
+        print("%s small files (1KB) + %s large files (%sMB), %s cpus, digest %s"
+              % (n_small, n_large, large_mb, os.cpu_count(), checkers.DEFAULT_DIGEST))
+
+        checker = FastChecker()
+        start = default_timer()
+        ref = [checker.get_state(p, None) for p in paths]
+        t_serial = default_timer() - start
+        print("  serial:    %.2fs" % t_serial)
+
+        for workers in (1, 2, 4, 8, 16):
+            checkers.get_signature_cache().clear()
+            start = default_timer()
+            prefetch_digests(paths, workers)
+            states = [checker.get_state(p, None) for p in paths]
+            elapsed = default_timer() - start
+            assert states == ref
+            print("  %2s threads: %.2fs (x%.1f)" % (workers, elapsed, t_serial / elapsed))
+    finally:
+        shutil.rmtree(root)
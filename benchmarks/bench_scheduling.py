@@ -0,0 +1,47 @@
+"""
+Wall-clock benchmark of `doit run -n <workers>` with the default (definition order) scheduling and with
+`scheduling='critical_path'`: many short tasks are defined first, and a long chain of tasks is defined last.
+
+    python benchmarks/bench_scheduling.py [n_workers]
+"""
+import os
+import sys
+import tempfile
+from timeit import default_timer
+
+from doit.doit_cmd import DoitMain
+
+from doit_api import doit_config, task, taskgen
+from doit_api.loader import DoitApiTaskLoader
+
+
+def make_namespace(n_workers, **config):
+    @taskgen
+    def short():
+        for i in range(n_workers * 4):
+            yield task(name="s%s" % i, actions=["sleep 0.1"], uptodate=[False], cost=0.1)
+
+    chain = []
+    for i in range(3):
+        chain.append(task(name="long%s" % i, actions=["sleep 0.3"], uptodate=[False], cost=0.3,
+                          task_dep=chain[-1:]))
+
+    namespace = dict(short=short, DOIT_CONFIG=doit_config(**config))
+    namespace.update((t.name, t) for t in chain)
+    return namespace
+
+
+def bench(n_workers, **config):
+    dep_file = os.path.join(tempfile.mkdtemp(), "doit_db")
+    start = default_timer()
+    res = DoitMain(DoitApiTaskLoader(make_namespace(n_workers, **config))).run(
+        ['run', '-n', str(n_workers), '-P', 'thread', '--db-file', dep_file, '--reporter', 'zero'])
+    assert res == 0
+    return default_timer() - start
+
+
+if __name__ == '__main__':
+    n_workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    t_def = bench(n_workers)
+    t_crit = bench(n_workers, scheduling='critical_path')
+    print("%s workers: definition order %.2fs, critical path first %.2fs (ideal: 0.90s)" % (n_workers, t_def, t_crit))
@@ -0,0 +1,61 @@
+"""
+Benchmark of `shell_session` and `env_profile`: `n_tasks` tiny command tasks each need an environment set up by
+sourcing `env.sh` (that starts a python interpreter, as environment activation scripts often do). By default each
+command spawns a shell and sources the script. With `env_profile` the script is sourced once and the commands are
+started with the environment it produced (cached on disk), and with `shell_session` the script is sourced once by each
+session and the commands run in subshells of it.
+
+    python benchmarks/bench_shell_session.py [n_tasks]
+"""
+import os
+import shutil
+import sys
+import tempfile
+from timeit import default_timer
+
+from doit.doit_cmd import DoitMain
+
+from doit_api import doit_config, task, taskgen
+from doit_api.loader import DoitApiTaskLoader
+from doit_api.shells import close_sessions
+
+ENV_SH = """
+export TOOL_HOME="$(%s -c 'import sys; print(sys.prefix)')"
+export PATH="$TOOL_HOME/bin:$PATH"
+""" % sys.executable
+
+
+def make_namespace(root, n_tasks, mode):
+    @taskgen
+    def small():
+        for i in range(n_tasks):
+            if mode is None:
+                yield task(name="t%s" % i, actions=[". ./env.sh && test -n \"$TOOL_HOME\""],
+                           tell_why_am_i_running=False)
+            else:
+                yield task(name="t%s" % i, actions=["test -n \"$TOOL_HOME\""], tell_why_am_i_running=False,
+                           **{mode: ". ./env.sh"})
+
+    return dict(small=small, DOIT_CONFIG=doit_config(dep_file=os.path.join(root, "deps.db"), backend='json'))
+
+
+if __name__ == '__main__':
+    n_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    print("%s command tasks sourcing env.sh" % n_tasks)
+    root = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    os.chdir(root)
+    try:
+        with open("env.sh", "w") as f:
+            f.write(ENV_SH)
+        for label, mode in (("new shells", None), ("env_profile", 'env_profile'), ("shell_session", 'shell_session')):
+            namespace = make_namespace(root, n_tasks, mode)
+            start = default_timer()
+            assert DoitMain(DoitApiTaskLoader(namespace)).run(['run', '--reporter', 'zero']) == 0
+            elapsed = default_timer() - start
+            print("  %-14s  %.2fs   (%.2fms per task)" % (label, elapsed, elapsed * 1000 / n_tasks))
+        close_sessions()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(root)
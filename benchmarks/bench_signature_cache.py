@@ -0,0 +1,67 @@
+"""
+Benchmark of the signature cache (`signature_cache` in `doit_config`): `n_tasks` tasks depend on the same
+`n_headers` files, that were all touched (for example by a checkout) so that their contents must be checked. Without
+a shared cache, each task hashes each header again. With the cache, each header is hashed once per run, and not at
+all in the next run if the cache was saved.
+
+    python benchmarks/bench_signature_cache.py [n_tasks] [n_headers] [header_kb]
+"""
+import os
+import shutil
+import sys
+import tempfile
+from timeit import default_timer
+
+from doit_api import checkers
+from doit_api.checkers import FastChecker, SignatureCache, set_signature_cache
+
+
+def check_all(checker, headers, states, n_tasks, shared):
+    """Checks the headers for each task, as doit does. Returns the number of tasks to run"""
+    n_modified = 0
+    for _ in range(n_tasks):
+        if not shared:
+            checkers.get_signature_cache().clear()
+        if any(checker.check_modified(h, os.stat(h), s) for h, s in zip(headers, states)):
+            n_modified += 1
+    return n_modified
+
+
+if __name__ == '__main__':
+    n_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    n_headers = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    header_kb = int(sys.argv[3]) if len(sys.argv) > 3 else 64
+
+    root = tempfile.mkdtemp()
+    try:
+        headers = []
+        for i in range(n_headers):
+            p = os.path.join(root, "h%s.h" % i)
+            with open(p, 'wb') as f:
+                f.write(os.urandom(header_kb * 1024))
+            headers.append(p)
+        checker = FastChecker()
+        states = [checker.get_state(h, None) for h in headers]
+        for h in headers:
+            os.utime(h, ns=(0, 10 ** 18))
+        print("%s tasks x %s headers (%sKB), all touched" % (n_tasks, n_headers, header_kb))
+
+        for label, shared in (("no shared cache", False), ("shared cache", True)):
+            set_signature_cache(SignatureCache())
+            start = default_timer()
+            assert check_all(checker, headers, states, n_tasks, shared) == 0
+            print("  %-26s %.3fs" % (label + ":", default_timer() - start))
+
+        # next run: load the cache saved by the previous one
+        cache_file = os.path.join(root, "signatures.json")
+        cache = checkers.get_signature_cache()
+        cache.path = cache_file
+        cache.save()
+        start = default_timer()
+        loaded = SignatureCache(cache_file)
+        loaded.load()
+        set_signature_cache(loaded)
+        assert check_all(checker, headers, states, n_tasks, True) == 0
+        print("  %-26s %.3fs" % ("next run, cache reloaded:", default_timer() - start))
+    finally:
+        shutil.rmtree(root)
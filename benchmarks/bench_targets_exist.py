@@ -0,0 +1,54 @@
+"""
+Benchmark of the target existence check of `why_am_i_running`: one `os.path.exists` call per target, or
+`find_missing_path` (directory listings for the directories containing many targets). Two cases are measured: tasks
+declaring thousands of targets in a few directories, and tasks declaring a single target in a large directory.
+
+    python benchmarks/bench_targets_exist.py [n_targets] [n_tasks]
+"""
+import os
+import shutil
+import sys
+import tempfile
+from timeit import default_timer
+
+from doit_api.utils import find_missing_path
+
+
+def exists_loop(paths):
+    for p in paths:
+        if not os.path.exists(p):
+            return p
+    return None
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    n_tasks = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    root = tempfile.mkdtemp()
+    try:
+        targets = []
+        for d in range(4):
+            os.mkdir(os.path.join(root, "d%s" % d))
+        for i in range(n):
+            p = os.path.join(root, "d%s" % (i % 4), "t%s.o" % i)
+            open(p, 'w').close()
+            targets.append(p)
+
+        for name, f in (("os.path.exists loop", exists_loop), ("find_missing_path", find_missing_path)):
+            start = default_timer()
+            for _ in range(n_tasks):
+                assert f(targets) is None
+            elapsed = default_timer() - start
+            print("%s: %s tasks x %s targets in %.1fms (%.2fus/target)"
+                  % (name, n_tasks, n, elapsed * 1e3, elapsed / (n * n_tasks) * 1e6))
+
+        for name, f in (("os.path.exists loop", exists_loop), ("find_missing_path", find_missing_path)):
+            start = default_timer()
+            for i in range(n_tasks):
+                assert f([targets[i]]) is None
+            elapsed = default_timer() - start
+            print("%s: %s tasks x 1 target in a directory of %s files in %.1fms (%.2fus/target)"
+                  % (name, n_tasks, n // 4, elapsed * 1e3, elapsed / n_tasks * 1e6))
+    finally:
+        shutil.rmtree(root)
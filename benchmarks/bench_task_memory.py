@@ -0,0 +1,31 @@
+"""
+Memory benchmark: bytes used per `task` object, as created in a `@taskgen` generator.
+
+    python benchmarks/bench_task_memory.py [n_tasks]
+"""
+import gc
+import sys
+import tracemalloc
+
+from doit_api import task
+
+
+def bytes_per_task(n):
+    # create the inputs beforehand so that only the task objects are measured
+    names = ["subtask%s" % i for i in range(n)]
+    actions = ["echo hi"]
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tasks = [task(name=name, actions=actions) for name in names]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    assert len(tasks) == n
+    return (after - before) / float(n)
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print("%s tasks: %.1f bytes per task" % (n, bytes_per_task(n)))
@@ -0,0 +1,60 @@
+"""
+Load-time benchmark: evaluating many slow and independent `@taskgen` generators serially, or concurrently with the
+`taskgen_workers` option of the `DoitApiTaskLoader`. Each generator simulates an I/O-bound scan (a sleep followed by
+a directory listing) or a CPU-bound computation.
+
+    python benchmarks/bench_taskgen_workers.py [n_generators] [io|cpu]
+"""
+import os
+import sys
+import time
+from timeit import default_timer
+
+from doit_api import doit_config, task, taskgen
+from doit_api.loader import DoitApiTaskLoader
+
+
+class _Cmd(object):
+    name = 'list'
+    execute_tasks = False
+
+
+def make_namespace(n, kind, **config):
+    def make_gen(i):
+        def gen():
+            if kind == 'io':
+                time.sleep(0.05)
+                files = sorted(os.listdir('.'))
+            else:
+                files = [str(sum(j * j for j in range(200000)))]
+            for f in files:
+                yield task(name=f, actions=["echo %s %s" % (i, f)])
+        gen.__name__ = "gen%s" % i
+        return taskgen(gen)
+
+    namespace = dict(("gen%s" % i, make_gen(i)) for i in range(n))
+    namespace['DOIT_CONFIG'] = doit_config(**config)
+    return namespace
+
+
+def bench(n, kind, **config):
+    loader = DoitApiTaskLoader(make_namespace(n, kind, **config))
+    loader.setup({})
+    loader.load_doit_config()
+    start = default_timer()
+    tasks = loader.load_tasks(_Cmd(), [])
+    elapsed = default_timer() - start
+    return elapsed, [t.name for t in tasks]
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    kind = sys.argv[2] if len(sys.argv) > 2 else 'io'
+    executor = 'thread' if kind == 'io' else 'process'
+
+    t_serial, ref_names = bench(n, kind)
+    print("%s %s-bound generators, serial: %.2fs" % (n, kind, t_serial))
+    for workers in (1, 2, 4, 8):
+        t, names = bench(n, kind, taskgen_workers=workers, taskgen_executor=executor)
+        assert names == ref_names
+        print("  %s workers (%s): %.2fs (x%.1f)" % (workers, executor, t, t_serial / t))
@@ -0,0 +1,52 @@
+"""
+Load-time benchmark: creating many file-level subtasks in a `@taskgen`, with one `task` per subtask or with a single
+`tasktable`. The time includes the creation of the doit `Task` objects by doit.
+
+    python benchmarks/bench_tasktable.py [n_subtasks]
+"""
+import sys
+from timeit import default_timer
+
+from doit.loader import load_tasks
+
+from doit_api import task, taskgen, tasktable
+
+
+def make_namespace(n, use_table):
+    files = ["src/file%s.c" % i for i in range(n)]
+
+    if use_table:
+        @taskgen
+        def compile():
+            """ compile all """
+            yield tasktable(names=files,
+                            actions=[["gcc -c %s" % f] for f in files],
+                            file_dep=[[f] for f in files],
+                            targets=[[f[:-2] + ".o"] for f in files],
+                            uptodate=[True], verbosity=0, title="compiling")
+    else:
+        @taskgen
+        def compile():
+            """ compile all """
+            for f in files:
+                yield task(name=f, actions=["gcc -c %s" % f], file_dep=[f], targets=[f[:-2] + ".o"],
+                           uptodate=[True], verbosity=0, title="compiling")
+
+    return dict(compile=compile)
+
+
+def bench(n, use_table):
+    namespace = make_namespace(n, use_table)
+    start = default_timer()
+    tasks = load_tasks(namespace)
+    elapsed = default_timer() - start
+    assert len(tasks) == n + 1
+    return elapsed
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    t_tasks = bench(n, use_table=False)
+    t_table = bench(n, use_table=True)
+    print("%s subtasks: one task per subtask %.2fs (%.1fus/subtask), tasktable %.2fs (%.1fus/subtask)"
+          % (n, t_tasks, t_tasks / n * 1e6, t_table, t_table / n * 1e6))
@@ -1,21 +1,64 @@
-from .main import why_am_i_running, title_with_actions, task, taskgen, pytask, cmdtask, doit_config
-
-try:
-    # -- Distribution mode --
-    # import from _version.py generated by setuptools_scm during release
-    from ._version import version as __version__
-except ImportError:
-    # -- Source mode --
-    # use setuptools_scm to get the current version from src using git
-    from setuptools_scm import get_version as _gv
-    from os import path as _path
-    __version__ = _gv(_path.join(_path.dirname(__file__), _path.pardir))
-
+import sys as _sys
 
 __all__ = [
     '__version__',
     # submodules
     'main',
     # symbols
-    'task', 'taskgen', 'pytask', 'cmdtask', 'why_am_i_running', 'doit_config'
+    'task', 'taskgen', 'tasktable', 'pytask', 'cmdtask', 'why_am_i_running', 'doit_config'
 ]
+
+# public symbols and the submodule where they are defined. They are only imported when first accessed, so that
+# `import doit_api` stays cheap (every `doit list` pays for it before doing anything useful).
+_LAZY_SYMBOLS = {
+    'why_am_i_running': 'main',
+    'title_with_actions': 'main',
+    'task': 'main',
+    'taskgen': 'main',
+    'tasktable': 'main',
+    'pytask': 'main',
+    'cmdtask': 'main',
+    'doit_config': 'main',
+}
+
+
+def _get_version():
+    """Returns the version of this package. Note that in source mode this calls git, so it is slow."""
+    try:
+        # -- Distribution mode --
+        # import from _version.py generated by setuptools_scm during release
+        from ._version import version
+    except ImportError:
+        # -- Source mode --
+        # use setuptools_scm to get the current version from src using git
+        from setuptools_scm import get_version as _gv
+        from os import path as _path
+        version = _gv(_path.join(_path.dirname(__file__), _path.pardir))
+    return version
+
+
+if _sys.version_info >= (3, 7):
+    # -- Lazy mode -- (PEP 562 module-level __getattr__)
+    def __getattr__(name):
+        if name == '__version__':
+            value = _get_version()
+        elif name in _LAZY_SYMBOLS:
+            from importlib import import_module
+            value = getattr(import_module('.' + _LAZY_SYMBOLS[name], __name__), name)
+        elif name == 'main':
+            from importlib import import_module
+            value = import_module('.main', __name__)
+        else:
+            raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+        # cache it so that next access does not go through here
+        globals()[name] = value
+        return value
+
+    def __dir__():
+        return sorted(set(globals()) | set(__all__) | set(_LAZY_SYMBOLS))
+
+else:
+    # -- Eager mode -- (no module-level __getattr__ on older pythons)
+    from .main import why_am_i_running, title_with_actions, task, taskgen, tasktable, pytask, cmdtask, doit_config
+    __version__ = _get_version()
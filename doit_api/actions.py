@@ -0,0 +1,772 @@
+"""
+doit actions wrapping the actions of a task, to add a behaviour around their execution (see `cache` and
+`early_cutoff` in `task`), signatures of actions to detect when they change (see `code_dep` in `task`), and command
+actions keeping only the tail of their output in memory (see `output_limit` in `task`).
+"""
+import hashlib
+import io
+import os
+import re
+import shlex
+import sys
+import types
+import weakref
+from collections import deque
+
+from doit.action import BaseAction, CmdAction, PythonAction, create_action
+from doit.exceptions import BaseFail
+
+from .checkers import _get_digest, get_signature_cache
+from .utils import get_cache_path
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, List, Optional, Tuple, Union  # noqa: F401
+
+
+# code objects flags: the code of a function, and (python >= 3.14) the first constant is the docstring
+_CO_OPTIMIZED = 0x1
+_CO_HAS_DOCSTRING = 0x4000000 if sys.version_info >= (3, 14) else None
+
+
+def _get_docstring_slots(code):
+    # type: (...) -> int
+    """Returns the number of constants of code object `code` that are reserved for its docstring (0 or 1)"""
+    if _CO_HAS_DOCSTRING is not None:
+        return 1 if code.co_flags & _CO_HAS_DOCSTRING else 0
+    # before python 3.14 the first constant of functions (except comprehensions) is their docstring, or None
+    if code.co_flags & _CO_OPTIMIZED and (not code.co_name.startswith('<') or code.co_name == '<lambda>') \
+            and code.co_consts and (code.co_consts[0] is None or isinstance(code.co_consts[0], str)):
+        return 1
+    return 0
+
+
+def _code_signature(code, h):
+    """
+    Feeds the bytecode, constants (except the docstring) and names of code object `code` (and of the nested code
+    objects) to hash `h`
+    """
+    h.update(code.co_code)
+    h.update(repr(code.co_names).encode('utf-8'))
+    for const in code.co_consts[_get_docstring_slots(code):]:
+        if hasattr(const, 'co_code'):
+            _code_signature(const, h)
+        else:
+            # (not `repr`: the order of frozenset constants depends on the hash seed)
+            h.update(_value_signature(const, _MAX_CLOSURE_DEPTH).encode('utf-8', 'surrogateescape'))
+
+
+# the digests of the code objects hashed by this process, as the same functions are usually used by many tasks
+_CODE_DIGESTS = weakref.WeakKeyDictionary()  # type: weakref.WeakKeyDictionary
+
+
+def _get_code_digest(code):
+    # type: (...) -> bytes
+    """Returns a digest of the bytecode, constants and names of code object `code` (see `_code_signature`)"""
+    try:
+        return _CODE_DIGESTS[code]
+    except KeyError:
+        h = hashlib.md5()
+        _code_signature(code, h)
+        digest = _CODE_DIGESTS[code] = h.digest()
+        return digest
+
+
+# the names used by the code objects inspected by this process, and by their nested code objects
+_CODE_NAMES = weakref.WeakKeyDictionary()  # type: weakref.WeakKeyDictionary
+
+
+def _get_code_names(code):
+    # type: (...) -> Tuple[str, ...]
+    """Returns the sorted names (globals and attributes) used by code object `code` and by its nested code objects"""
+    try:
+        return _CODE_NAMES[code]
+    except KeyError:
+        names = set(code.co_names)
+        for const in code.co_consts:
+            if hasattr(const, 'co_code'):
+                names.update(_get_code_names(const))
+        names = _CODE_NAMES[code] = tuple(sorted(names))
+        return names
+
+
+# memory addresses in representations such as "<object at 0x7f...>"
+_ADDRESS = re.compile(r" at 0x[0-9a-fA-F]+")
+
+# the depth until which the functions referenced by closures are included in signatures
+_MAX_CLOSURE_DEPTH = 3
+
+
+def _value_signature(value,  # type: Any
+                     depth   # type: int
+                     ):
+    # type: (...) -> str
+    """
+    Returns a string identifying `value` (an argument, default value, constant or value captured by the closure of a
+    function): its representation, except for functions (their signature), containers (whose items are handled
+    recursively, in a stable order for sets and dicts), and objects whose representation contains a memory address
+    (only their type is used).
+    """
+    if value is None or isinstance(value, (bool, int, float, complex, str, bytes)):
+        return repr(value)
+    elif isinstance(value, list):
+        return "[%s]" % ", ".join(_value_signature(v, depth) for v in value)
+    elif isinstance(value, tuple):
+        return "(%s)" % ", ".join(_value_signature(v, depth) for v in value)
+    elif isinstance(value, (set, frozenset)):
+        return "{%s}" % ", ".join(sorted(_value_signature(v, depth) for v in value))
+    elif isinstance(value, dict):
+        return "{%s}" % ", ".join(sorted("%s: %s" % (_value_signature(k, depth), _value_signature(v, depth))
+                                         for k, v in value.items()))
+    elif isinstance(value, type):
+        return "<class %s.%s>" % (value.__module__, getattr(value, '__qualname__', value.__name__))
+    elif hasattr(value, '__code__') or hasattr(value, '__func__') or hasattr(value, 'func'):
+        if depth >= _MAX_CLOSURE_DEPTH:
+            return "<function>"
+        return get_callable_signature(value, _depth=depth + 1)
+    else:
+        r = repr(value)
+        if _ADDRESS.search(r):
+            # not stable between runs
+            return "<%s.%s>" % (type(value).__module__, type(value).__name__)
+        return r
+
+
+def _global_signature(value,  # type: Any
+                      depth   # type: int
+                      ):
+    # type: (...) -> str
+    """
+    Returns a string identifying the value of a global variable used by a function, see `_globals_signature`. The
+    functions defined in the same module are handled there.
+    """
+    if isinstance(value, (types.ModuleType, type)) or callable(value):
+        # modules, classes and functions of other modules: by name only
+        return "<%s>" % type(value).__name__
+    elif isinstance(value, (list, dict, set, bytearray)):
+        # same as the values captured by closures
+        return type(value).__name__
+    else:
+        return _value_signature(value, depth)
+
+
+def _globals_signature(f,     # type: types.FunctionType
+                       depth  # type: int
+                       ):
+    # type: (...) -> str
+    """
+    Returns a string identifying the global variables used by function `f`: the values of the constants, and the
+    bytecode, constants and default arguments of the functions defined in the same module, including the global
+    variables that they use themselves (recursively). Modules, classes and functions defined in other modules are only
+    identified by their name, and mutable containers by their type.
+    """
+    f_globals = f.__globals__
+    signatures = dict()
+    to_visit = [f]
+    while to_visit:
+        code = to_visit.pop().__code__
+        for name in _get_code_names(code):
+            if name in signatures or name not in f_globals:
+                # already seen, builtin, or attribute name
+                continue
+            value = f_globals[name]
+            if isinstance(value, types.FunctionType) and value.__globals__ is f_globals:
+                # helper function of the same module
+                signatures[name] = "%s%s" % (_get_code_digest(value.__code__).hex(),
+                                             _value_signature(value.__defaults__, depth))
+                to_visit.append(value)
+            else:
+                signatures[name] = _global_signature(value, depth)
+    return "".join("%s=%s\n" % item for item in sorted(signatures.items()))
+
+
+def get_callable_signature(f,        # type: Any
+                           _depth=0  # type: int
+                           ):
+    # type: (...) -> str
+    """
+    Returns a string identifying python callable `f` and its implementation: its qualified name and a hash of its
+    bytecode and constants, of its default arguments, of the values captured by its closure (except the contents of
+    mutable containers) and of the global variables it uses (see `_globals_signature`: this includes the helper
+    functions defined in the same module, but not the functions imported from other modules). So it changes when the
+    code of the function or of its helpers changes, but not when only comments, line numbers or the contents of
+    docstrings change.
+    """
+    args = ()
+    keywords = {}
+    if hasattr(f, 'func') and hasattr(f, 'keywords'):
+        # functools.partial
+        f, args, keywords = f.func, f.args, f.keywords
+    f = getattr(f, '__func__', f)  # bound methods
+    code = getattr(f, '__code__', None)
+    if code is None:
+        wrapped = getattr(f, '__wrapped__', None)
+        if wrapped is not None:
+            # callable object wrapping a function, such as `AsyncCallable`
+            return "%s.%s(%s)" % (type(f).__module__, type(f).__name__, get_callable_signature(wrapped, _depth))
+        # callable object
+        func = getattr(type(f), '__call__', None)
+        code = getattr(func, '__code__', None)
+        name = "%s.%s" % (type(f).__module__, type(f).__name__)
+    else:
+        func = f
+        name = "%s.%s" % (getattr(f, '__module__', None), getattr(f, '__qualname__', f.__name__))
+
+    h = hashlib.md5()
+    if code is not None:
+        h.update(_get_code_digest(code))
+    if isinstance(func, types.FunctionType):
+        h.update(_globals_signature(func, _depth).encode('utf-8', 'surrogateescape'))
+    if args or keywords or getattr(f, '__defaults__', None):
+        h.update(_value_signature((getattr(f, '__defaults__', None), args, keywords), _depth).encode(
+            'utf-8', 'surrogateescape'))
+    for cell in getattr(f, '__closure__', None) or ():
+        h.update(_cell_signature(cell, _depth).encode('utf-8', 'surrogateescape'))
+    return "%s:%s" % (name, h.hexdigest())
+
+
+def _cell_signature(cell,  # type: Any
+                    depth  # type: int
+                    ):
+    # type: (...) -> str
+    """Returns a string identifying the value captured by closure cell `cell`"""
+    try:
+        value = cell.cell_contents
+    except ValueError:
+        # empty cell
+        value = None
+    if isinstance(value, (list, dict, set, bytearray)):
+        # mutable containers captured by closures usually accumulate state: only their type is used
+        return type(value).__name__
+    return _value_signature(value, depth)
+
+
+def get_action_signature(action  # type: Any
+                         ):
+    # type: (...) -> str
+    """
+    Returns a string identifying doit action `action`: the command for shell commands, and the callable signature (see
+    `get_callable_signature`) with the arguments for python actions. Arguments whose representation contains a memory
+    address are only identified by their type, so that signatures are stable between runs.
+    """
+    if isinstance(action, CmdAction):
+        action = action._action
+    elif isinstance(action, PythonAction):
+        action = (action.py_callable, action.args, action.kwargs)
+
+    if isinstance(action, str):
+        return "cmd:%s" % action
+    elif isinstance(action, list):
+        return "cmd:%r" % ([str(a) for a in action],)
+    elif isinstance(action, tuple):
+        f, args, kwargs = (list(action) + [None] * 3)[:3]
+        return "py:%s:%s:%s" % (get_callable_signature(f), _value_signature(list(args or ()), 0),
+                                _value_signature(kwargs or {}, 0))
+    elif hasattr(action, '__call__'):
+        return "py:%s" % get_callable_signature(action)
+    else:
+        return "other:%s" % _value_signature(action, 0)
+
+
+class WrapperAction(BaseAction):
+    """
+    Base class of the doit actions wrapping a list of actions. Subclasses implement `execute`, and call
+    `execute_actions` to execute the wrapped actions as doit `Task.execute` does.
+    """
+
+    def __init__(self,
+                 actions,  # type: List[Any]
+                 task=None
+                 ):
+        self._actions = actions
+        self._action_instances = None
+        self.task = task
+        self.out = None
+        self.err = None
+        self.result = None
+        self.values = {}
+
+    @property
+    def actions(self):
+        """The doit action instances of the wrapped actions (created on first access, as in doit `Task`)"""
+        if self._action_instances is None:
+            self._action_instances = [create_action(a, self.task, 'actions') for a in self._actions]
+        return self._action_instances
+
+    def __str__(self):
+        return "\n\t".join(str(a) for a in self.actions)
+
+    def __repr__(self):
+        return "<%s %r>" % (type(self).__name__, self._actions)
+
+    def execute_actions(self, out=None, err=None):
+        """
+        Executes the wrapped actions, stopping at the first failure. The `result` of the last action and the `values`
+        of all actions are gathered, as well as their outputs.
+
+        :return: the failure, or None
+        """
+        self.values = {}
+        failure = None
+        for action in self.actions:
+            action_return = action.execute(out, err)
+            if isinstance(action_return, BaseFail):
+                failure = action_return
+                break
+            self.result = action.result
+            self.values.update(action.values)
+        self.out = "".join(a.out for a in self.actions if a.out)
+        self.err = "".join(a.err for a in self.actions if a.err)
+        return failure
+
+    def execute(self, out=None, err=None):
+        return self.execute_actions(out, err)
+
+
+def _iter_target_files(targets  # type: List[str]
+                       ):
+    """Yields the files of `targets`: the targets that are files, and the files in the targets that are folders"""
+    for target in targets:
+        if os.path.isdir(target):
+            for root, subdirs, names in os.walk(target):
+                subdirs.sort()
+                for name in sorted(names):
+                    yield os.path.join(root, name)
+        else:
+            yield target
+
+
+def get_targets_state(targets  # type: List[str]
+                      ):
+    # type: (...) -> Dict[str, Tuple[int, int, str]]
+    """Returns a dictionary {file path: (atime_ns, mtime_ns, digest)} for the existing files of `targets`"""
+    state = dict()
+    for path in _iter_target_files(targets):
+        try:
+            st = os.stat(path)
+            state[path] = st.st_atime_ns, st.st_mtime_ns, _get_digest(path, st)
+        except (IOError, OSError):
+            # missing
+            continue
+    return state
+
+
+class EarlyCutoffAction(WrapperAction):
+    """
+    A doit action wrapping the actions of a task with `early_cutoff=True`. The contents of the targets are hashed
+    before and after executing the actions, and
+
+     - the target files whose contents did not change get their previous modification time back, so that the tasks
+       depending on them through `file_dep` see them unchanged, whatever the `check_file_uptodate` checker,
+     - the result of the task is a signature of the contents of all its targets, so that the tasks depending on it
+       through `result_dep` or `getargs` are only executed when its targets actually changed.
+    """
+
+    def execute(self, out=None, err=None):
+        targets = list(self.task.targets)
+        before = get_targets_state(targets)
+
+        failure = self.execute_actions(out, err)
+        if failure is not None:
+            return failure
+
+        after = get_targets_state(targets)
+        for path, (_, _, digest) in after.items():
+            previous = before.get(path, None)
+            if previous is not None and previous[2] == digest:
+                os.utime(path, ns=previous[:2])
+                st = os.stat(path)
+                get_signature_cache().set(path, (st.st_mtime_ns, st.st_size, st.st_ino), digest)
+
+        h = hashlib.sha256()
+        for path in sorted(after):
+            h.update(("%s:%s\n" % (path, after[path][2])).encode('utf-8', 'surrogateescape'))
+        self.result = h.hexdigest()
+        return None
+
+
+# the key of the actions signature in the task values
+_SIGNATURE_VALUE = '_actions_signature'
+
+
+class CodeDep(object):
+    """
+    A doit `uptodate` callable, added to the tasks with `code_dep=True`: the task is not up-to-date when the signature
+    of its actions (see `get_action_signature`) changed since its last execution. So editing the body of a `@pytask`
+    function or the command returned by a `@cmdtask` function runs the task again.
+    """
+    __slots__ = ('actions', 'signature')
+
+    def __init__(self,
+                 actions  # type: List[Any]
+                 ):
+        self.actions = actions
+        self.signature = None
+
+    def get_signature(self):
+        # type: (...) -> str
+        """Returns a hash of the signatures of the actions (computed once)"""
+        if self.signature is None:
+            h = hashlib.md5()
+            for a in self.actions:
+                h.update(get_action_signature(a).encode('utf-8', 'surrogateescape'))
+                h.update(b'\n')
+            self.signature = h.hexdigest()
+        return self.signature
+
+    def __call__(self, task, values):
+        """doit `uptodate` protocol: compares the signature of the actions with the one saved at the last execution"""
+        signature = self.get_signature()
+
+        def save_signature():
+            return {_SIGNATURE_VALUE: signature}
+
+        task.value_savers.append(save_signature)
+        return values.get(_SIGNATURE_VALUE, None) == signature
+
+
+try:
+    from inspect import Parameter, Signature
+except ImportError:  # python 2
+    pass
+else:
+    # doit inspects the signature of uptodate callables for each task: provide it, instead of resolving `__call__`
+    CodeDep.__signature__ = Signature([Parameter('task', Parameter.POSITIONAL_OR_KEYWORD),
+                                       Parameter('values', Parameter.POSITIONAL_OR_KEYWORD)])
+
+
+class OutputTail(object):
+    """
+    A file-like object keeping only the last `max_size` characters written to it in memory. If `spill_path` is
+    provided, once the output exceeds `max_size` it is entirely written to this file too.
+    """
+    __slots__ = ('max_size', 'spill_path', 'chunks', 'size', 'dropped', 'spill')
+
+    def __init__(self,
+                 max_size,       # type: int
+                 spill_path=None  # type: str
+                 ):
+        self.max_size = max_size
+        self.spill_path = spill_path
+        self.chunks = deque()
+        self.size = 0
+        self.dropped = 0
+        self.spill = None
+
+    def write(self, text):
+        if self.spill is not None:
+            self.spill.write(text)
+        self.chunks.append(text)
+        self.size += len(text)
+        if self.size <= self.max_size:
+            return
+
+        if self.spill is None and self.spill_path is not None:
+            # first overflow: everything written so far is still in memory
+            parent = os.path.dirname(self.spill_path)
+            if parent and not os.path.isdir(parent):
+                os.makedirs(parent)
+            self.spill = io.open(self.spill_path, mode='w', encoding='utf-8', errors='replace')
+            self.spill.writelines(self.chunks)
+
+        # drop the oldest text
+        while self.size > self.max_size:
+            excess = self.size - self.max_size
+            first = self.chunks[0]
+            if len(first) <= excess:
+                self.chunks.popleft()
+                removed = len(first)
+            else:
+                self.chunks[0] = first[excess:]
+                removed = excess
+            self.size -= removed
+            self.dropped += removed
+
+    def flush(self):
+        if self.spill is not None:
+            self.spill.flush()
+
+    def close(self):
+        if self.spill is not None:
+            self.spill.close()
+
+    def getvalue(self):
+        # type: (...) -> str
+        """Returns the text kept in memory, preceded by a notice if older text was dropped"""
+        tail = "".join(self.chunks)
+        if not self.dropped:
+            return tail
+        where = (", full output in '%s'" % self.spill_path) if self.spill_path is not None else ""
+        return "[... %s characters not kept in memory%s]\n%s" % (self.dropped, where, tail)
+
+
+def _get_spill_path(task_name,  # type: str
+                    action_id,  # type: str
+                    stream      # type: str
+                    ):
+    # type: (...) -> str
+    """
+    Returns the file where the full `stream` ('out' or 'err') output of action `action_id` of task `task_name` is
+    written: '<task>.<action_id>.<stream>.log'. A hash of the task name is added when it contains other characters than
+    letters, digits, '-', '_' and '.', so that for example 'a:b' and 'a_b' do not share their files.
+    """
+    file_name = "".join(c if c.isalnum() or c in '-_.' else '_' for c in task_name)
+    if file_name != task_name:
+        file_name += "-" + hashlib.sha1(task_name.encode('utf-8')).hexdigest()[:8]
+    return get_cache_path('output', "%s.%s.%s.log" % (file_name, action_id, stream))
+
+
+class BoundedCmdAction(CmdAction):
+    """
+    A doit command action whose captured stdout and stderr are `OutputTail`s: only their last `output_limit` characters
+    are kept in memory (for the task result and the failure report), and larger outputs are written in full to a spill
+    file in the '.doit_api/output' folder, if `spill` is True (see `output_limit` in `task` and `doit_config`).
+    Commands saving their output in the task values (`save_out`) keep it entirely.
+    """
+
+    # write the full outputs exceeding `output_limit` to spill files
+    spill = True
+
+    # the position of the action in its task, so that each command action has its own spill files (see
+    # `bound_cmd_actions`)
+    action_index = 0
+
+    def __init__(self,
+                 action,        # type: Union[str, List[str]]
+                 output_limit,  # type: int
+                 **kwargs
+                 ):
+        super(BoundedCmdAction, self).__init__(action, **kwargs)
+        self.output_limit = output_limit
+        self._captures = dict()
+
+    def new_capture(self,
+                    stream  # type: str
+                    ):
+        # type: (...) -> Union[OutputTail, io.StringIO]
+        """
+        Returns a new `OutputTail` to capture `stream` ('out' or 'err'), kept until the end of `execute`. The whole
+        output is captured when it is saved in the task values, or when there is no `output_limit`.
+        """
+        if self.save_out or not self.output_limit:
+            capture = io.StringIO()
+        else:
+            capture = OutputTail(self.output_limit, self.get_spill_path(stream) if self.spill else None)
+        self._captures[stream] = capture
+        return capture
+
+    def get_spill_path(self,
+                       stream  # type: str
+                       ):
+        # type: (...) -> str
+        """Returns the spill file of `stream` ('out' or 'err')"""
+        return _get_spill_path(self.task.name if self.task else 'action', str(self.action_index), stream)
+
+    def _print_process_output(self, process, input_, capture, realtime):
+        if not self.save_out:
+            # capture in an `OutputTail` instead of the StringIO created by `execute`
+            capture = self.new_capture('out' if input_ is process.stdout else 'err')
+        super(BoundedCmdAction, self)._print_process_output(process, input_, capture, realtime)
+
+    def execute(self, out=None, err=None):
+        self._captures = dict()
+        try:
+            return super(BoundedCmdAction, self).execute(out, err)
+        finally:
+            self.close_captures()
+
+    def close_captures(self):
+        """Closes the `OutputTail`s of the last execution, and sets `out`, `err` and `result` from them"""
+        captures, self._captures = self._captures, dict()
+        if captures:
+            self.out = captures['out'].getvalue() if 'out' in captures else ""
+            self.err = captures['err'].getvalue() if 'err' in captures else ""
+            self.result = self.out + self.err
+        for capture in captures.values():
+            capture.close()
+
+
+def bound_cmd_actions(actions,      # type: List[Any]
+                      output_limit  # type: int
+                      ):
+    # type: (...) -> List[Any]
+    """
+    Returns `actions`, where the command actions provided as a string or list are `BoundedCmdAction`s, numbered with
+    their position in the list (see `BoundedCmdAction.action_index`).
+    """
+    actions = [BoundedCmdAction(a, output_limit, shell=isinstance(a, str)) if isinstance(a, (str, list)) else a
+               for a in actions]
+    for i, a in enumerate(actions):
+        if isinstance(a, BoundedCmdAction):
+            a.action_index = i
+    return actions
+
+
+# characters with a special meaning for the shell, or for the doit command formatting ('%' and '{'). Quotes are handled
+# by `shlex`
+_SHELL_METACHARACTERS = frozenset('|&;<>()$`\\*?[]{}#~%!\n\r')
+
+# shell builtins and keywords, that can not (or should not) be executed as programs
+_SHELL_BUILTINS = frozenset((
+    '.', ':', '[[', ']]', '{', '}', '!', 'alias', 'bg', 'break', 'builtin', 'case', 'cd', 'command', 'continue',
+    'declare', 'dirs', 'do', 'done', 'elif', 'else', 'esac', 'eval', 'exec', 'exit', 'export', 'fg', 'fi', 'for',
+    'function', 'getopts', 'hash', 'if', 'jobs', 'let', 'local', 'popd', 'pushd', 'read', 'readonly', 'return',
+    'select', 'set', 'shift', 'shopt', 'source', 'then', 'time', 'times', 'trap', 'type', 'typeset', 'ulimit', 'umask',
+    'unalias', 'unset', 'until', 'wait', 'while',
+))
+
+# the program paths found in the PATH: (name, PATH) > path or None
+_PROGRAMS = dict()  # type: Dict[Tuple[str, str], Optional[str]]
+
+
+def _find_program(name  # type: str
+                  ):
+    # type: (...) -> Optional[str]
+    """Returns the path of the program that the shell would execute for command `name`, or None if there is none"""
+    if '/' in name:
+        return name if os.path.isfile(name) and os.access(name, os.X_OK) else None
+    path = os.environ.get('PATH', os.defpath)
+    try:
+        return _PROGRAMS[(name, path)]
+    except KeyError:
+        import shutil
+        program = _PROGRAMS[(name, path)] = shutil.which(name, path=path)
+        return program
+
+
+def split_simple_cmd(cmd  # type: str
+                     ):
+    # type: (...) -> Optional[List[str]]
+    """
+    Returns the arguments list of shell command `cmd` if it can be executed directly without a shell, or None. This is
+    the case of a single program with literal arguments: no variables, redirections, pipes, globs or other shell
+    syntax, no shell builtin and no variable assignment.
+    """
+    if not _SHELL_METACHARACTERS.isdisjoint(cmd):
+        return None
+    try:
+        argv = shlex.split(cmd)
+    except ValueError:
+        # unbalanced quotes
+        return None
+    if not argv or argv[0] in _SHELL_BUILTINS or '=' in argv[0] or _find_program(argv[0]) is None:
+        return None
+    return argv
+
+
+def split_simple_cmds(cmd  # type: str
+                      ):
+    # type: (...) -> Optional[List[List[str]]]
+    """
+    Returns the arguments lists of the commands of shell command `cmd` (several commands joined with '; ', as with
+    `join_cmds`), if they can all be executed without a shell (see `split_simple_cmd`), or None.
+    """
+    # Note: a '; ' inside quotes splits a quoted string, so one of the parts has unbalanced quotes and is rejected
+    argvs = []
+    for part in cmd.split('; '):
+        argv = split_simple_cmd(part)
+        if argv is None:
+            return None
+        argvs.append(argv)
+    return argvs
+
+
+class DirectCmdAction(BoundedCmdAction):
+    """
+    A doit shell command action executed without a shell when it only contains simple commands (see
+    `split_simple_cmds`): each command is then executed directly in turn, and as with commands joined with ';' in a
+    shell, the exit code is the one of the last command. Other commands are executed in a shell as usual. This is
+    decided when the action is executed, with the PATH of the environment.
+    """
+
+    def __init__(self,
+                 action,          # type: str
+                 output_limit=0,  # type: int
+                 **kwargs
+                 ):
+        super(DirectCmdAction, self).__init__(action, output_limit, **kwargs)
+        self._argv = None
+        # the position of the command being executed, when there are several
+        self._part = None
+
+    def get_argvs(self):
+        # type: (...) -> Optional[List[List[str]]]
+        """Returns the arguments lists of the commands to execute directly, or None if a shell is needed"""
+        if os.name != 'posix' or not isinstance(self._action, str) or self.pkwargs:
+            return None
+        return split_simple_cmds(self._action)
+
+    def get_spill_path(self,
+                       stream  # type: str
+                       ):
+        # type: (...) -> str
+        """Returns the spill file of `stream` ('out' or 'err'), one per command when there are several"""
+        if self._part is None:
+            return super(DirectCmdAction, self).get_spill_path(stream)
+        task_name = self.task.name if self.task else 'action'
+        return _get_spill_path(task_name, "%s-%s" % (self.action_index, self._part), stream)
+
+    def select(self,
+               argv,         # type: Optional[List[str]]
+               shell=False,  # type: bool
+               part=None     # type: int
+               ):
+        """
+        Makes the next execution run the command with arguments `argv` directly (or in a shell if `shell` is True), or
+        the whole action in a shell if `argv` is None.
+
+        :param part: the position of the command among the commands of the action, if there are several
+        """
+        self._part = part
+        if argv is not None and shell:
+            # the arguments are literal, quoting them gives the same command
+            argv = " ".join(shlex.quote(a) for a in argv)
+        self._argv = argv
+        self.shell = argv is None or shell
+
+    def expand_action(self):
+        if self._argv is not None:
+            return self._argv
+        return super(DirectCmdAction, self).expand_action()
+
+    def join_outputs(self,
+                     outs,  # type: List[str]
+                     errs   # type: List[str]
+                     ):
+        """Sets `out`, `err` and `result` from the outputs of the successive commands, if they were captured"""
+        if len(outs) > 1 and self.out is not None:
+            self.out = "".join(o or "" for o in outs)
+            self.err = "".join(e or "" for e in errs)
+            self.result = self.out + self.err
+
+    def execute(self, out=None, err=None):
+        argvs = self.get_argvs()
+        if argvs is None:
+            return super(DirectCmdAction, self).execute(out, err)
+
+        failure = None
+        outs, errs = [], []
+        try:
+            for i, argv in enumerate(argvs):
+                part = i if len(argvs) > 1 else None
+                self.select(argv, part=part)
+                try:
+                    failure = super(DirectCmdAction, self).execute(out, err)
+                except OSError:
+                    # not an executable (a script without shebang line...): let the shell handle it
+                    self.select(argv, shell=True, part=part)
+                    failure = super(DirectCmdAction, self).execute(out, err)
+                outs.append(self.out)
+                errs.append(self.err)
+        finally:
+            self.select(None)
+        self.join_outputs(outs, errs)
+        return failure
+
+
+def direct_cmd_actions(actions,         # type: List[Any]
+                       output_limit=0   # type: int
+                       ):
+    # type: (...) -> List[Any]
+    """Returns `actions`, where the shell command actions provided as a string are `DirectCmdAction`s"""
+    return [DirectCmdAction(a, output_limit or 0) if isinstance(a, str) else a for a in actions]
@@ -0,0 +1,99 @@
+"""
+A long-lived asyncio event loop, shared by all the `async def` python actions of a doit run (see `task` and `@pytask`).
+
+The loop runs in a daemon thread, started on first use. Each async action blocks the doit thread executing it until
+its coroutine completes, so with a threaded doit runner (`doit run -n 8 -P thread`) the coroutines of several tasks
+overlap on the same loop, without a process or an event loop per task.
+"""
+import os
+import threading
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Callable  # noqa: F401
+
+
+# the shared loop and the process that started it (a forked doit worker process has the loop but not its thread)
+_LOOP = None
+_LOOP_PID = None
+_LOCK = threading.Lock()
+
+
+def _run_forever(loop):
+    import asyncio
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
+
+
+def _stop(loop, thread):
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(1)
+    if not loop.is_running():
+        loop.close()
+
+
+def get_event_loop():
+    """Returns the shared event loop, starting its thread on first call"""
+    global _LOOP, _LOOP_PID
+    with _LOCK:
+        if _LOOP is None or _LOOP_PID != os.getpid():
+            import asyncio
+            import atexit
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=_run_forever, args=(loop,), name="doit_api-event-loop")
+            thread.daemon = True
+            thread.start()
+            atexit.register(_stop, loop, thread)
+            _LOOP, _LOOP_PID = loop, os.getpid()
+        return _LOOP
+
+
+def run_coroutine(coro):
+    """Runs coroutine `coro` on the shared event loop, and returns its result (or raises its exception)"""
+    import asyncio
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop()).result()
+
+
+class AsyncCallable(object):
+    """
+    A python action calling `async def` function `func` and running the coroutine on the shared event loop. `task`
+    wraps the coroutine functions found in its actions with it. doit inspects `__wrapped__` to know which arguments
+    (`targets`, `dependencies`, `getargs` values...) `func` accepts.
+    """
+    __slots__ = ('func',)
+
+    def __init__(self,
+                 func  # type: Callable
+                 ):
+        self.func = func
+
+    @property
+    def __wrapped__(self):
+        return self.func
+
+    @property
+    def __name__(self):
+        return self.func.__name__
+
+    def __getstate__(self):
+        return self.func
+
+    def __setstate__(self, func):
+        self.func = func
+
+    def __eq__(self, other):
+        return isinstance(other, AsyncCallable) and other.func == self.func
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.func)
+
+    def __repr__(self):
+        # (doit prints python actions as their representation, without the address)
+        return "<async function %s at 0x%x>" % (getattr(self.func, '__qualname__', self.func.__name__), id(self))
+
+    def __call__(self, *args, **kwargs):
+        # type: (...) -> Any
+        return run_coroutine(self.func(*args, **kwargs))
@@ -0,0 +1,451 @@
+"""
+A local, content-addressed build cache for task targets (`cache=True` in `task`, `@pytask` and `@cmdtask`), also used
+to memoize the values returned by python tasks (`memoize=True` in `task` and `@pytask`).
+
+When a cached task runs, a key is computed from its actions, the contents of its `file_dep` files, its options and
+`getargs` values, and the paths of its targets. Python actions are identified by the code of their functions, the
+global variables they use and the helper functions of the same module (see `actions.get_callable_signature`): the
+functions imported from other modules, and the programs executed by shell commands, should be declared in `file_dep`.
+If an entry with this key exists in the cache, the targets are restored from it instead of executing the actions.
+Otherwise the actions are executed, and the targets are stored in the cache. So switching branches back and forth does
+not rebuild everything.
+
+The cache folder (`.doit_api/build_cache` by default) contains
+
+ - `objects/<algorithm>/<xx>/<digest>`: the contents of the cached files, read-only, stored once per digest,
+ - `entries/<xx>/<key>.json`: for each key, the targets (path, digest, mode) and the values and result returned by the
+   actions (stored as an object when they are large). The modification time of an entry is its last use, for LRU
+   eviction.
+
+All files are written atomically (temporary file + rename), and a missing or invalid object is handled as a cache
+miss, so several doit processes can share the same cache folder.
+"""
+import errno
+import hashlib
+import json
+import os
+import shutil
+import stat
+import time
+
+from .actions import WrapperAction, get_action_signature
+from .checkers import DEFAULT_DIGEST, DIGESTS, _get_digest, get_file_digest
+from .utils import atomic_write, get_cache_path
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, List, Optional, Set, Tuple  # noqa: F401
+
+
+# version of the entry format, included in the keys
+_ENTRY_VERSION = 1
+
+# objects and entries modified more recently than this (in seconds) are never evicted, as a concurrent process may be
+# about to use them
+EVICTION_GRACE_PERIOD = 600
+
+# the default maximum total size of the objects, in bytes
+DEFAULT_CACHE_SIZE = 5 * 1024 ** 3
+
+# values and results larger than this (in bytes, serialized) are stored as an object instead of in the entry, so that
+# they are accounted for in the cache size
+INLINE_VALUES_SIZE = 4096
+
+
+def _clone_file(src,  # type: str
+                dst   # type: str
+                ):
+    """Copies file `src` to `dst`, with a copy-on-write clone (reflink) when the file system supports it"""
+    try:
+        import fcntl
+        ficlone = 0x40049409  # FICLONE, linux only
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), ficlone, fsrc.fileno())
+        return
+    except (ImportError, IOError, OSError):
+        pass
+    shutil.copyfile(src, dst)
+
+
+def _tmp_path(path):
+    return "%s.%s.tmp" % (path, os.getpid())
+
+
+def _makedirs(path):
+    if path and not os.path.isdir(path):
+        try:
+            os.makedirs(path)
+        except OSError:
+            # created concurrently
+            if not os.path.isdir(path):
+                raise
+
+
+class BuildCache(object):
+    """
+    A content-addressed cache folder. The class attributes are the configuration used by cached tasks, that the
+    `DoitApiTaskLoader` sets from `doit_config(build_cache_dir=..., build_cache_size=..., build_cache_link=...)`.
+    """
+    __slots__ = ('path', 'max_size', 'link', 'stored')
+
+    # the cache folder. Default: '.doit_api/build_cache'
+    cache_dir = None
+    # the maximum total size of the objects, in bytes
+    cache_size = DEFAULT_CACHE_SIZE
+    # how targets are restored: 'copy' (a copy-on-write clone when possible) or 'hardlink'
+    cache_link = 'copy'
+
+    def __init__(self,
+                 path,                    # type: str
+                 max_size=cache_size,     # type: int
+                 link=cache_link          # type: str
+                 ):
+        """
+        :param path: the cache folder
+        :param max_size: the maximum total size of the objects in bytes. The least recently used entries are evicted
+            when it is exceeded, see `evict`.
+        :param link: how targets are restored: 'copy' (a copy-on-write clone when possible) or 'hardlink'. Hardlinked
+            targets are the objects of the cache themselves: a target that is modified in place instead of being
+            replaced (written to a new file, or deleted first) corrupts the cache. The objects are read-only to prevent
+            it, but this is not enforced for the root user, nor for tools that change the permissions of their outputs.
+        """
+        if link not in ('copy', 'hardlink'):
+            raise ValueError("link should be 'copy' or 'hardlink', found: %r" % link)
+        self.path = path
+        self.max_size = max_size
+        self.link = link
+        # True when something was stored by this process
+        self.stored = False
+
+    # -- layout
+
+    def get_entry_path(self, key):
+        return os.path.join(self.path, 'entries', key[:2], key + '.json')
+
+    def get_object_path(self, digest):
+        algorithm, hex_digest = digest.split(':', 1)
+        return os.path.join(self.path, 'objects', algorithm, hex_digest[:2], hex_digest)
+
+    # -- entries
+
+    def get_entry(self,
+                  key  # type: str
+                  ):
+        # type: (...) -> Optional[Dict]
+        """Returns the entry with key `key`, or None. Its last use time is updated."""
+        entry_path = self.get_entry_path(key)
+        try:
+            with open(entry_path, mode='rb') as f:
+                entry = json.loads(f.read().decode('utf-8'))
+            os.utime(entry_path, None)
+        except (IOError, OSError, ValueError):
+            return None
+        return entry
+
+    def restore(self,
+                entry  # type: Dict
+                ):
+        # type: (...) -> bool
+        """
+        Restores the targets of `entry`. Each file is written atomically (see `link` for the limits of hardlinks). Returns False if an object is missing (the
+        entry was partially evicted): the targets restored so far are then left in place, they will be overwritten by
+        the actions.
+        """
+        for path, digest, mode in entry['files']:
+            obj = self.get_object_path(digest)
+            _makedirs(os.path.dirname(path))
+            tmp = _tmp_path(path)
+            try:
+                if self.link == 'hardlink':
+                    os.link(obj, tmp)
+                else:
+                    _clone_file(obj, tmp)
+                    os.chmod(tmp, mode)
+                os.replace(tmp, path)
+            except (IOError, OSError):
+                if os.path.lexists(tmp):
+                    os.remove(tmp)
+                return False
+        for path in entry['dirs']:
+            _makedirs(path)
+        return True
+
+    def store(self,
+              key,      # type: str
+              targets,  # type: List[str]
+              values,   # type: Dict
+              result    # type: Any
+              ):
+        # type: (...) -> bool
+        """
+        Stores the files of `targets` (files or folders), and the `values` and `result` of the actions, under `key`.
+        Returns False if they can not be stored: a target is missing, or the values can not be serialized to json.
+        """
+        files = []  # type: List[Tuple[str, str, int]]
+        dirs = []
+        for target in targets:
+            if os.path.isdir(target):
+                dirs.append(target)
+                for root, subdirs, names in os.walk(target):
+                    subdirs.sort()
+                    for d in subdirs:
+                        dirs.append(os.path.join(root, d))
+                    for name in sorted(names):
+                        files.append(self._store_file(os.path.join(root, name)))
+            elif os.path.isfile(target):
+                files.append(self._store_file(target))
+            else:
+                # missing target: the entry would be incomplete
+                return False
+
+        entry = dict(files=files, dirs=dirs)
+        try:
+            data = json.dumps(dict(values=values, result=result)).encode('utf-8')
+        except (TypeError, ValueError):
+            return False
+        if len(data) > INLINE_VALUES_SIZE:
+            entry.update(values_digest=self._store_data(data))
+        else:
+            entry.update(values=values, result=result)
+        atomic_write(self.get_entry_path(key), json.dumps(entry).encode('utf-8'))
+        self.stored = True
+        return True
+
+    def get_values(self,
+                   entry  # type: Dict
+                   ):
+        # type: (...) -> Optional[Tuple[Dict, Any]]
+        """Returns the (values, result) of `entry`, or None if they were stored as an object that is missing"""
+        digest = entry.get('values_digest', None)
+        if digest is None:
+            return entry['values'], entry['result']
+        try:
+            with open(self.get_object_path(digest), mode='rb') as f:
+                contents = json.loads(f.read().decode('utf-8'))
+        except (IOError, OSError, ValueError):
+            return None
+        return contents['values'], contents['result']
+
+    def _store_data(self,
+                    data  # type: bytes
+                    ):
+        # type: (...) -> str
+        """Stores `data` as an object, and returns its digest"""
+        h = DIGESTS[DEFAULT_DIGEST]()
+        h.update(data)
+        digest = "%s:%s" % (DEFAULT_DIGEST, h.hexdigest())
+        obj = self.get_object_path(digest)
+        if os.path.exists(obj):
+            os.utime(obj, None)
+        else:
+            atomic_write(obj, data)
+            os.chmod(obj, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        return digest
+
+    def _store_file(self,
+                    path  # type: str
+                    ):
+        # type: (...) -> Tuple[str, str, int]
+        """Stores the contents of file `path` as an object, and returns (path, digest, mode)"""
+        st = os.stat(path)
+        digest = _get_digest(path, st)
+        obj = self.get_object_path(digest)
+        if os.path.exists(obj):
+            # already stored: mark it as recently used
+            os.utime(obj, None)
+        else:
+            _makedirs(os.path.dirname(obj))
+            tmp = _tmp_path(obj)
+            _clone_file(path, tmp)
+            if get_file_digest(tmp, digest.split(':', 1)[0]) != digest:
+                # modified while copied
+                os.remove(tmp)
+                raise IOError(errno.EAGAIN, "File modified while stored in the build cache", path)
+            # read-only, so that hardlinked targets modified in place fail instead of corrupting the cache
+            os.chmod(tmp, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            os.replace(tmp, obj)
+        return path, digest, stat.S_IMODE(st.st_mode)
+
+    # -- eviction
+
+    def get_size(self):
+        # type: (...) -> int
+        """Returns the total size of the objects in the cache, in bytes"""
+        return sum(size for _, size, _ in self._list_objects())
+
+    def _list_objects(self):
+        for root, _, names in os.walk(os.path.join(self.path, 'objects')):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def _list_entries(self):
+        # type: (...) -> List[Tuple[float, str, List[str]]]
+        """
+        Returns all entries as (last use time, path, paths of the objects they use) tuples, most recently used first.
+        Invalid entries have no objects and are the least recently used ones.
+        """
+        entries = []
+        for root, _, names in os.walk(os.path.join(self.path, 'entries')):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    mtime = os.stat(path).st_mtime
+                    with open(path, mode='rb') as f:
+                        entry = json.loads(f.read().decode('utf-8'))
+                    used = [self.get_object_path(d) for _, d, _ in entry['files']]
+                    if 'values_digest' in entry:
+                        used.append(self.get_object_path(entry['values_digest']))
+                except (IOError, OSError, ValueError, KeyError, TypeError):
+                    used = []
+                    mtime = 0
+                entries.append((mtime, path, used))
+        entries.sort(reverse=True)
+        return entries
+
+    def evict(self,
+              max_size=None  # type: int
+              ):
+        # type: (...) -> int
+        """
+        Deletes the least recently used entries until the total size of the objects they use is below `max_size`
+        (default: the cache `max_size`), and deletes the objects that are not used by any entry anymore. Entries and
+        objects modified in the last `EVICTION_GRACE_PERIOD` seconds are kept.
+
+        :return: the number of bytes freed
+        """
+        if max_size is None:
+            max_size = self.max_size
+        objects = dict((path, (size, mtime)) for path, size, mtime in self._list_objects())
+        total = sum(size for size, _ in objects.values())
+        if total <= max_size:
+            return 0
+
+        kept_objects = _evict_entries(self._list_entries(), objects, max_size)
+        freed = 0
+        for path, (size, _) in objects.items():
+            if path not in kept_objects and _remove(path):
+                freed += size
+        return freed
+
+
+def _evict_entries(entries,  # type: List[Tuple[float, str, List[str]]]
+                   objects,  # type: Dict[str, Tuple[int, float]]
+                   max_size  # type: int
+                   ):
+    # type: (...) -> Set[str]
+    """
+    Deletes the least recently used `entries` (see `BuildCache._list_entries`) that do not fit in `max_size`, and
+    returns the paths of the `objects` ({path: (size, mtime)}) used by the entries that are kept, or that are recent.
+    """
+    now = time.time()
+    kept_objects = set(p for p, (_, mtime) in objects.items() if now - mtime < EVICTION_GRACE_PERIOD)
+    kept_size = sum(objects[p][0] for p in kept_objects)
+    for mtime, path, used in entries:
+        new_objects = [p for p in set(used) if p not in kept_objects and p in objects]
+        new_size = sum(objects[p][0] for p in new_objects)
+        if now - mtime < EVICTION_GRACE_PERIOD or kept_size + new_size <= max_size:
+            # keep the most recent entries that fit
+            kept_objects.update(new_objects)
+            kept_size += new_size
+        else:
+            _remove(path)
+    return kept_objects
+
+
+def _remove(path):
+    # type: (...) -> bool
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False
+
+
+# the caches used by this process: (cache folder, max size, link) > cache
+_CACHES = dict()  # type: Dict[Tuple[str, int, str], BuildCache]
+
+
+def get_build_cache():
+    # type: (...) -> BuildCache
+    """
+    Returns the build cache configured by `doit_config` (see `BuildCache`), registering its eviction to run when the
+    process exits
+    """
+    path = BuildCache.cache_dir or get_cache_path('build_cache')
+    config = (path, BuildCache.cache_size, BuildCache.cache_link)
+    cache = _CACHES.get(config, None)
+    if cache is None:
+        import atexit
+        cache = _CACHES[config] = BuildCache(*config)
+        atexit.register(_evict_if_stored, cache)
+    return cache
+
+
+def _evict_if_stored(cache  # type: BuildCache
+                     ):
+    if cache.stored:
+        cache.evict()
+
+
+class CachedActions(WrapperAction):
+    """
+    A doit action wrapping the actions of a task with `cache=True` or `memoize=True`. When executed, it computes the
+    cache key of the task (see `get_key`): if an entry exists in the build cache, the targets (if any) are restored from
+    it, and the values and result of the actions are returned without executing them. Otherwise the actions are
+    executed, and their targets, values and result are stored in the cache.
+    """
+
+    def get_key(self):
+        # type: (...) -> str
+        """
+        Returns the cache key of the task: a hash of its actions, the path and contents of its `file_dep` files, its
+        options (including the `getargs` values) and the paths of its targets.
+        """
+        task = self.task
+        h = hashlib.sha256()
+        h.update(("v%s\n" % _ENTRY_VERSION).encode('utf-8'))
+        for a in self.actions:
+            h.update(get_action_signature(a).encode('utf-8'))
+            h.update(b'\n')
+        for path in sorted(task.file_dep):
+            h.update(("file:%s:%s\n" % (path, _get_digest(path, os.stat(path)))).encode('utf-8'))
+        options = dict(task.options or ())
+        if task.pos_arg is not None:
+            options[task.pos_arg] = task.pos_arg_val
+        h.update(json.dumps(options, sort_keys=True, default=repr).encode('utf-8'))
+        for target in task.targets:
+            h.update(("\ntarget:%s" % target).encode('utf-8'))
+        return h.hexdigest()
+
+    def execute(self, out=None, err=None):
+        cache = get_build_cache()
+        key = self.get_key()
+
+        # hit: restore the targets
+        entry = cache.get_entry(key)
+        if entry is not None:
+            values = cache.get_values(entry)
+            if values is not None and cache.restore(entry):
+                self.values, self.result = values
+                return None
+
+        # miss: execute the actions, and store their targets
+        if cache.link == 'hardlink':
+            # targets restored as hardlinks are read-only objects of the cache: replace them
+            for target in self.task.targets:
+                if os.path.isfile(target) and os.stat(target).st_nlink > 1:
+                    os.remove(target)
+        failure = self.execute_actions(out, err)
+        if failure is not None:
+            return failure
+        try:
+            cache.store(key, list(self.task.targets), self.values, self.result)
+        except (IOError, OSError):
+            # a target was modified concurrently: do not cache it
+            pass
+        return None
@@ -0,0 +1,313 @@
+"""
+Faster file checkers for doit (see `check_file_uptodate` in `doit_config`).
+"""
+import hashlib
+import json
+import mmap
+import os
+import threading
+from collections import OrderedDict
+
+from doit.dependency import FileChangedChecker
+
+from .utils import atomic_write
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Iterable, List, Optional, Tuple  # noqa: F401
+
+
+# files larger than this are memory-mapped to be hashed, instead of being read in chunks
+MMAP_THRESHOLD = 1024 * 1024
+
+# size of the chunks fed to the hash function
+CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def _new_blake2b():
+    return hashlib.blake2b(digest_size=16)
+
+
+def _new_xxh3():
+    return xxhash.xxh3_128()
+
+
+# the available digest algorithms
+DIGESTS = {'blake2b': _new_blake2b}
+if xxhash is not None:
+    DIGESTS['xxh3'] = _new_xxh3
+
+# the algorithm used for new states: xxh3 if the `xxhash` package is installed, otherwise blake2b
+DEFAULT_DIGEST = 'xxh3' if xxhash is not None else 'blake2b'
+
+
+def get_file_digest(path,                  # type: str
+                    algorithm=DEFAULT_DIGEST,  # type: str
+                    size=None              # type: int
+                    ):
+    # type: (...) -> str
+    """
+    Returns the digest of the contents of file `path`, as a string "<algorithm>:<hex digest>". Large files are
+    memory-mapped, so that they are hashed without copying their contents in python memory.
+
+    :param path: the file path
+    :param algorithm: the digest algorithm, one of `DIGESTS`
+    :param size: the file size, if already known
+    """
+    h = DIGESTS[algorithm]()
+    with open(path, 'rb') as f:
+        if size is None:
+            size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                view = memoryview(m)
+                try:
+                    for start in range(0, len(view), CHUNK_SIZE):
+                        h.update(view[start:start + CHUNK_SIZE])
+                finally:
+                    view.release()
+        else:
+            h.update(f.read())
+    return "%s:%s" % (algorithm, h.hexdigest())
+
+
+# the default maximum number of files in a `SignatureCache`
+DEFAULT_SIGNATURE_CACHE_SIZE = 100000
+
+# version of the signature cache file format
+_SIGNATURE_CACHE_VERSION = 1
+
+
+class SignatureCache(object):
+    """
+    A cache of file digests, keyed by path and (mtime_ns, size, inode): a digest is only returned if the file did not
+    change since it was computed. It is shared by all tasks, so that a file appearing in the `file_dep` of many tasks
+    is hashed at most once per run. It has a bounded size, evicting the least recently used files first, and it can be
+    saved to a file so that unchanged files are not read again in the next runs (see `signature_cache` in
+    `doit_config`).
+
+    It is thread-safe, as it is filled by the `prefetch_digests` threads.
+    """
+    __slots__ = ('path', 'max_size', 'entries', 'modified', 'lock')
+
+    def __init__(self,
+                 path=None,                               # type: str
+                 max_size=DEFAULT_SIGNATURE_CACHE_SIZE    # type: int
+                 ):
+        """
+        Creates an empty cache. Use `load` to read its contents from `path`.
+
+        :param path: an optional file path where the cache is loaded from and saved to
+        :param max_size: the maximum number of files in the cache
+        """
+        if max_size < 1:
+            raise ValueError("The signature cache size should be positive, found %r" % max_size)
+        self.path = path
+        self.max_size = max_size
+        self.entries = OrderedDict()  # type: OrderedDict[str, Tuple[Tuple[int, int, int], str]]
+        self.modified = False
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, path):
+        return path in self.entries
+
+    def get(self,
+            path,  # type: str
+            key    # type: Tuple[int, int, int]
+            ):
+        # type: (...) -> Optional[str]
+        """Returns the digest of file `path` if its (mtime_ns, size, inode) is `key`, otherwise None"""
+        with self.lock:
+            entry = self.entries.get(path, None)
+            if entry is None or entry[0] != key:
+                return None
+            self.entries.move_to_end(path)
+            return entry[1]
+
+    def set(self,
+            path,   # type: str
+            key,    # type: Tuple[int, int, int]
+            digest  # type: str
+            ):
+        """Stores the `digest` of file `path`, whose (mtime_ns, size, inode) is `key`"""
+        with self.lock:
+            self.entries[path] = (key, digest)
+            self.entries.move_to_end(path)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+            self.modified = True
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.modified = True
+
+    def load(self):
+        """Reads the cache file, if it exists. Invalid or outdated cache files are ignored."""
+        try:
+            with open(self.path, mode='rb') as f:
+                contents = json.loads(f.read().decode('utf-8'))
+            if contents['version'] != _SIGNATURE_CACHE_VERSION:
+                return
+            entries = contents['entries']
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return
+
+        with self.lock:
+            # least recently used first
+            for path, mtime_ns, size, inode, digest in entries[-self.max_size:]:
+                self.entries[path] = ((mtime_ns, size, inode), digest)
+            self.modified = False
+
+    def save(self):
+        """Writes the cache file, if the cache was modified since it was loaded"""
+        if not self.modified or self.path is None:
+            return
+        with self.lock:
+            entries = [(path, key[0], key[1], key[2], digest) for path, (key, digest) in self.entries.items()]
+            self.modified = False
+        atomic_write(self.path, json.dumps(dict(version=_SIGNATURE_CACHE_VERSION, entries=entries)).encode('utf-8'))
+
+
+# the digests computed during this run (or loaded from the `signature_cache` file), shared by all checkers
+_SIGNATURES = SignatureCache()
+
+
+def get_signature_cache():
+    # type: (...) -> SignatureCache
+    """Returns the signature cache used by `FastChecker`"""
+    return _SIGNATURES
+
+
+def set_signature_cache(cache  # type: SignatureCache
+                        ):
+    # type: (...) -> SignatureCache
+    """Sets the signature cache used by `FastChecker`, and returns the previous one"""
+    global _SIGNATURES
+    previous = _SIGNATURES
+    _SIGNATURES = cache
+    return previous
+
+
+# the number of files handled per thread pool job by `prefetch_digests`, to reduce the thread pool overhead
+_BATCH_SIZE = 256
+
+
+def _get_digest(path,       # type: str
+                file_stat,  # type: os.stat_result
+                algorithm=DEFAULT_DIGEST  # type: str
+                ):
+    # type: (...) -> str
+    """Returns the digest of file `path`, from the signature cache if it did not change since it was computed"""
+    key = (file_stat.st_mtime_ns, file_stat.st_size, file_stat.st_ino)
+    digest = _SIGNATURES.get(path, key)
+    if digest is not None and digest.startswith(algorithm + ':'):
+        return digest
+    digest = get_file_digest(path, algorithm, size=file_stat.st_size)
+    _SIGNATURES.set(path, key, digest)
+    return digest
+
+
+def _hash_batch(paths,          # type: List[str]
+                newer_than_ns,  # type: Optional[int]
+                cache           # type: SignatureCache
+                ):
+    # type: (...) -> int
+    """Hashes the files in `paths` that exist, are newer than `newer_than_ns` and are not in `cache`, into `cache`"""
+    n_hashed = 0
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        if newer_than_ns is not None and st.st_mtime_ns <= newer_than_ns:
+            continue
+        key = (st.st_mtime_ns, st.st_size, st.st_ino)
+        if cache.get(path, key) is not None:
+            continue
+        cache.set(path, key, get_file_digest(path, size=st.st_size))
+        n_hashed += 1
+    return n_hashed
+
+
+def prefetch_digests(paths,              # type: Iterable[str]
+                     workers,            # type: int
+                     newer_than_ns=None  # type: int
+                     ):
+    # type: (...) -> int
+    """
+    Computes the digests of files `paths` concurrently in a pool of `workers` threads (`stat` and the hash functions
+    release the GIL) and stores them in the signature cache, so that `FastChecker` then uses them instead of hashing
+    the files one at a time. The results are the same as serial hashing: each digest is only used if the file did not
+    change since it was computed.
+
+    :param paths: the file paths. Missing files are ignored.
+    :param workers: the number of threads
+    :param newer_than_ns: an optional modification time (in ns): older files are skipped, as their saved state is
+        expected to be up-to-date so they will not need to be hashed
+    :return: the number of files hashed
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    # remove duplicates but keep the order: files of the same directory are usually together
+    paths = list(dict.fromkeys(paths))
+    batches = [paths[i:i + _BATCH_SIZE] for i in range(0, len(paths), _BATCH_SIZE)]
+    if not batches:
+        return 0
+
+    n = len(batches)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return sum(pool.map(_hash_batch, batches, [newer_than_ns] * n, [_SIGNATURES] * n))
+
+
+class FastChecker(FileChangedChecker):
+    """
+    A doit file checker, that can be used instead of the default `MD5Checker` with
+    `doit_config(check_file_uptodate='fast')`.
+
+    The state of a file is (mtime_ns, size, inode, digest). A file is considered unchanged without reading it when its
+    modification time (in nanoseconds), size and inode are the same as in the saved state. It is considered modified
+    if its size changed. Otherwise (for example after a checkout that only touched the file) its contents are hashed
+    with a fast digest (xxh3 if the `xxhash` package is installed, otherwise blake2b), memory-mapping large files.
+    Digests are stored in a `SignatureCache` shared by all tasks, so that a file is hashed at most once per run even if
+    it is a `file_dep` of many tasks. They can also be computed in advance with `prefetch_digests` (see `hash_workers`
+    in `doit_config`), or kept between runs (see `signature_cache` in `doit_config`).
+    """
+
+    def check_modified(self, file_path, file_stat, state):
+        try:
+            mtime_ns, size, inode, digest = state
+        except (TypeError, ValueError):
+            # a state saved by another checker
+            return True
+
+        # 1 - same modification time, size and inode: unchanged
+        if file_stat.st_mtime_ns == mtime_ns and file_stat.st_size == size and file_stat.st_ino == inode:
+            return False
+
+        # 2 - different size: modified
+        if file_stat.st_size != size:
+            return True
+
+        # 3 - compare the contents, with the same algorithm than the saved digest
+        algorithm = digest.split(':', 1)[0]
+        if algorithm not in DIGESTS:
+            return True
+        return digest != _get_digest(file_path, file_stat, algorithm)
+
+    def get_state(self, dep, current_state):
+        # type: (...) -> Optional[Tuple[int, int, int, str]]
+        file_stat = os.stat(dep)
+        if current_state is not None and len(current_state) == 4 \
+                and tuple(current_state[:3]) == (file_stat.st_mtime_ns, file_stat.st_size, file_stat.st_ino):
+            # unchanged: no need to hash it again
+            return None
+        return file_stat.st_mtime_ns, file_stat.st_size, file_stat.st_ino, _get_digest(dep, file_stat)
@@ -0,0 +1,240 @@
+"""
+Cached environment activation (`env_profile` in `task` and `@cmdtask`): an activation script (for example
+`conda activate myenv` or `source env.sh`) is executed once, the environment variables it changed are captured, and the
+command actions of the tasks are then started directly with this environment instead of activating it each time.
+
+The captured changes are cached in the doit_api cache folder ('.doit_api/env_profiles'), keyed by the script, the
+working directory and the contents of its input files: the files named in the script, and the `file_dep` of an
+`EnvProfile`. An entry is only used when the variables changed by the script still have the values they had when it was
+executed (for example `PATH`). Remove the folder to activate all the profiles again.
+
+```python
+from doit_api import cmdtask
+from doit_api.envprofile import EnvProfile
+
+ML_ENV = EnvProfile('eval "$(conda shell.posix hook)" && conda activate ml', file_dep=["environment.yml"])
+
+@cmdtask(file_dep=["train.py"], env_profile=ML_ENV)
+def train():
+    return "python train.py"
+```
+"""
+import hashlib
+import json
+import os
+import shlex
+import subprocess
+import sys
+import threading
+
+from doit.exceptions import TaskError
+
+from .actions import BoundedCmdAction
+from .checkers import get_file_digest
+from .utils import atomic_write, get_cache_path
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, List, Optional, Sequence, Tuple, Union  # noqa: F401
+    from pathlib import Path  # noqa: F401
+    EnvProfileLike = Union[str, 'EnvProfile']
+
+
+# version of the cache entries format
+_ENTRY_VERSION = 1
+
+# variables set by the shell or by the python interpreter dumping the environment, not by the activation script
+_IGNORED_VARIABLES = frozenset(('PWD', 'OLDPWD', 'SHLVL', '_', 'PYTHONCOERCECLOCALE'))
+
+# the cache keys and environment changes of the profiles already used in this process (the input files are only hashed
+# once per run): (script, file_dep, cwd) > key, and key > changes
+_KEYS = dict()  # type: Dict[Tuple[str, Tuple[str, ...], str], str]
+_CHANGES = dict()  # type: Dict[str, Tuple[Dict[str, str], List[str]]]
+_LOCK = threading.Lock()
+
+# prints the environment after the activation script, after a NUL character (that can not appear in the json). The
+# interpreter must not change LC_CTYPE (PEP 538)
+_DUMP_ENV = '"%s" -c "import json, os, sys; sys.stdout.write(chr(0) + json.dumps(dict(os.environ)))"' % sys.executable
+if os.name == 'posix':
+    _DUMP_ENV = "PYTHONCOERCECLOCALE=0 " + _DUMP_ENV
+
+
+class EnvProfileError(Exception):
+    """Raised when an activation script fails"""
+
+
+class EnvProfile(object):
+    """
+    An environment activation script, whose environment changes are captured once and cached (see module docstring).
+    A plain string can be used instead in `env_profile` when there are no additional input files.
+    """
+    __slots__ = ('script', 'file_dep')
+
+    def __init__(self,
+                 script,        # type: str
+                 file_dep=None  # type: Sequence[Union[str, Path]]
+                 ):
+        """
+        :param script: the shell commands activating the environment, executed with the default shell ('/bin/sh' on
+            posix systems, 'cmd.exe' on windows)
+        :param file_dep: an optional list of files that the result of the script depends on, in addition to the files
+            named in the script itself. The cached environment is renewed when their contents change.
+        """
+        self.script = script
+        self.file_dep = tuple(str(f) for f in file_dep) if file_dep is not None else ()
+
+    def __repr__(self):
+        return "EnvProfile(%r, file_dep=%r)" % (self.script, self.file_dep)
+
+    def get_input_files(self):
+        # type: (...) -> List[str]
+        """Returns the existing files named in the script, followed by the `file_dep`"""
+        try:
+            words = shlex.split(self.script, comments=True, posix=os.name == 'posix')
+        except ValueError:
+            # unbalanced quotes
+            words = self.script.split()
+        files = [w for w in words if os.path.isfile(w)]
+        return files + [f for f in self.file_dep if f not in files]
+
+    def get_key(self):
+        # type: (...) -> str
+        """Returns the cache key of this profile: a hash of its script, working directory and input files contents"""
+        run_key = (self.script, self.file_dep, os.getcwd())
+        key = _KEYS.get(run_key)
+        if key is None:
+            key = _KEYS[run_key] = self._compute_key()
+        return key
+
+    def _compute_key(self):
+        # type: (...) -> str
+        h = hashlib.sha256()
+        h.update(json.dumps([_ENTRY_VERSION, self.script, os.getcwd()]).encode('utf-8'))
+        for path in self.get_input_files():
+            try:
+                digest = get_file_digest(path)
+            except (IOError, OSError):
+                digest = None
+            h.update(json.dumps([path, digest]).encode('utf-8'))
+        return h.hexdigest()
+
+    def activate(self):
+        # type: (...) -> Tuple[Dict[str, str], List[str]]
+        """Executes the script and returns the environment variables it changed, and the ones it removed"""
+        if os.name == 'posix':
+            cmd = "%s\n__doit_api_status=$?; [ $__doit_api_status -eq 0 ] || exit $__doit_api_status\n%s" \
+                  % (self.script, _DUMP_ENV)
+        else:
+            cmd = "%s && %s" % (self.script, _DUMP_ENV)
+        base = os.environ.copy()
+        with open(os.devnull) as devnull:
+            process = subprocess.Popen(cmd, shell=True, stdin=devnull, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                       env=base)
+            out, err = process.communicate()
+        out = out.decode('utf-8', 'replace')
+        if process.returncode != 0 or '\0' not in out:
+            raise EnvProfileError("Activation script '%s' returned %s\n%s%s"
+                                  % (self.script, process.returncode, out, err.decode('utf-8', 'replace')))
+
+        env = json.loads(out.rpartition('\0')[2])
+        changed = dict((k, v) for k, v in env.items() if base.get(k) != v and k not in _IGNORED_VARIABLES)
+        removed = sorted(k for k in base if k not in env and k not in _IGNORED_VARIABLES)
+        return changed, removed
+
+
+def to_env_profile(env_profile  # type: EnvProfileLike
+                   ):
+    # type: (...) -> EnvProfile
+    """Returns `env_profile` as an `EnvProfile`"""
+    if isinstance(env_profile, EnvProfile):
+        return env_profile
+    elif isinstance(env_profile, str):
+        return EnvProfile(env_profile)
+    else:
+        raise TypeError("env_profile should be a string or an EnvProfile, found: %r" % (env_profile,))
+
+
+def _load_changes(path  # type: str
+                  ):
+    # type: (...) -> Optional[Tuple[Dict[str, str], List[str]]]
+    """Loads the cache entry in `path`, and returns its changes if they still apply to the current environment"""
+    try:
+        with open(path, 'rb') as f:
+            entry = json.loads(f.read().decode('utf-8'))
+    except (IOError, OSError, ValueError):
+        return None
+    if any(os.environ.get(k) != v for k, v in entry['base'].items()):
+        # the activation was based on another environment
+        return None
+    return entry['changed'], entry['removed']
+
+
+def get_profile_env(env_profile  # type: EnvProfileLike
+                    ):
+    # type: (...) -> Dict[str, str]
+    """
+    Returns the environment of commands using `env_profile`: the current environment with the changes made by the
+    activation script, executed only if they are not in the cache yet.
+    """
+    env_profile = to_env_profile(env_profile)
+    key = env_profile.get_key()
+    with _LOCK:
+        changes = _CHANGES.get(key)
+        if changes is None:
+            path = get_cache_path('env_profiles', "%s.json" % key)
+            changes = _load_changes(path)
+            if changes is None:
+                changes = env_profile.activate()
+                changed, removed = changes
+                base = dict((k, os.environ.get(k)) for k in list(changed) + removed)
+                entry = dict(script=env_profile.script, changed=changed, removed=removed, base=base)
+                atomic_write(path, json.dumps(entry, indent=1, sort_keys=True).encode('utf-8'))
+            _CHANGES[key] = changes
+
+    changed, removed = changes
+    env = os.environ.copy()
+    env.update(changed)
+    for k in removed:
+        env.pop(k, None)
+    return env
+
+
+class ProfileCmdAction(BoundedCmdAction):
+    """
+    A doit command action started with the environment of an `EnvProfile` (see `task`), computed when it is first
+    executed.
+    """
+
+    def __init__(self,
+                 action,          # type: Union[str, List[str]]
+                 env_profile,     # type: EnvProfileLike
+                 output_limit=0,  # type: int
+                 **kwargs
+                 ):
+        super(ProfileCmdAction, self).__init__(action, output_limit, **kwargs)
+        self.env_profile = to_env_profile(env_profile)
+
+    def set_profile_env(self):
+        # type: (...) -> Optional[TaskError]
+        """Sets the environment of the next executions from the profile, and returns an error if it can not be set"""
+        try:
+            self.pkwargs['env'] = get_profile_env(self.env_profile)
+        except EnvProfileError as exc:
+            return TaskError("Environment profile error", exc)
+        return None
+
+    def execute(self, out=None, err=None):
+        failure = self.set_profile_env()
+        if failure is not None:
+            return failure
+        return super(ProfileCmdAction, self).execute(out, err)
+
+
+def profile_cmd_actions(actions,         # type: List[Any]
+                        env_profile,     # type: EnvProfileLike
+                        output_limit=0   # type: int
+                        ):
+    # type: (...) -> List[Any]
+    """Returns `actions`, where the command actions provided as a string or list are `ProfileCmdAction`s"""
+    return [ProfileCmdAction(a, env_profile, output_limit or 0, shell=isinstance(a, str))
+            if isinstance(a, (str, list)) else a for a in actions]
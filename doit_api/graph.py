@@ -0,0 +1,378 @@
+"""
+Analysis of the dependency graph of a set of tasks, before running them: cycles, topological levels, width of the
+as-early-as-possible schedule, and critical path. All analyses run in linear time in the number of tasks and dependencies.
+
+```python
+from doit.loader import load_tasks
+from doit_api.graph import TaskGraph
+
+graph = TaskGraph.from_tasks(load_tasks(globals()))
+print(graph.find_cycles())           # [] if the graph is acyclic
+print(graph.max_parallelism())       # a hint for `doit_config(num_process=...)`
+print(graph.critical_path())         # the longest chain of tasks, that no amount of parallelism can shorten
+```
+"""
+from fnmatch import fnmatch
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Callable, Dict, Iterable, List, Tuple, Union  # noqa: F401
+
+
+def get_task_fields(t,             # type: Any
+                    basename=None  # type: str
+                    ):
+    """
+    Returns a tuple (name, task_dep, setup, calc_dep, file_dep, targets) for `t`, that can be a doit `Task`, or a task
+    dictionary such as the ones produced by `task` and `taskgen` objects. As in doit, the full name of a task
+    dictionary is '<basename>:<name>', or '<basename>' if its `name` is not set. The subtask dictionaries yielded by a
+    task generator usually have no `basename`: the one of their generator should then be provided in `basename`.
+
+    :raises ValueError: if `t` is a task dictionary without `basename`, and `basename` is not provided
+    """
+    if isinstance(t, dict):
+        basename = t.get('basename', None) or basename
+        if basename is None:
+            raise ValueError("Task dictionary %r has no basename: the full name of its task is unknown. Please set its "
+                             "`basename`, or provide the dictionaries of its task generator" % t.get('name', None))
+        name = basename if t.get('name', None) is None else "%s:%s" % (basename, t['name'])
+        task_dep = t.get('task_dep', None) or ()
+        setup = t.get('setup', None) or ()
+        calc_dep = t.get('calc_dep', None) or ()
+        file_dep = t.get('file_dep', None) or ()
+        targets = t.get('targets', None) or ()
+    else:
+        name = t.name
+        # doit moves the wildcard task dependencies to `wild_dep`
+        task_dep = list(t.task_dep) + list(getattr(t, 'wild_dep', ()))
+        setup = t.setup_tasks
+        calc_dep = t.calc_dep
+        file_dep = t.file_dep
+        targets = t.targets
+    return name, task_dep, setup, calc_dep, file_dep, targets
+
+
+def _iter_edges(fields  # type: List[Tuple]
+                ):
+    """Yields the (before, after) task name edges of the tasks described by `fields` (see `get_task_fields`)"""
+    names = [f[0] for f in fields]
+    producers = dict()
+    for name, _, _, _, _, targets in fields:
+        for target in targets:
+            producers[target] = name
+
+    for name, task_dep, setup, calc_dep, file_dep, _ in fields:
+        for dep in _iter_dep_names(names, task_dep, setup, calc_dep):
+            yield dep, name
+        for f in file_dep:
+            producer = producers.get(f, None)
+            if producer is not None:
+                yield producer, name
+
+
+def _iter_dep_names(names,  # type: List[str]
+                    *deps   # type: Iterable[str]
+                    ):
+    """Yields the task names in the `deps` lists of names, where the wildcards are replaced with the matching `names`"""
+    for dep_list in deps:
+        for dep in dep_list:
+            if '*' in dep:
+                # wildcard: linear scan, wildcards are rare
+                for other in names:
+                    if fnmatch(other, dep):
+                        yield other
+            else:
+                yield dep
+
+
+def _next_unvisited(v,          # type: int
+                    succ,       # type: List[int]
+                    pos,        # type: int
+                    indices,    # type: List[int]
+                    lowlinks,   # type: List[int]
+                    on_stack    # type: List[bool]
+                    ):
+    """
+    Tarjan's algorithm step (see `TaskGraph.find_cycles`): returns the position after the next successor of node `v`
+    not visited yet, starting at position `pos` in its successors `succ`, or None if they were all visited. The
+    lowlink of `v` is updated with the successors met on the stack.
+    """
+    while pos < len(succ):
+        w = succ[pos]
+        pos += 1
+        if indices[w] == -1:
+            return pos
+        elif on_stack[w]:
+            lowlinks[v] = min(lowlinks[v], indices[w])
+    return None
+
+
+def _pop_component(v,        # type: int
+                   stack,    # type: List[int]
+                   on_stack  # type: List[bool]
+                   ):
+    # type: (...) -> List[int]
+    """Tarjan's algorithm step (see `TaskGraph.find_cycles`): pops the component of root `v` from the stack"""
+    component = []
+    while True:
+        w = stack.pop()
+        on_stack[w] = False
+        component.append(w)
+        if w == v:
+            return component
+
+
+class TaskGraph(object):
+    """
+    The dependency graph of a set of tasks. Nodes are tasks, and there is an edge from task `a` to task `b` if `b`
+    can only start after `a`: `a` is in the `task_dep`, `setup` or `calc_dep` of `b`, or `a` has a target that is a
+    `file_dep` of `b`.
+
+    Nodes are stored as integer indices and edges as adjacency lists of indices, so that large graphs (100k tasks)
+    stay compact and fast to analyze. Dependencies on unknown tasks are ignored (doit reports them).
+    """
+    __slots__ = ('names', 'index', 'successors', 'predecessors')
+
+    def __init__(self,
+                 names,  # type: List[str]
+                 edges   # type: Iterable[Tuple[str, str]]
+                 ):
+        """
+        Creates a graph from a list of task names and an iterable of (before, after) task name edges. You will usually
+        prefer `TaskGraph.from_tasks`.
+
+        :param names: the names of all tasks
+        :param edges: an iterable of (before, after) tuples of task names. Duplicate edges are ignored.
+        """
+        self.names = list(names)
+        self.index = index = dict((name, i) for i, name in enumerate(self.names))
+        if len(index) != len(self.names):
+            raise ValueError("Duplicate task names")
+
+        self.successors = successors = [[] for _ in self.names]  # type: List[List[int]]
+        self.predecessors = predecessors = [[] for _ in self.names]  # type: List[List[int]]
+        n = len(self.names)
+        seen = set()
+        for before, after in edges:
+            try:
+                u = index[before]
+                v = index[after]
+            except KeyError:
+                # dependency on an unknown task
+                continue
+            key = u * n + v  # (faster than a tuple)
+            if key not in seen:
+                seen.add(key)
+                successors[u].append(v)
+                predecessors[v].append(u)
+
+    @classmethod
+    def from_tasks(cls,
+                   tasks  # type: Iterable[Any]
+                   ):
+        # type: (...) -> TaskGraph
+        """
+        Creates the dependency graph of `tasks`, that can be doit `Task` objects (for example the result of
+        `doit.loader.load_tasks`) or task dictionaries. The task dictionaries without `basename` are the subtasks of the
+        last task group (a dictionary with a `basename` and `name=None`), as in the output of task generators: as in
+        doit, the group depends on all of them.
+
+        :param tasks: an iterable of doit `Task` objects or task dictionaries
+        :return: the graph
+        :raises ValueError: if a task dictionary without `basename` is not preceded by a task group
+        """
+        fields = []
+        group = None
+        for t in tasks:
+            is_subtask = isinstance(t, dict) and t.get('basename', None) is None
+            f = get_task_fields(t, basename=group[0] if is_subtask and group is not None else None)
+            if is_subtask:
+                # the group depends on its subtasks
+                group[1].append(f[0])
+            elif isinstance(t, dict) and 'name' in t and t['name'] is None:
+                group = f[0], list(f[1])
+                f = (f[0], group[1]) + f[2:]
+            fields.append(f)
+        return cls([f[0] for f in fields], _iter_edges(fields))
+
+    def __len__(self):
+        return len(self.names)
+
+    def find_cycles(self):
+        # type: (...) -> List[List[str]]
+        """
+        Returns all dependency cycles, as lists of task names (one list per strongly connected component with more
+        than one task, or per task depending on itself). An empty list means that the graph is acyclic.
+
+        This is Tarjan's algorithm, written iteratively so that long dependency chains do not hit the recursion limit.
+        """
+        successors = self.successors
+        n = len(successors)
+        indices = [-1] * n
+        lowlinks = [0] * n
+        on_stack = [False] * n
+        stack = []
+        cycles = []
+        counter = 0
+
+        for root in range(n):
+            if indices[root] != -1:
+                continue
+            # each work item is (node, position of the next successor to visit)
+            work = [(root, 0)]
+            while work:
+                v, pos = work.pop()
+                if pos == 0:
+                    indices[v] = lowlinks[v] = counter
+                    counter += 1
+                    stack.append(v)
+                    on_stack[v] = True
+
+                succ = successors[v]
+                pos = _next_unvisited(v, succ, pos, indices, lowlinks, on_stack)
+                if pos is not None:
+                    # visit the successor first, then come back to v
+                    work.append((v, pos))
+                    work.append((succ[pos - 1], 0))
+                    continue
+
+                # all successors visited
+                if lowlinks[v] == indices[v]:
+                    component = _pop_component(v, stack, on_stack)
+                    if len(component) > 1 or v in succ:
+                        cycles.append([self.names[w] for w in reversed(component)])
+                if work:
+                    parent = work[-1][0]
+                    lowlinks[parent] = min(lowlinks[parent], lowlinks[v])
+        return cycles
+
+    def _topological_order(self):
+        # type: (...) -> Tuple[List[int], List[int]]
+        """
+        Returns a tuple (order, level) where `order` is a topological order of the node indices, and `level[i]` is the
+        length of the longest chain of dependencies of node i (Kahn's algorithm).
+
+        :raises ValueError: if the graph has a cycle
+        """
+        successors = self.successors
+        in_degree = [len(p) for p in self.predecessors]
+        level = [0] * len(successors)
+        order = [i for i, d in enumerate(in_degree) if d == 0]
+        pos = 0
+        while pos < len(order):
+            v = order[pos]
+            pos += 1
+            for w in successors[v]:
+                if level[w] <= level[v]:
+                    level[w] = level[v] + 1
+                in_degree[w] -= 1
+                if in_degree[w] == 0:
+                    order.append(w)
+
+        if len(order) != len(successors):
+            raise ValueError("The task graph has dependency cycles: %r" % self.find_cycles())
+        return order, level
+
+    def levels(self):
+        # type: (...) -> List[List[str]]
+        """
+        Returns the topological levels of the graph: the first level contains all tasks without dependencies, and
+        each task is in the level following the highest level of its dependencies. All the tasks of a level can run
+        in parallel once the previous levels are done.
+
+        :raises ValueError: if the graph has a cycle
+        """
+        order, level = self._topological_order()
+        levels = [[] for _ in range(max(level) + 1)] if level else []
+        for v in order:
+            levels[level[v]].append(self.names[v])
+        return levels
+
+    def max_parallelism(self):
+        # type: (...) -> int
+        """
+        Returns the size of the largest topological level: the width of the as-early-as-possible schedule, where each
+        task starts as soon as all its dependencies are done. This is a hint for `num_process` in `doit_config`, not a
+        bound: other schedules (for example with tasks of different durations) may run more tasks at the same time.
+
+        :raises ValueError: if the graph has a cycle
+        """
+        _, level = self._topological_order()
+        if not level:
+            return 0
+        widths = [0] * (max(level) + 1)
+        for lvl in level:
+            widths[lvl] += 1
+        return max(widths)
+
+    def critical_path(self,
+                      cost=None  # type: Union[Dict[str, float], Callable[[str], float]]
+                      ):
+        # type: (...) -> Tuple[float, List[str]]
+        """
+        Returns the critical path of the graph: the chain of dependent tasks with the highest total cost. Its cost is
+        a lower bound of the total execution time, whatever the number of processes.
+
+        :param cost: the cost (for example the expected duration) of each task, as a dictionary or as a callable
+            receiving a task name. Tasks missing from the dictionary have a cost of 1. By default all tasks have a
+            cost of 1, and the critical path is the longest chain of tasks.
+        :return: a tuple (total_cost, task_names)
+        :raises ValueError: if the graph has a cycle
+        """
+        order, _ = self._topological_order()
+        if not order:
+            return 0, []
+        costs = get_costs(self.names, cost)
+
+        predecessors = self.predecessors
+        dist = [0] * len(order)
+        best_pred = [-1] * len(order)
+        for v in order:
+            best = -1
+            best_dist = 0
+            for u in predecessors[v]:
+                if best == -1 or dist[u] > best_dist:
+                    best, best_dist = u, dist[u]
+            dist[v] = best_dist + costs[v]
+            best_pred[v] = best
+
+        end = max(range(len(dist)), key=dist.__getitem__)
+        path = []
+        v = end
+        while v != -1:
+            path.append(self.names[v])
+            v = best_pred[v]
+        path.reverse()
+        return dist[end], path
+
+    def remaining_costs(self,
+                        cost=None  # type: Union[Dict[str, float], Callable[[str], float]]
+                        ):
+        # type: (...) -> Dict[str, float]
+        """
+        Returns, for each task, the cost of the most expensive chain of tasks starting with this task (itself
+        included), that is, the length of the critical path that remains once it starts.
+
+        :param cost: see `critical_path`
+        :raises ValueError: if the graph has a cycle
+        """
+        order, _ = self._topological_order()
+        costs = get_costs(self.names, cost)
+        successors = self.successors
+        remaining = [0] * len(order)
+        for v in reversed(order):
+            remaining[v] = costs[v] + max([remaining[w] for w in successors[v]] or [0])
+        return dict(zip(self.names, remaining))
+
+
+def get_costs(names,  # type: List[str]
+              cost    # type: Union[Dict[str, float], Callable[[str], float]]
+              ):
+    # type: (...) -> List[float]
+    """Returns the list of costs of tasks `names` according to `cost` (see `TaskGraph.critical_path`)"""
+    if cost is None:
+        return [1] * len(names)
+    elif isinstance(cost, dict):
+        return [cost.get(name, 1) for name in names]
+    else:
+        return [cost(name) for name in names]
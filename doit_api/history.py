@@ -0,0 +1,356 @@
+"""
+A local record of the execution history of tasks: for each run of `doit run`, the wall time, CPU time and status of
+each task (executed successfully, failed, skipped as up-to-date, or ignored) is saved in a SQLite database, next to the
+doit `dep_file`. Activate it with `doit_config(history=True)`, and query it with `RunHistory`:
+
+```python
+from doit_api.history import RunHistory
+
+with RunHistory(".doit.db.history.sqlite") as history:
+    print(history.slowest_tasks(limit=5))      # [(task_name, mean wall time), ...]
+    print(history.get_percentiles(q=95))       # {task_name: p95 wall time}
+    print(history.get_trend("build"))          # [(run start timestamp, wall time), ...]
+```
+"""
+import os
+import sqlite3
+import threading
+import time
+from timeit import default_timer
+
+from doit import reporter as doit_reporter
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Dict, List, Optional, Tuple, Type, Union  # noqa: F401
+
+
+# the name of the history file, relative to the doit `dep_file`
+HISTORY_SUFFIX = '.history.sqlite'
+
+# the doit built-in reporters that can be wrapped by name
+BUILTIN_REPORTERS = {
+    'console': doit_reporter.ConsoleReporter,
+    'executed-only': doit_reporter.ExecutedOnlyReporter,
+    'json': doit_reporter.JsonReporter,
+    'zero': doit_reporter.ZeroReporter,
+    'error-only': doit_reporter.ErrorOnlyReporter,
+}
+
+# task statuses
+SUCCESS = 'success'
+FAILURE = 'failure'
+UP_TO_DATE = 'up-to-date'
+IGNORED = 'ignored'
+EXECUTED = (SUCCESS, FAILURE)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, started REAL, ended REAL);
+CREATE TABLE IF NOT EXISTS task_runs (run_id INTEGER, task TEXT, started REAL, wall_time REAL, cpu_time REAL,
+                                      status TEXT);
+CREATE INDEX IF NOT EXISTS task_runs_task ON task_runs (task, run_id);
+CREATE INDEX IF NOT EXISTS task_runs_run ON task_runs (run_id);
+"""
+
+
+def get_history_path(dep_file=None  # type: str
+                     ):
+    # type: (...) -> str
+    """Returns the path of the history database associated with doit dependency file `dep_file` (default .doit.db)"""
+    return (dep_file or '.doit.db') + HISTORY_SUFFIX
+
+
+class RunHistory(object):
+    """
+    The SQLite database storing the execution history of tasks. It can be used as a context manager, that closes it
+    on exit.
+    """
+    __slots__ = ('path', 'conn')
+
+    def __init__(self,
+                 path  # type: str
+                 ):
+        """
+        Opens (or creates) the history database at `path`.
+
+        :param path: the database file path
+        """
+        self.path = path
+        parent = os.path.dirname(path)
+        if parent and not os.path.isdir(parent):
+            os.makedirs(parent)
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def add_run(self,
+                started,  # type: float
+                ended,    # type: float
+                records,  # type: List[Tuple[str, Optional[float], Optional[float], Optional[float], str]]
+                max_runs=None  # type: int
+                ):
+        # type: (...) -> int
+        """
+        Saves a run, in a single transaction.
+
+        :param started: the run start timestamp (`time.time()`)
+        :param ended: the run end timestamp
+        :param records: a list of (task_name, start timestamp, wall_time, cpu_time, status) tuples. Times are None for
+            tasks that were not executed, and cpu_time is None when it could not be measured.
+        :param max_runs: an optional maximum number of runs to keep: older runs are deleted.
+        :return: the id of the new run
+        """
+        with self.conn:
+            run_id = self.conn.execute("INSERT INTO runs (started, ended) VALUES (?, ?)", (started, ended)).lastrowid
+            self.conn.executemany("INSERT INTO task_runs (run_id, task, started, wall_time, cpu_time, status) "
+                                  "VALUES (%s, ?, ?, ?, ?, ?)" % run_id, records)
+            if max_runs is not None:
+                oldest_kept = run_id - max_runs + 1
+                self.conn.execute("DELETE FROM task_runs WHERE run_id < ?", (oldest_kept,))
+                self.conn.execute("DELETE FROM runs WHERE id < ?", (oldest_kept,))
+        return run_id
+
+    def _get_durations(self,
+                       task_name=None,  # type: str
+                       last_runs=None,  # type: int
+                       status=EXECUTED  # type: Tuple[str, ...]
+                       ):
+        # type: (...) -> Dict[str, List[float]]
+        """Returns a dictionary {task_name: [wall times, oldest first]} of the executions with one of `status`"""
+        query = ("SELECT task, wall_time FROM task_runs WHERE wall_time IS NOT NULL AND status IN (%s)"
+                 % ", ".join("?" * len(status)))
+        params = list(status)
+        if task_name is not None:
+            query += " AND task = ?"
+            params.append(task_name)
+        if last_runs is not None:
+            query += " AND run_id > (SELECT COALESCE(MAX(id), 0) FROM runs) - ?"
+            params.append(last_runs)
+        query += " ORDER BY run_id"
+
+        durations = dict()
+        for name, wall_time in self.conn.execute(query, params):
+            durations.setdefault(name, []).append(wall_time)
+        return durations
+
+    def slowest_tasks(self,
+                      limit=10,       # type: int
+                      last_runs=None  # type: int
+                      ):
+        # type: (...) -> List[Tuple[str, float]]
+        """
+        Returns the slowest tasks, sorted by decreasing mean wall time of their executions (skipped runs excluded).
+
+        :param limit: the maximum number of tasks to return
+        :param last_runs: an optional number of runs to consider (the most recent ones). Default: all recorded runs
+        :return: a list of (task_name, mean wall time in seconds) tuples
+        """
+        means = [(name, sum(d) / len(d)) for name, d in self._get_durations(last_runs=last_runs).items()]
+        means.sort(key=lambda m: -m[1])
+        return means[:limit]
+
+    def get_trend(self,
+                  task_name,  # type: str
+                  limit=None  # type: int
+                  ):
+        # type: (...) -> List[Tuple[float, float]]
+        """
+        Returns the durations of the executions of task `task_name` over time (skipped runs excluded).
+
+        :param task_name: the task name
+        :param limit: an optional maximum number of executions to return (the most recent ones)
+        :return: a list of (start timestamp, wall time in seconds) tuples, oldest first
+        """
+        query = ("SELECT started, wall_time FROM task_runs WHERE task = ? AND wall_time IS NOT NULL "
+                 "AND status IN (?, ?) ORDER BY run_id DESC")
+        params = [task_name, SUCCESS, FAILURE]
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        trend = self.conn.execute(query, params).fetchall()
+        trend.reverse()
+        return trend
+
+    def get_percentiles(self,
+                        q=95,            # type: float
+                        task_name=None,  # type: str
+                        last_runs=None   # type: int
+                        ):
+        # type: (...) -> Dict[str, float]
+        """
+        Returns the q-th percentile (nearest-rank) of the wall time of the executions of each task.
+
+        :param q: the percentile, between 0 and 100. Default: 95
+        :param task_name: an optional task name, to only compute it for this task
+        :param last_runs: an optional number of runs to consider (the most recent ones). Default: all recorded runs
+        :return: a dictionary {task_name: percentile}
+        """
+        return dict((name, percentile(d, q))
+                    for name, d in self._get_durations(task_name=task_name, last_runs=last_runs).items())
+
+    def get_task_costs(self,
+                       last_runs=10  # type: int
+                       ):
+        # type: (...) -> Dict[str, float]
+        """
+        Returns the median wall time of the recent successful executions of each task, to use as `task_costs` with
+        `doit_config(scheduling='critical_path')`.
+
+        :param last_runs: the number of recent runs to consider. Default: 10
+        """
+        return dict((name, percentile(d, 50))
+                    for name, d in self._get_durations(last_runs=last_runs, status=(SUCCESS,)).items())
+
+
+def percentile(values,  # type: List[float]
+               q        # type: float
+               ):
+    # type: (...) -> float
+    """Returns the q-th percentile of `values` (nearest-rank method)"""
+    values = sorted(values)
+    rank = int(-(-q * len(values) // 100))  # ceil
+    return values[min(max(rank, 1), len(values)) - 1]
+
+
+def _get_cpu_time():
+    # type: (...) -> float
+    """Returns the CPU time used by this process and by its terminated child processes (shell commands)"""
+    cpu = time.process_time()
+    try:
+        import resource
+    except ImportError:
+        # windows: child processes are not accounted
+        return cpu
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return cpu + children.ru_utime + children.ru_stime
+
+
+class HistoryReporter(object):
+    """
+    A doit reporter that records the execution history of tasks in a `RunHistory` database, and delegates the display
+    to another reporter (`base_reporter`, the console reporter by default). `doit_config(history=...)` uses a subclass
+    configured with `configure`.
+
+    The CPU time of a task is the CPU time of the doit process and of its terminated child processes (shell commands)
+    during the task. It is only recorded when tasks are executed one at a time in the doit process: it is None when
+    other tasks overlapped (`num_process`).
+    """
+    desc = 'records the history of task executions (doit_api)'
+
+    # the path to the history database
+    history_file = None
+    # the reporter used for display: a name of a doit built-in reporter, or a reporter class
+    base_reporter = 'console'
+    # the maximum number of runs to keep in the database
+    max_runs = 1000
+
+    @classmethod
+    def configure(cls,
+                  history_file,            # type: str
+                  base_reporter='console'  # type: Union[str, Type]
+                  ):
+        # type: (...) -> Type[HistoryReporter]
+        """
+        Returns a subclass of this reporter class recording the history in `history_file`, and displaying it with
+        `base_reporter`: doit creates the reporter from its class.
+        """
+        return type(cls.__name__, (cls,), dict(history_file=history_file, base_reporter=base_reporter))
+
+    def __init__(self, outstream, options):
+        base = self.base_reporter
+        if not isinstance(base, type):
+            try:
+                base = BUILTIN_REPORTERS[base]
+            except KeyError:
+                raise ValueError("Unknown reporter %r, available reporters: %s" % (base, sorted(BUILTIN_REPORTERS)))
+        self.base = base(outstream, options)
+
+        self.run_started = None
+        self.records = []    # type: List[Tuple[str, Optional[float], Optional[float], Optional[float], str]]
+        # task name > (start timestamp, start timer, start cpu time, overlapped)
+        self.in_flight = dict()
+        # tasks are started and ended from several threads with parallel_type='thread'
+        self.lock = threading.Lock()
+
+    # -- recording
+
+    def _start(self, task):
+        from multiprocessing import active_children
+
+        with self.lock:
+            for state in self.in_flight.values():
+                state[3] = True
+            # (with parallel processes the task is not executed in this process: cpu time can not be measured)
+            overlapped = len(self.in_flight) > 0 or len(active_children()) > 0
+            self.in_flight[task.name] = [time.time(), default_timer(), _get_cpu_time(), overlapped]
+
+    def _end(self, task, status):
+        with self.lock:
+            try:
+                started, start_timer, start_cpu, overlapped = self.in_flight.pop(task.name)
+            except KeyError:
+                # not started (e.g. a failure while checking the dependencies)
+                self.records.append((task.name, None, None, None, status))
+                return
+            wall_time = default_timer() - start_timer
+            cpu_time = None if overlapped else _get_cpu_time() - start_cpu
+            self.records.append((task.name, started, wall_time, cpu_time, status))
+
+    def _save(self):
+        if self.history_file is None or self.run_started is None:
+            return
+        with RunHistory(self.history_file) as history:
+            history.add_run(self.run_started, time.time(), self.records, max_runs=self.max_runs)
+        self.records = []
+
+    # -- doit reporter API
+
+    def initialize(self, tasks, selected_tasks):
+        self.run_started = time.time()
+        self.base.initialize(tasks, selected_tasks)
+
+    def get_status(self, task):
+        self.base.get_status(task)
+
+    def execute_task(self, task):
+        self._start(task)
+        self.base.execute_task(task)
+
+    def add_failure(self, task, fail):
+        self._end(task, FAILURE)
+        self.base.add_failure(task, fail)
+
+    def add_success(self, task):
+        self._end(task, SUCCESS)
+        self.base.add_success(task)
+
+    def skip_uptodate(self, task):
+        self.records.append((task.name, None, None, None, UP_TO_DATE))
+        self.base.skip_uptodate(task)
+
+    def skip_ignore(self, task):
+        self.records.append((task.name, None, None, None, IGNORED))
+        self.base.skip_ignore(task)
+
+    def cleanup_error(self, exception):
+        self.base.cleanup_error(exception)
+
+    def runtime_error(self, msg):
+        self.base.runtime_error(msg)
+
+    def teardown_task(self, task):
+        self.base.teardown_task(task)
+
+    def complete_run(self):
+        try:
+            self._save()
+        finally:
+            self.base.complete_run()
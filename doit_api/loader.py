@@ -0,0 +1,851 @@
+"""
+A `doit` task loader with additional features for large `dodo.py` files. It can be used either
+
+ - from the doit configuration (`pyproject.toml`, `doit.cfg`), as a loader plugin:
+
+   ```ini
+   [GLOBAL]
+   loader = doit_api
+
+   [LOADER]
+   doit_api = doit_api.loader:DoitApiTaskLoader
+   ```
+
+ - or from the dodo file itself, replacing `doit.run(globals())` with `doit_api.loader.run(globals())`.
+
+Note: this requires a recent version of doit (>= 0.36), that supports the `TaskLoader2` API.
+"""
+import atexit
+import hashlib
+import json
+import os
+import sys
+
+from doit import loader as doit_loader
+from doit.cmd_base import DodoTaskLoader
+from doit.exceptions import InvalidTask
+from doit.task import Task
+
+from .main import task, taskgen, set_task_selection
+from .utils import get_cache_path, atomic_write, clear_dir_listings
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Callable, Dict, List, Optional, Union  # noqa: F401
+    from .checkers import SignatureCache  # noqa: F401
+
+
+# the doit commands that can be answered from the manifest cache, without running any task generator
+MANIFEST_COMMANDS = ('list', 'info', 'help')
+
+# the doit commands whose positional arguments are task names, for which lazy task generators can be partially expanded
+SELECTION_COMMANDS = ('run', 'list', 'info', 'clean', 'forget', 'ignore')
+
+# version of the manifest file format
+_MANIFEST_VERSION = 2
+
+
+class DoitApiTaskLoader(DodoTaskLoader):
+    """
+    A task loader that behaves exactly like the default doit loader (loading tasks from the `dodo.py` file), or from a
+    namespace if `mod_dict` is provided (same as `doit.cmd_base.ModuleTaskLoader`), with the following additional
+    features, that can be activated in `DOIT_CONFIG` (see `doit_config`):
+
+     - `manifest_cache`: the definition of all tasks (names, docs, dependencies, targets, and the other fields shown by
+       `doit info`) is saved in a manifest file after each full load. The `doit list`, `doit info <task>` and
+       `doit help <task>` commands are then answered from this manifest without running any task generator, as long
+       as the dodo file and the helper modules it imports (located in the same folder or below) have not changed.
+       Tasks with uptodate checkers (for `info` without `--no-status`) or with parameters that are not json-able
+       still need a full load.
+
+     - dangling task references: the names used in the `task_dep`, `setup` and `calc_dep` of `task` objects and of
+       functions decorated with `@pytask`/`@cmdtask` are checked before any task is created, when the namespace only
+       contains such task creators (the others may define any basename). Otherwise the references of all tasks are
+       checked once the task generators have run, and all dangling ones are reported at once.
+
+     - `scheduling='critical_path'`: tasks and their dependencies are ordered so that `doit run` dispatches first the
+       tasks with the most expensive chain of tasks remaining after them.
+
+     - `signature_cache`: the digests of the `file_dep` files are loaded from a cache file before `doit run`, and
+       saved when doit exits.
+
+     - `hash_workers`: before `doit run`, the `file_dep` files that changed since the last run are hashed
+       concurrently in a thread pool.
+
+     - `taskgen_workers`: all `@taskgen` generators are evaluated concurrently, in a pool of threads or processes.
+
+     - `parallel_type='async'`: `doit run` executes the tasks with a `doit_api.runner.AsyncRunner`, that runs the
+       command actions as asyncio subprocesses (at most `async_concurrency` at the same time).
+
+     - the options used by the tasks themselves (`output_limit`, `output_spill` and the build cache options) are
+       applied when the tasks are loaded, see `apply_task_options`.
+
+    In addition, lazy task generators (`@taskgen(lazy=True)`) only create the subtasks that are selected by the current
+    command (positional arguments, or `default_tasks` for `doit run`), and the subtasks that the created tasks depend
+    on (doit checks the dependencies of all tasks, selected or not).
+    """
+
+    def __init__(self,
+                 mod_dict=None  # type: Dict
+                 ):
+        super(DoitApiTaskLoader, self).__init__()
+        self._opt_values = None
+        if mod_dict is not None:
+            # same as ModuleTaskLoader
+            if hasattr(mod_dict, '__dict__') and not isinstance(mod_dict, dict):
+                mod_dict = dict(vars(mod_dict))
+            self.namespace = mod_dict
+            self._from_module = True
+        else:
+            self._from_module = False
+
+    def setup(self, opt_values):
+        # remember the option values of the current command (for example `list --status`)
+        self._opt_values = opt_values
+        if not self._from_module:
+            super(DoitApiTaskLoader, self).setup(opt_values)
+
+    def load_tasks(self, cmd, pos_args):
+        doit_config = doit_loader.load_doit_config(self.namespace)
+        apply_task_options(doit_config)
+
+        # -- manifest cache
+        manifest_path, key = self._get_manifest(doit_config)
+        if manifest_path is not None and can_use_manifest(cmd.name, self._opt_values):
+            task_list = read_manifest(manifest_path, key)
+            if task_list is not None and manifest_can_describe(cmd.name, self._opt_values, pos_args, task_list):
+                return task_list
+
+        # -- fail fast on dangling task references, before running the (possibly slow) task generators
+        check_task_references(self.namespace)
+
+        task_list, selection = self._create_tasks(cmd, pos_args, doit_config)
+        check_loaded_task_references(task_list)
+
+        if manifest_path is not None and selection is None and not any(t.loader for t in task_list):
+            # all tasks were created (no delayed creation, no partial expansion): save the manifest
+            write_manifest(manifest_path, key, task_list)
+
+        if getattr(cmd, 'execute_tasks', False):
+            task_list = self._prepare_run(cmd, doit_config, task_list)
+        return task_list
+
+    def _get_manifest(self, doit_config):
+        """Returns the path of the manifest file and the key of the current namespace, or (None, None) if disabled"""
+        manifest_path = get_manifest_path(doit_config)
+        if manifest_path is None:
+            return None, None
+        key = get_namespace_hash(self.namespace)
+        if key is None:
+            # no source file to compute a key from: disable
+            return None, None
+        return manifest_path, key
+
+    def _create_tasks(self, cmd, pos_args, doit_config):
+        """
+        Creates the tasks of the namespace: only the selected subtasks of lazy task generators (and their dependencies),
+        and with concurrent task generators if `taskgen_workers` is set. Returns the tasks and the selection, or None
+        if all tasks were created.
+        """
+        lazy_gens = get_lazy_taskgens(self.namespace)
+        selection = get_task_selection(cmd.name, pos_args, doit_config, self.namespace) if lazy_gens else None
+
+        previous_selection = set_task_selection(selection)
+        workers = doit_config.get('taskgen_workers', None)
+        try:
+            if workers:
+                preload_taskgens(self.namespace, workers, doit_config.get('taskgen_executor', 'thread'))
+            task_list = super(DoitApiTaskLoader, self).load_tasks(cmd, pos_args)
+            if selection is not None:
+                task_list = expand_lazy_dependencies(task_list, lazy_gens)
+        finally:
+            set_task_selection(previous_selection)
+            if workers:
+                # in case of error, do not leave preloaded results behind
+                for obj in self.namespace.values():
+                    if isinstance(obj, taskgen):
+                        obj.preloaded = None
+        return task_list, selection
+
+    def _prepare_run(self, cmd, doit_config, task_list):
+        """Prepares the execution of the tasks by `cmd` (`doit run`), and returns them in the order to dispatch them"""
+        opt_values = self._opt_values or {}
+
+        # -- directory listings of the previous run, used to check the targets (see `why_am_i_running`)
+        clear_dir_listings()
+
+        # -- persisted signature cache
+        if doit_config.get('signature_cache', False):
+            load_signature_cache(doit_config)
+
+        # -- concurrent hashing of the file dependencies
+        hash_workers = doit_config.get('hash_workers', None)
+        if hash_workers:
+            dep_file = opt_values.get('dep_file', None) or doit_config.get('dep_file', None) \
+                or doit_config.get('db_file', None) or '.doit.db'
+            prefetch_file_dep_digests(task_list, hash_workers, dep_file)
+
+        # -- asyncio runner
+        if opt_values.get('par_type', None) == 'async':
+            from .runner import use_async_runner
+            use_async_runner(cmd, doit_config.get('async_concurrency', None))
+
+        # -- scheduling
+        if doit_config.get('scheduling', None) == 'critical_path':
+            task_costs = doit_config.get('task_costs', None)
+            if task_costs is None:
+                task_costs = get_recorded_task_costs(doit_config)
+            task_list = order_by_critical_path(task_list, task_costs)
+
+        return task_list
+
+
+def run(task_creators  # type: Dict
+        ):
+    """
+    Same as `doit.run` but using a `DoitApiTaskLoader`. Use it at the end of your `dodo.py`:
+
+    ```python
+    if __name__ == '__main__':
+        from doit_api.loader import run
+        run(globals())
+    ```
+
+    :param task_creators: module or dict containing task creators
+    """
+    from doit.doit_cmd import DoitMain
+    sys.exit(DoitMain(DoitApiTaskLoader(task_creators)).run(sys.argv[1:]))
+
+
+# --------- options used by the tasks
+
+
+def apply_task_options(doit_config  # type: Dict
+                       ):
+    """
+    Applies the options of `doit_config` that are used by the tasks themselves rather than by doit (`output_limit`,
+    `output_spill` and the build cache options), in the class attributes read by the tasks. As doit does for
+    `action_string_formatting`, the options that are not set are reset to their default value.
+    """
+    from .actions import BoundedCmdAction
+    from .buildcache import DEFAULT_CACHE_SIZE, BuildCache
+
+    task.default_output_limit = doit_config.get('output_limit', None)
+    BoundedCmdAction.spill = doit_config.get('output_spill', True)
+    BuildCache.cache_dir = doit_config.get('build_cache_dir', None)
+    BuildCache.cache_size = doit_config.get('build_cache_size', DEFAULT_CACHE_SIZE)
+    BuildCache.cache_link = doit_config.get('build_cache_link', 'copy')
+
+
+# --------- concurrent evaluation of task generators
+
+# the task generators to evaluate in forked worker processes
+_FORKED_TASKGENS = ()
+
+
+def _evaluate_taskgen(tg  # type: taskgen
+                      ):
+    """Evaluates task generator `tg` and returns a tuple (task_dicts, error)"""
+    task_dicts = []
+    try:
+        for task_dict in tg._create_doit_tasks():
+            task_dicts.append(task_dict)
+    except Exception as e:
+        return task_dicts, e
+    return task_dicts, None
+
+
+def _evaluate_forked_taskgen(idx  # type: int
+                             ):
+    """Same as `_evaluate_taskgen`, in a forked process: the task generator is inherited from the parent process"""
+    return _evaluate_taskgen(_FORKED_TASKGENS[idx])
+
+
+def preload_taskgens(namespace,  # type: Dict
+                     workers,    # type: int
+                     executor    # type: str
+                     ):
+    """
+    Evaluates all `@taskgen` generators of the namespace concurrently, and stores the results in each of them (see
+    `taskgen.preloaded`), so that doit then loads them in the usual order.
+
+    :param namespace: the namespace containing the task generators
+    :param workers: the number of concurrent workers
+    :param executor: 'thread' or 'process'
+    """
+    global _FORKED_TASKGENS
+
+    taskgens = [obj for obj in namespace.values() if isinstance(obj, taskgen) and obj.func is not None]
+    if len(taskgens) < 2:
+        return
+
+    for tg in taskgens:
+        # set the name now, as it would not be done in the parent process in 'process' mode
+        tg.add_default_desc_from_fun(tg.func)
+
+    if executor == 'thread':
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_evaluate_taskgen, taskgens))
+
+    elif executor == 'process':
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise ValueError("taskgen_executor='process' is only available on platforms supporting fork")
+        _FORKED_TASKGENS = taskgens
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as pool:
+                results = list(pool.map(_evaluate_forked_taskgen, range(len(taskgens))))
+        finally:
+            _FORKED_TASKGENS = ()
+    else:
+        raise ValueError("Invalid taskgen_executor: %r" % executor)
+
+    for tg, res in zip(taskgens, results):
+        tg.preloaded = res
+
+
+# --------- task references
+
+
+def get_task_index(namespace  # type: Dict
+                   ):
+    # type: (...) -> Optional[Dict[str, task]]
+    """
+    Returns a dictionary {basename: task} of all base task names that the namespace defines, when they can all be known
+    without running any task creator: all creators are `task` objects or functions decorated with `@pytask`/`@cmdtask`.
+
+    None is returned if the namespace contains task creators that may define other basenames: plain doit `task_<name>`
+    functions (a returned dict may have a `basename`), `@taskgen` generators (a yielded dict may have a `basename`),
+    other objects with a `create_doit_tasks` hook, and delayed task creators (`doit.create_after`).
+    """
+    index = dict()
+    for name, obj in namespace.items():
+        if getattr(obj, 'doit_create_after', None) is not None:
+            return None
+        if name.startswith('task_') or isinstance(obj, taskgen):
+            return None
+        elif hasattr(obj, 'create_doit_tasks'):
+            t = getattr(obj.create_doit_tasks, '__self__', None)
+            if not isinstance(t, task):
+                return None
+            index[t.name or name] = t
+    return index
+
+
+def check_task_references(namespace  # type: Dict
+                          ):
+    """
+    Checks that all task names referenced in `task_dep`, `setup` and `calc_dep` by the tasks defined in the namespace
+    exist, so that a typo is reported before the task generators are run. Names of subtasks (`<basename>:<name>`) are
+    checked at the basename level, and wildcards are not checked. Nothing is checked if the namespace can define tasks
+    with names that can not be known in advance (see `get_task_index`): the references are then checked once all tasks
+    are created, see `check_loaded_task_references`.
+
+    :raises InvalidTask: if a task references a non-existent task.
+    """
+    index = get_task_index(namespace)
+    if index is None:
+        return
+
+    errors = []
+    for t in index.values():
+        for dep_kind in ('task_dep', 'setup', 'calc_dep'):
+            for dep in getattr(t, dep_kind) or ():
+                if '*' not in dep and dep.split(':', 1)[0] not in index:
+                    errors.append("Task '%s' %s '%s' does not exist." % (t.name, dep_kind, dep))
+    if errors:
+        raise InvalidTask("\n".join(errors))
+
+
+def check_loaded_task_references(task_list  # type: List[Task]
+                                 ):
+    """
+    Checks that all task names referenced in `task_dep`, `setup` and `calc_dep` by the loaded tasks exist, once all
+    task generators have run. Unlike doit, that stops at the first dangling `task_dep` or `setup` and only reports a
+    dangling `calc_dep` when the task runs, all dangling references are reported at once. The subtasks of delayed task
+    creators (`doit.create_after`) are only created when they run: the references to them are not checked.
+
+    :raises InvalidTask: if a task references a non-existent task.
+    """
+    names = set(t.name for t in task_list)
+    delayed = set(t.name for t in task_list if t.loader)
+
+    errors = []
+    for t in task_list:
+        for dep_kind, deps in (('task_dep', t.task_dep), ('setup', t.setup_tasks), ('calc_dep', sorted(t.calc_dep))):
+            for dep in deps:
+                if dep not in names and dep.split(':', 1)[0] not in delayed:
+                    errors.append("Task '%s' %s '%s' does not exist." % (t.name, dep_kind, dep))
+    if errors:
+        raise InvalidTask("\n".join(errors))
+
+
+# --------- file dependencies
+
+
+def load_signature_cache(doit_config  # type: Dict
+                         ):
+    # type: (...) -> SignatureCache
+    """
+    Loads the signature cache file according to the `signature_cache` option, uses it as the `FastChecker` signature
+    cache, and registers it to be saved when the process exits.
+    """
+    global _SAVE_REGISTERED
+    from . import checkers
+
+    # in case tasks are loaded several times in the same process, save the current cache first
+    checkers.get_signature_cache().save()
+
+    path = doit_config['signature_cache']
+    path = get_cache_path('signatures.json') if path is True else str(path)
+    max_size = doit_config.get('signature_cache_size', checkers.DEFAULT_SIGNATURE_CACHE_SIZE)
+    cache = checkers.SignatureCache(path, max_size=max_size)
+    cache.load()
+    checkers.set_signature_cache(cache)
+    if not _SAVE_REGISTERED:
+        atexit.register(save_signature_cache)
+        _SAVE_REGISTERED = True
+    return cache
+
+
+# True when `save_signature_cache` is registered to be called at exit
+_SAVE_REGISTERED = False
+
+
+def save_signature_cache():
+    """Saves the current `FastChecker` signature cache, if it was loaded from a file and modified since then"""
+    from .checkers import get_signature_cache
+    get_signature_cache().save()
+
+
+def prefetch_file_dep_digests(task_list,  # type: List[Task]
+                              workers,    # type: int
+                              dep_file    # type: str
+                              ):
+    # type: (...) -> int
+    """
+    Hashes concurrently the `file_dep` files of all tasks (see `doit_api.checkers.prefetch_digests`), except the targets
+    of other tasks (they will change) and the files that were not modified since the dep file was last written.
+
+    :return: the number of files hashed
+    """
+    from glob import escape, glob
+    from .checkers import prefetch_digests
+
+    targets = set()
+    file_deps = set()
+    for t in task_list:
+        targets.update(t.targets)
+        file_deps.update(t.file_dep)
+    file_deps.difference_update(targets)
+
+    # the dep file may be saved as several files depending on the backend (dbm)
+    last_run_ns = None
+    for f in glob(escape(dep_file) + '*'):
+        mtime = os.stat(f).st_mtime_ns
+        if last_run_ns is None or mtime > last_run_ns:
+            last_run_ns = mtime
+
+    return prefetch_digests(file_deps, workers, newer_than_ns=last_run_ns)
+
+
+# --------- scheduling
+
+
+def get_task_cost(t,          # type: Task
+                  task_costs  # type: Optional[Union[Dict[str, float], Callable[[str], Optional[float]]]]
+                  ):
+    # type: (...) -> float
+    """
+    Returns the expected cost of doit task `t`: from `task_costs` (see `doit_config`) if it knows it, otherwise from
+    the `cost` hint in the task's `meta`, otherwise 1 (or 0 for tasks without actions, such as groups).
+    """
+    cost = None
+    if task_costs is not None:
+        if isinstance(task_costs, dict):
+            cost = task_costs.get(t.name, None)
+        else:
+            cost = task_costs(t.name)
+    if cost is None:
+        cost = (getattr(t, 'meta', None) or {}).get('cost', None)
+    if cost is None:
+        cost = 1 if t.actions else 0
+    return cost
+
+
+def get_recorded_task_costs(doit_config  # type: Dict
+                            ):
+    # type: (...) -> Optional[Dict[str, float]]
+    """Returns the task costs recorded in the history database if `history` is enabled (see `doit_config`)"""
+    history_file = doit_config.get('history', None)
+    if history_file is None or not os.path.exists(history_file):
+        return None
+    from .history import RunHistory
+    with RunHistory(history_file) as history:
+        return history.get_task_costs()
+
+
+def order_by_critical_path(task_list,  # type: List[Task]
+                           task_costs  # type: Optional[Union[Dict[str, float], Callable[[str], Optional[float]]]]
+                           ):
+    # type: (...) -> List[Task]
+    """
+    Returns the task list sorted by decreasing remaining critical-path cost (the cost of the most expensive chain of
+    tasks starting with each task), and sorts the dependencies of each task the same way.
+
+    doit dispatches the selected tasks (all tasks in this list order when none is selected) and their dependencies
+    depth-first, in list order, through a FIFO queue of ready tasks. So with this order the most expensive chains are
+    started first, and the cheap independent tasks fill the idle processes at the end of the run. The list is
+    returned unchanged if the graph has a cycle, so that doit reports it as usual.
+    """
+    from .graph import TaskGraph
+
+    tasks_by_name = dict((t.name, t) for t in task_list)
+    graph = TaskGraph.from_tasks(task_list)
+    try:
+        remaining = graph.remaining_costs(lambda name: get_task_cost(tasks_by_name[name], task_costs))
+    except ValueError:
+        return task_list
+
+    def priority(name):
+        return -remaining.get(name, 0)
+
+    for t in task_list:
+        # (python's sort is stable: ties keep their definition order)
+        t.task_dep.sort(key=priority)
+        t.setup_tasks.sort(key=priority)
+    return sorted(task_list, key=lambda t: priority(t.name))
+
+
+# --------- task selection
+
+
+def get_lazy_taskgens(namespace  # type: Dict
+                      ):
+    # type: (...) -> Dict[str, taskgen]
+    """Returns a dictionary {basename: taskgen} of all lazy task generators in the namespace"""
+    lazy_gens = dict()
+    for name, obj in namespace.items():
+        if isinstance(obj, taskgen) and obj.lazy:
+            if obj.name is None and obj.func is not None:
+                obj.add_default_desc_from_fun(obj.func)
+            lazy_gens[obj.name or name] = obj
+    return lazy_gens
+
+
+def get_task_creator_names(namespace  # type: Dict
+                           ):
+    """Returns the set of all possible base task names defined in the namespace"""
+    names = set()
+    for name, obj in namespace.items():
+        if name.startswith('task_'):
+            names.add(name[5:])
+        elif hasattr(obj, 'create_doit_tasks'):
+            names.add(name)
+            hook = obj.create_doit_tasks
+            # our objects (or functions decorated with @pytask/@cmdtask) may have another name
+            other_name = getattr(getattr(hook, '__self__', None), 'name', None)
+            if other_name is not None:
+                names.add(other_name)
+    return names
+
+
+def get_task_selection(cmd_name,     # type: str
+                       pos_args,     # type: List[str]
+                       doit_config,  # type: Dict
+                       namespace     # type: Dict
+                       ):
+    # type: (...) -> Optional[List[str]]
+    """
+    Returns the list of task names or patterns selected by command `cmd_name`, or None if all tasks may be needed.
+    For safety, None is returned as soon as an argument may not be a task name (for example a target file path, or
+    the value of a task parameter).
+    """
+    if cmd_name not in SELECTION_COMMANDS:
+        return None
+
+    selection = [a for a in pos_args if not a.startswith('-')]
+    if not selection and cmd_name == 'run':
+        selection = list(doit_config.get('default_tasks', ()))
+    if not selection:
+        return None
+
+    known_names = get_task_creator_names(namespace)
+    for pattern in selection:
+        if '*' not in pattern and pattern.split(':', 1)[0] not in known_names:
+            return None
+
+    return selection
+
+
+def expand_lazy_dependencies(task_list,  # type: List[Task]
+                             lazy_gens   # type: Dict[str, taskgen]
+                             ):
+    # type: (...) -> List[Task]
+    """
+    Creates the subtasks of lazy task generators that are required by the loaded tasks (through `task_dep`, `setup` or
+    `calc_dep`, recursively) but that were not created because they were not selected themselves. All loaded tasks are
+    considered, not only the selected ones: doit checks that the dependencies of every task exist.
+    """
+    from collections import OrderedDict
+    from fnmatch import fnmatch
+
+    tasks = OrderedDict((t.name, t) for t in task_list)
+
+    # start from all loaded tasks
+    frontier = list(tasks)
+    visited = set()
+    while frontier:
+        # find the dependencies of the current frontier
+        deps = []
+        for name in frontier:
+            if name not in visited:
+                visited.add(name)
+                t = tasks[name]
+                deps += list(t.task_dep) + list(t.setup_tasks) + list(t.calc_dep) + list(t.wild_dep)
+
+        # create the missing ones, by batch for each lazy generator
+        for basename, names in _get_missing_lazy_deps(deps, tasks, lazy_gens).items():
+            _expand_lazy_taskgen(tasks, basename, lazy_gens[basename], names)
+
+        # next frontier: all dependencies that now exist
+        frontier = []
+        for dep in deps:
+            if '*' in dep:
+                frontier += [n for n in tasks if n not in visited and fnmatch(n, dep)]
+            elif dep in tasks and dep not in visited:
+                frontier.append(dep)
+
+    return list(tasks.values())
+
+
+def _get_missing_lazy_deps(deps,      # type: List[str]
+                           tasks,     # type: Dict[str, Task]
+                           lazy_gens  # type: Dict[str, taskgen]
+                           ):
+    # type: (...) -> Dict[str, List[str]]
+    """
+    Returns the names or patterns in `deps` of the subtasks of lazy task generators that may not be created yet, as an
+    ordered dictionary {generator basename: names or patterns}
+    """
+    from collections import OrderedDict
+
+    missing = OrderedDict()
+    for dep in deps:
+        basename, sep, _ = dep.partition(':')
+        if sep and basename in lazy_gens and (dep not in tasks or '*' in dep):
+            missing.setdefault(basename, []).append(dep)
+    return missing
+
+
+def _expand_lazy_taskgen(tasks,             # type: Dict[str, Task]
+                         basename,          # type: str
+                         tg,                # type: taskgen
+                         names_or_patterns  # type: List[str]
+                         ):
+    """Adds to `tasks` the subtasks of lazy task generator `tg` matching the names or patterns, if they are missing"""
+    set_task_selection(names_or_patterns)
+    for t in doit_loader.generate_tasks(basename, tg._create_doit_tasks(), tg.doc):
+        if t.name not in tasks:
+            tasks[t.name] = t
+            group = tasks.get(t.subtask_of)
+            if group is not None:
+                group.task_dep.append(t.name)
+
+
+# --------- manifest cache
+
+
+def get_manifest_path(doit_config  # type: Dict
+                      ):
+    # type: (...) -> Optional[str]
+    """Returns the path of the manifest file according to the `manifest_cache` option, or None if it is disabled"""
+    manifest_cache = doit_config.get('manifest_cache', False)
+    if manifest_cache is True:
+        return get_cache_path('manifest.json')
+    elif manifest_cache:
+        return str(manifest_cache)
+    else:
+        return None
+
+
+def can_use_manifest(cmd_name,   # type: str
+                     opt_values  # type: Dict
+                     ):
+    # type: (...) -> bool
+    """Returns True if command `cmd_name` can be executed with the tasks read from the manifest"""
+    if cmd_name not in MANIFEST_COMMANDS:
+        return False
+    # `doit list --status` needs the uptodate checkers, that are not stored in the manifest
+    return not (opt_values or dict()).get('status', False)
+
+
+def manifest_can_describe(cmd_name,    # type: str
+                          opt_values,  # type: Dict
+                          pos_args,    # type: List[str]
+                          task_list    # type: List[Task]
+                          ):
+    # type: (...) -> bool
+    """
+    Returns True if the tasks read from the manifest contain all that command `cmd_name` shows. This is always the
+    case for `doit list`. `doit info <task>` and `doit help <task>` need the fields of the described task that could
+    not be stored in the manifest: the uptodate checkers to compute its status (for `info`, unless `--no-status` is
+    used), and its parameters or `meta` when they are not json-able.
+    """
+    if cmd_name == 'info':
+        needed = {'params', 'meta'}
+        if not (opt_values or dict()).get('hide_status', False):
+            needed.add('uptodate')
+    elif cmd_name == 'help':
+        needed = {'params', 'creator_params'}
+    else:
+        return True
+    return not any(needed.intersection(t.manifest_missing) for t in task_list if t.name in pos_args)
+
+
+def get_namespace_hash(namespace  # type: Dict
+                       ):
+    # type: (...) -> Optional[str]
+    """
+    Returns a hash of the source code of the dodo file (`__file__` in the namespace) and of all the modules it
+    imported from the same folder or below (helpers). Returns None if the namespace has no `__file__`.
+    """
+    dodo_file = namespace.get('__file__', None)
+    if dodo_file is None:
+        return None
+
+    dodo_file = os.path.abspath(dodo_file)
+    root_dir = os.path.dirname(dodo_file) + os.sep
+    files = {dodo_file}
+    for mod in list(sys.modules.values()):
+        mod_file = getattr(mod, '__file__', None)
+        if mod_file is None:
+            continue
+        mod_file = os.path.abspath(mod_file)
+        if mod_file.startswith(root_dir) and 'site-packages' not in mod_file and mod_file.endswith('.py'):
+            files.add(mod_file)
+
+    h = hashlib.sha256()
+    h.update(("%s|%s|%s\n" % (_MANIFEST_VERSION, sys.version_info[:2], _get_doit_version())).encode('utf-8'))
+    for f in sorted(files):
+        h.update(f.encode('utf-8'))
+        try:
+            with open(f, mode='rb') as fp:
+                h.update(fp.read())
+        except (IOError, OSError):
+            # removed since it was imported
+            h.update(b'<missing>')
+    return h.hexdigest()
+
+
+def _get_doit_version():
+    from doit.version import VERSION
+    return VERSION
+
+
+def task_to_manifest_entry(t  # type: Task
+                           ):
+    # type: (...) -> Dict
+    """
+    Returns a json-able representation of a doit `Task`, containing what is needed to list it or to show its info.
+    The fields that can not be stored (the uptodate checkers, and the parameters or `meta` if they are not json-able)
+    are listed in its 'missing' entry.
+    """
+    entry = dict(name=t.name, doc=t.doc)
+    if t.subtask_of is not None:
+        entry['subtask_of'] = t.subtask_of
+    if t.has_subtask:
+        entry['has_subtask'] = True
+    # note: wildcard dependencies are stored separately by doit, restore them as task_dep
+    task_dep = list(t.task_dep) + list(t.wild_dep)
+    if task_dep:
+        entry['task_dep'] = task_dep
+    if t.setup_tasks:
+        entry['setup'] = list(t.setup_tasks)
+    if t.calc_dep:
+        entry['calc_dep'] = sorted(t.calc_dep)
+    if t.file_dep:
+        entry['file_dep'] = sorted(t.file_dep)
+    if t.targets:
+        entry['targets'] = list(t.targets)
+    entry.update(_get_info_fields(t))
+    return entry
+
+
+def _get_info_fields(t  # type: Task
+                     ):
+    # type: (...) -> Dict
+    """Returns the json-able fields of `t` shown by `doit info` and `doit help`, and the names of the missing ones"""
+    entry = dict()
+    if t.getargs:
+        entry['getargs'] = dict((k, list(v)) for k, v in t.getargs.items())
+    if t.verbosity is not None:
+        entry['verbosity'] = t.verbosity
+    if t.watch:
+        entry['watch'] = list(t.watch)
+    missing = ['uptodate'] if t.uptodate else []
+    for field in ('params', 'creator_params', 'meta'):
+        value = getattr(t, field)
+        if value:
+            try:
+                stored = json.loads(json.dumps(value))
+            except (TypeError, ValueError):
+                stored = None
+            if stored == value:
+                entry[field] = stored
+            else:
+                # not json-able, or modified by json (tuples)
+                missing.append(field)
+    if missing:
+        entry['missing'] = missing
+    return entry
+
+
+def manifest_entry_to_task(entry  # type: Dict
+                           ):
+    # type: (...) -> Task
+    """
+    Creates a doit `Task` without actions from a manifest entry. Its `manifest_missing` attribute contains the names of
+    the fields that were not stored (see `task_to_manifest_entry`).
+    """
+    entry = dict(entry)
+    subtask_of = entry.pop('subtask_of', None)
+    has_subtask = entry.pop('has_subtask', False)
+    missing = entry.pop('missing', ())
+    creator_params = entry.pop('creator_params', [])
+    if 'getargs' in entry:
+        entry['getargs'] = dict((k, tuple(v)) for k, v in entry['getargs'].items())
+    t = Task(actions=None, **entry)
+    t.subtask_of = subtask_of
+    t.has_subtask = has_subtask
+    t.creator_params = creator_params
+    t.manifest_missing = tuple(missing)
+    return t
+
+
+def read_manifest(manifest_path,  # type: str
+                  key             # type: str
+                  ):
+    # type: (...) -> Optional[List[Task]]
+    """Returns the list of tasks in the manifest, or None if it does not exist or if it has a different key"""
+    try:
+        with open(manifest_path, mode='rb') as f:
+            manifest = json.loads(f.read().decode('utf-8'))
+    except (IOError, OSError, ValueError):
+        return None
+
+    if manifest.get('key') != key:
+        return None
+
+    return [manifest_entry_to_task(e) for e in manifest['tasks']]
+
+
+def write_manifest(manifest_path,  # type: str
+                   key,            # type: str
+                   task_list       # type: List[Task]
+                   ):
+    """Saves the definition of all tasks in `task_list` in the manifest file"""
+    manifest = dict(key=key, tasks=[task_to_manifest_entry(t) for t in task_list])
+    atomic_write(manifest_path, json.dumps(manifest).encode('utf-8'))
@@ -1,20 +1,19 @@
 import sys
 
-from inspect import isgeneratorfunction
-from os.path import exists
-import platform
+from .utils import find_missing_path
 
-try:
-    from typing import Callable, Union, List, Tuple, Dict, Optional, Type, Any
+# Note: typing, inspect, platform and doit are not imported at module level so that importing doit_api stays cheap.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Callable, Union, List, Tuple, Dict, Optional, Type, Any, Sequence, Iterable  # noqa: F401
     from pathlib import Path
 
     DoitAction = Union[str, List, Callable, Tuple[Callable, Tuple, Dict]]
     DoitTask = Union[str, Callable, 'task', 'taskgen']
     DoitPath = Union[str, Path]
-except ImportError:
-    pass
-
-from doit.action import CmdAction
+    from .dirdep import DirDep
+    DirDepLike = Union[str, Path, DirDep]
+    from .envprofile import EnvProfile  # noqa: F401
 
 
 # --- configuration
@@ -41,13 +40,32 @@ def doit_config(
                 # parallel processing
                 num_process=None,               # type: int
                 parallel_type=None,             # type: str
+                async_concurrency=None,         # type: int
                 # misc
-                check_file_uptodate=None,       # type: str
+                check_file_uptodate=None,       # type: Union[str, Type]
                 pdb=None,                       # type: bool
                 codec_cls=None,                 # type: Type
                 minversion=None,                # type: Union[str, Tuple[int, int, int]]
                 auto_delayed_regex=None,        # type: bool
                 action_string_formatting=None,  # type: str
+                # doit_api loader
+                manifest_cache=None,            # type: Union[bool, str, Path]
+                taskgen_workers=None,           # type: int
+                taskgen_executor=None,          # type: str
+                scheduling=None,                # type: str
+                task_costs=None,                # type: Union[Dict[str, float], Callable[[str], Optional[float]]]
+                hash_workers=None,              # type: int
+                signature_cache=None,           # type: Union[bool, str, Path]
+                signature_cache_size=None,      # type: int
+                # doit_api history
+                history=None,                   # type: Union[bool, str, Path]
+                # doit_api build cache
+                build_cache_dir=None,           # type: Union[str, Path]
+                build_cache_size=None,          # type: int
+                build_cache_link=None,          # type: str
+                # doit_api command actions
+                output_limit=None,              # type: int
+                output_spill=None,              # type: bool
                 ):
     """
     Generates a valid DOIT_CONFIG dictionary, that can contain GLOBAL options. You can use it at the beginning of your
@@ -62,6 +80,11 @@ def doit_config(
     Almost all command line options can be changed here.
     See https://pydoit.org/configuration.html#configuration-at-dodo-py
 
+    The options marked as requiring the `doit_api.loader.DoitApiTaskLoader` loader (including
+    `parallel_type='async'`) are not known to doit: a ValueError is raised if they are used while the dodo file is
+    imported by another task loader, such as the default one of the `doit` command. Nothing is checked when the dodo
+    file is executed as a script (e.g. with `doit_api.loader.run(globals())`), since the loader is not known yet.
+
     :param default_tasks: The list of tasks to run when no task names are specified in the commandline. By default
         all tasks are run. See https://pydoit.org/tasks.html#task-selection
     :param single: set this to true to execute only specified tasks ignoring their task_dep. Default: False
@@ -109,9 +132,17 @@ def doit_config(
     :param num_process: the number of parallel execution processes to use. Default 1. See
         https://pydoit.org/cmd_run.html#parallel-execution
     :param parallel_type: the type of parallelism mechanism used when process is set to a number larger than 1. A string
-        one of 'thread' (uses threads) and 'process' (uses python multiprocessing module, default).
+        one of 'thread' (uses threads), 'process' (uses python multiprocessing module, default) and 'async' (requires
+        the `doit_api.loader.DoitApiTaskLoader` loader and python 3.5+: all tasks run in the main thread, and command
+        actions are executed as asyncio subprocesses whose outputs are read by a single event loop, see
+        `doit_api.runner`). With 'async', `num_process` can be in the hundreds for I/O-bound commands.
+    :param async_concurrency: with `parallel_type='async'`, the maximum number of command actions running at the same
+        time, independently of the number of tasks in progress (`num_process`). Default: `num_process`
     :param check_file_uptodate: a string indicating how to check if files have been modified. 'md5': use the md5sum
-        (default) 'timestamp': use the timestamp. See https://pydoit.org/cmd_run.html#check-file-uptodate
+        (default) 'timestamp': use the timestamp. 'fast': use `doit_api.checkers.FastChecker`, that compares the
+        modification time (in ns), size and inode first, and only hashes the contents with a fast digest (xxh3 if
+        `xxhash` is installed, otherwise blake2b) when they differ. A custom checker class can also be provided.
+        See https://pydoit.org/cmd_run.html#check-file-uptodate
     :param pdb: set this to True to get into PDB (python debugger) post-mortem in case of unhandled exception.
         Default: False. See https://pydoit.org/cmd_run.html#pdb
     :param codec_cls: a class used to serialize and deserialize values returned by python-actions. Default `JSONCodec`.
@@ -125,6 +156,64 @@ def doit_config(
     :param action_string_formatting: Defines the templating style used by your cmd action strings for automatic variable
         substitution. It is a string that can be 'old' (default), 'new', or 'both'.
         See https://pydoit.org/tasks.html#keywords-on-cmd-action-string
+    :param manifest_cache: (requires the `doit_api.loader.DoitApiTaskLoader` loader) set this to True or to a file
+        path to save the definition of all tasks in a manifest file after each full load, and answer `doit list`,
+        `doit info <task>` and `doit help <task>` from it as long as the dodo file and its local helper modules did not
+        change. Task generators are then not run at all. The status shown by `doit info` needs the real tasks if the
+        task has uptodate checkers (use `doit info --no-status` to skip it). Note that the manifest does not know about other inputs of your task generators (for example files found
+        with `glob`): it is refreshed by any other command, such as `doit run`. Default: False
+    :param taskgen_workers: (requires the `doit_api.loader.DoitApiTaskLoader` loader) the number of workers used to
+        evaluate all `@taskgen` generators concurrently when tasks are loaded. This is useful when the generators are
+        slow and independent from each other, for example when they scan directories. The resulting tasks and their
+        order are identical to a serial evaluation. Default: None (serial evaluation)
+    :param taskgen_executor: the kind of workers used when `taskgen_workers` is set: 'thread' (default, best for
+        generators that are I/O-bound), or 'process' (for CPU-bound generators; only available on platforms supporting
+        `fork`, and the generated task dictionaries must be picklable).
+    :param scheduling: (requires the `doit_api.loader.DoitApiTaskLoader` loader) the order in which `doit run`
+        dispatches tasks. 'definition' (default) is doit's order: the order of definition in the dodo file.
+        'critical_path' dispatches first the tasks with the highest remaining critical-path cost, that is the most
+        expensive chain of tasks that depend on them, so that long chains do not start late and leave processes idle
+        at the end of a parallel run (`num_process`). The cost of each task is taken from `task_costs`, then from its
+        `cost` hint (see `task`), and is 1 for all other tasks with actions.
+    :param task_costs: the expected cost (typically the duration in seconds) of tasks, used by
+        `scheduling='critical_path'`. It can be a dictionary {task_name: cost} or a callable receiving a task name and
+        returning a cost or None. By default, if `history` is enabled, the median duration of the recent successful
+        executions of each task is used.
+    :param hash_workers: (requires the `doit_api.loader.DoitApiTaskLoader` loader) the number of threads used to
+        hash the `file_dep` files of all tasks concurrently, before `doit run` checks if tasks are up-to-date. Only the
+        files modified since the last run (more recently than the `dep_file`) are hashed, and the results are the same
+        as with serial hashing. This requires `check_file_uptodate='fast'`, that is set automatically if
+        `check_file_uptodate` is not provided. Default: None (files are hashed one at a time when needed)
+    :param signature_cache: (requires the `doit_api.loader.DoitApiTaskLoader` loader) set this to True or to a file
+        path to keep the digests of the `file_dep` files between runs, keyed by path and (mtime_ns, size, inode), so
+        that unchanged files are never read again, even by tasks that did not see them before. Within a run, each
+        file is hashed at most once whatever the number of tasks depending on it (this is always the case with
+        `check_file_uptodate='fast'`). By default the cache is saved in '.doit_api/signatures.json', when doit exits.
+        This requires `check_file_uptodate='fast'`, that is set automatically if `check_file_uptodate` is not provided.
+        Default: False
+    :param signature_cache_size: the maximum number of files in the signature cache: the least recently used ones
+        are evicted first. Default: 100000
+    :param history: set this to True or to a file path to record the execution history of tasks (wall time, CPU time,
+        status) in a local SQLite database, that you can query with `doit_api.history.RunHistory`. By default the
+        database is saved next to the `dep_file`, with suffix '.history.sqlite'. This works by wrapping the `reporter`
+        (the console reporter by default) in a `doit_api.history.HistoryReporter`: note that a `--reporter` option on
+        the command line disables it. Default: False
+    :param build_cache_dir: (requires the `doit_api.loader.DoitApiTaskLoader` loader, as all the options below) the
+        folder of the local build cache used by tasks with `cache=True`. It can be shared by several projects and doit
+        processes. Default: '.doit_api/build_cache'
+    :param build_cache_size: the maximum total size of the files in the build cache, in bytes. When doit exits after
+        storing new files, the least recently used entries are evicted until the cache fits. Default: 5GB
+    :param build_cache_link: how cached targets are restored: 'copy' (default: a copy-on-write clone when the file
+        system supports it, a copy otherwise) or 'hardlink'. Hardlinked targets share the read-only file of the cache
+        folder: the actions must replace them (write a new file, or delete them first) rather than modify them in
+        place, which would corrupt the cache when the read-only permission is not enforced (root user, tools changing
+        the permissions of their outputs). Use 'hardlink' only when this holds for all the cached tasks.
+    :param output_limit: the default maximum number of characters of the stdout and stderr of each command action kept
+        in memory (see `output_limit` in `task`), so that commands printing very large logs do not fill the memory of
+        doit. Only the last characters are kept, for the task result and the failure report. Default: None (no limit)
+    :param output_spill: if True (default), the full outputs exceeding `output_limit` are written to the
+        '.doit_api/output' folder, one file per task and stream, overwritten at each execution. If False they are
+        discarded.
     :return: a configuration dictionary that you can use as the DOIT_CONFIG variable in your dodo.py file
     """
     config_dict = dict()
@@ -175,11 +264,14 @@ def doit_config(
     # parallel processing
     if num_process is not None:
         config_dict.update(num_process=num_process)
-    if parallel_type is not None:
-        config_dict.update(par_type=parallel_type)
+    _set_option(config_dict, 'par_type', parallel_type, choices=('process', 'thread', 'async'), name='parallel_type')
+    _set_option(config_dict, 'async_concurrency', async_concurrency, minimum=1)
 
     # misc
     if check_file_uptodate is not None:
+        if check_file_uptodate == 'fast':
+            from .checkers import FastChecker
+            check_file_uptodate = FastChecker
         config_dict.update(check_file_uptodate=check_file_uptodate)
     if pdb is not None:
         config_dict.update(pdb=pdb)
@@ -192,9 +284,137 @@ def doit_config(
     if action_string_formatting is not None:
         config_dict.update(action_string_formatting=action_string_formatting)
 
+    # doit_api loader
+    _set_option(config_dict, 'manifest_cache', manifest_cache)
+    _set_option(config_dict, 'taskgen_workers', taskgen_workers)
+    _set_option(config_dict, 'taskgen_executor', taskgen_executor, choices=('thread', 'process'))
+    _set_option(config_dict, 'scheduling', scheduling, choices=('definition', 'critical_path'))
+    _set_option(config_dict, 'task_costs', task_costs)
+    _set_fast_checker_option(config_dict, 'hash_workers', hash_workers)
+    _set_fast_checker_option(config_dict, 'signature_cache', signature_cache)
+    _set_option(config_dict, 'signature_cache_size', signature_cache_size, minimum=1)
+
+    # doit_api history
+    _set_history(config_dict, history, dep_file, reporter)
+
+    # doit_api build cache and command actions (used by the tasks, not by doit: applied by the `DoitApiTaskLoader`)
+    _set_option(config_dict, 'build_cache_dir', str(build_cache_dir) if build_cache_dir is not None else None)
+    _set_option(config_dict, 'build_cache_size', build_cache_size, minimum=0)
+    _set_option(config_dict, 'build_cache_link', build_cache_link, choices=('copy', 'hardlink'))
+    _set_option(config_dict, 'output_limit', output_limit, minimum=0)
+    _set_option(config_dict, 'output_spill', output_spill)
+
+    # doit ignores (or rejects) the options above: fail early if the dodo file is imported by another task loader
+    _check_loader_options(config_dict)
+
     return config_dict
 
 
+# the options of `doit_config` that are only used by the `DoitApiTaskLoader` (in addition to parallel_type='async')
+_LOADER_OPTIONS = ('async_concurrency', 'manifest_cache', 'taskgen_workers', 'taskgen_executor', 'scheduling',
+                   'task_costs', 'hash_workers', 'signature_cache', 'signature_cache_size', 'build_cache_dir',
+                   'build_cache_size', 'build_cache_link', 'output_limit', 'output_spill')
+
+
+def _check_loader_options(config_dict  # type: Dict
+                          ):
+    """
+    Raises a ValueError if `config_dict` contains options that require the `DoitApiTaskLoader`, while the dodo file
+    is being imported by another doit task loader (for example the default one of the `doit` command), that would
+    silently ignore them. Nothing is checked when the dodo file is not imported by a task loader (for example when it
+    is executed as a script with `doit_api.loader.run(globals())`), since the loader used afterwards is not known yet.
+    """
+    used = [k for k in _LOADER_OPTIONS if k in config_dict]
+    if config_dict.get('par_type', None) == 'async':
+        used.insert(0, "parallel_type='async'")
+    if not used:
+        return
+
+    task_loader = _get_importing_task_loader()
+    if task_loader is None:
+        return
+    try:
+        from .loader import DoitApiTaskLoader
+    except ImportError:  # doit < 0.36: the loader is not available
+        DoitApiTaskLoader = ()
+    if not isinstance(task_loader, DoitApiTaskLoader):
+        raise ValueError("doit_config: %s can only be used with the `doit_api.loader.DoitApiTaskLoader` task loader, "
+                         "found %s. Add `loader = doit_api` and `doit_api = doit_api.loader:DoitApiTaskLoader` to "
+                         "your doit configuration (see the `DoitApiTaskLoader` documentation)"
+                         % (", ".join(used), type(task_loader).__name__))
+
+
+def _get_importing_task_loader():
+    """
+    Returns the doit task loader that is currently importing the dodo file calling `doit_config`, or None if the
+    dodo file is not imported by a task loader.
+    """
+    from doit import cmd_base
+    loader_types = tuple(getattr(cmd_base, n) for n in ('TaskLoader2', 'TaskLoader') if hasattr(cmd_base, n))
+    frame = sys._getframe(1)
+    while frame is not None:
+        obj = frame.f_locals.get('self', None)
+        if isinstance(obj, loader_types):
+            return obj
+        frame = frame.f_back
+    return None
+
+
+def _set_option(config_dict,   # type: Dict
+                key,           # type: str
+                value,         # type: Any
+                choices=None,  # type: Sequence[Any]
+                minimum=None,  # type: int
+                name=None      # type: str
+                ):
+    """
+    Sets option `key` to `value` in `config_dict` if `value` is not None, after checking that it is one of `choices`
+    or at least `minimum` if they are provided. `name` is the name of the option in error messages (default: `key`).
+    """
+    if value is None:
+        return
+    name = name or key
+    if choices is not None and value not in choices:
+        raise ValueError("%s should be %s or %r, found: %r"
+                         % (name, ", ".join(repr(c) for c in choices[:-1]), choices[-1], value))
+    if minimum is not None and value < minimum:
+        raise ValueError("%s should be positive, found: %r" % (name, value))
+    config_dict[key] = value
+
+
+def _set_fast_checker_option(config_dict,  # type: Dict
+                             key,          # type: str
+                             value         # type: Any
+                             ):
+    """
+    Sets option `key` to `value` in `config_dict` if `value` is set, and sets `check_file_uptodate` to `FastChecker` if
+    needed: the option requires it.
+    """
+    if not value:
+        return
+    from .checkers import FastChecker
+    checker = config_dict.setdefault('check_file_uptodate', FastChecker)
+    if not (isinstance(checker, type) and issubclass(checker, FastChecker)):
+        raise ValueError("%s requires check_file_uptodate='fast', found %r" % (key, checker))
+    config_dict[key] = value
+
+
+def _set_history(config_dict,  # type: Dict
+                 history,      # type: Union[bool, str, Path]
+                 dep_file,     # type: Optional[Union[str, Path]]
+                 reporter      # type: Optional[Union[str, Type]]
+                 ):
+    """Sets the `history` option in `config_dict` if it is set, and the `HistoryReporter` recording it as the reporter"""
+    if not history:
+        return
+    from .history import HistoryReporter, get_history_path
+    if history is True:
+        history = get_history_path(dep_file)
+    history = str(history)
+    base_reporter = reporter if reporter is not None else 'console'
+    config_dict.update(reporter=HistoryReporter.configure(history, base_reporter), history=history)
+
+
 # --- task utilities
 
 
@@ -204,10 +424,11 @@ def why_am_i_running(task, changed):
     task declared a `file_dep`, `task_dep`, `uptodate` or `targets`. Useful for debugging.
     See [this doit conversation](https://github.com/pydoit/doit/issues/277).
     """
-    for t in task.targets:
-        if not exists(t):
-            print("Running %s because one of its targets does not exist: %r" % (task, t))
-            return
+    # (the directories containing many targets are listed rather than checking each target)
+    missing = find_missing_path(task.targets)
+    if missing is not None:
+        print("Running %s because one of its targets does not exist: %r" % (task, missing))
+        return
 
     if changed is None or len(changed) == 0:
         if len(task.targets) > 0:
@@ -253,6 +474,8 @@ def validate_action(a):
     :param a:
     :return:
     """
+    from doit.action import CmdAction
+
     if isinstance(a, str):
         # command action with the shell (Popen argument shell=True)
         pass
@@ -272,24 +495,86 @@ def validate_action(a):
         raise ValueError("Action %r is not a valid action" % a)
 
 
+# the code flag of `async def` functions (inspect.CO_COROUTINE, not imported here to keep doit_api cheap)
+_CO_COROUTINE = 0x80
+
+
+def _is_coroutine_function(f):
+    return bool(getattr(getattr(f, '__code__', None), 'co_flags', 0) & _CO_COROUTINE)
+
+
+def _wrap_async_actions(actions  # type: List[DoitAction]
+                        ):
+    # type: (...) -> List[DoitAction]
+    """
+    Returns `actions`, where the python actions that are `async def` functions (or tuples of such a function and its
+    arguments) are wrapped in an `AsyncCallable`, so that their coroutine runs on the shared event loop.
+    """
+    if not any(_is_coroutine_function(a[0] if isinstance(a, tuple) and a else a) for a in actions):
+        return actions
+
+    from .aio import AsyncCallable
+    wrapped = []
+    for a in actions:
+        if isinstance(a, tuple) and a and _is_coroutine_function(a[0]):
+            a = (AsyncCallable(a[0]),) + a[1:]
+        elif _is_coroutine_function(a):
+            a = AsyncCallable(a)
+        wrapped.append(a)
+    return wrapped
+
+
+def get_task_name(o):
+    """
+    Returns the name of task dependency `o`. It can be a task name (returned as is), a `task` or `taskgen` object, a
+    function decorated with `@pytask` or `@cmdtask`, or a plain doit `task_<name>` function.
+    """
+    if isinstance(o, str):
+        return o
+    elif isinstance(o, taskbase):
+        name = o.name
+    else:
+        # a function decorated with @pytask/@cmdtask: it holds the hook of its task, that knows the final name
+        name = getattr(getattr(getattr(o, 'create_doit_tasks', None), '__self__', None), 'name', None)
+        if name is None:
+            try:
+                name = o.__name__
+            except AttributeError:
+                raise TypeError("Unsupported task reference: %r" % (o,))
+            if name.startswith('task_'):
+                name = name[5:]
+
+    if name is None:
+        raise ValueError("Task reference %r has no name yet" % (o,))
+    return name
+
+
 def replace_task_names(list_of_tasks):
     """internal helper to replace tasks with their names in a list"""
-    def gen_all():
-        for o in list_of_tasks:
-            if isinstance(o, task):
-                yield o.name
-            elif isinstance(o, taskgen):
-                yield o.name
-            elif callable(o):
-                yield o.__name__.replace('task_', '')
-            else:
-                # a string task name
-                yield o
-    return list(gen_all())
+    return [get_task_name(o) for o in list_of_tasks]
+
+
+class _DoitHook(object):
+    """
+    Descriptor providing the `create_doit_tasks` hook on instances only. Accessing it on the class raises an
+    AttributeError, so that doit does not consider our classes themselves as task creators when they are imported in
+    a dodo file. This replaces a per-instance bound method attribute, to save memory.
+    """
+    __slots__ = ('method_name',)
+
+    def __init__(self, method_name):
+        self.method_name = method_name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            raise AttributeError("create_doit_tasks is only available on instances")
+        return getattr(obj, self.method_name)
 
 
 class taskbase(object):
     """ Base class for `task` and `taskgen`. """
+    __slots__ = ('name', 'doc', 'title', 'actions')
+
     def __init__(self,
                  name,  # type: str
                  doc,   # type: str
@@ -311,6 +596,19 @@ class taskbase(object):
         self.title=title
         self.actions = None
 
+    def __getstate__(self):
+        # slotted objects have no __dict__: gather all slots of the class hierarchy (needed for pickle protocols < 2)
+        state = dict()
+        for cls in type(self).__mro__:
+            for attr in getattr(cls, '__slots__', ()):
+                if hasattr(self, attr):
+                    state[attr] = getattr(self, attr)
+        return state
+
+    def __setstate__(self, state):
+        for attr, value in state.items():
+            setattr(self, attr, value)
+
     def add_default_desc_from_fun(self, func):
         """
         Uses the information from `func` to fill the blanks in name and doc
@@ -368,6 +666,16 @@ class task(taskbase):
 
     Note: this relies on the `create_doit_tasks` hook, see https://pydoit.org/task_creation.html#custom-task-definition
     """
+    __slots__ = ('tell_why_am_i_running', 'file_dep', 'task_dep', 'uptodate', 'dir_dep', 'targets', 'clean',
+                 'setup', 'teardown', 'getargs', 'calc_dep', 'verbosity', 'cost', 'cache',
+                 'early_cutoff', 'memoize', 'code_dep', 'output_limit', 'shell_session',
+                 'env_profile', 'direct_exec')
+
+    # the default `output_limit` of command actions, set by `doit_config`
+    default_output_limit = None
+
+    # the hook for doit
+    create_doit_tasks = _DoitHook('_create_doit_tasks_noargs')
 
     def __init__(self,
                  # *,  (support for python 2: no kw only args)
@@ -383,6 +691,7 @@ class task(taskbase):
                  file_dep=None,               # type: List[DoitPath]
                  task_dep=None,               # type: List[DoitTask]
                  uptodate=None,               # type: List[Optional[Union[bool, Callable, str]]]
+                 dir_dep=None,                # type: Union[DirDepLike, List[DirDepLike]]
                  # -- advanced
                  setup=None,                  # type: List[DoitTask]
                  teardown=None,               # type: List[DoitAction]
@@ -390,6 +699,15 @@ class task(taskbase):
                  calc_dep=None,               # type: List[DoitTask]
                  # -- misc
                  verbosity=None,              # type: int
+                 cost=None,                   # type: float
+                 cache=False,                 # type: bool
+                 early_cutoff=False,          # type: bool
+                 memoize=False,               # type: bool
+                 code_dep=False,              # type: bool
+                 output_limit=None,           # type: int
+                 shell_session=None,          # type: Union[bool, str]
+                 env_profile=None,            # type: Union[str, EnvProfile]
+                 direct_exec=False,           # type: bool
                  ):
         """
         A minimal `doit` task consists of one or several actions. You must provide at least one action in `actions`.
@@ -411,7 +729,8 @@ class task(taskbase):
             normal tasks or 'name' for subtasks in a task generator (`@taskgen`).
             See https://pydoit.org/tasks.html#task-name
         :param actions: a mandatory list of actions that this task should execute. There are 2 basic kinds of actions:
-            cmd-action and python-action. See https://pydoit.org/tasks.html#actions
+            cmd-action and python-action. See https://pydoit.org/tasks.html#actions . Python actions can be `async def`
+            functions: their coroutines run on an event loop shared by all tasks, see `doit_api.aio`.
         :param doc: an optional documentation string for the task. See https://pydoit.org/tasks.html#doc
         :param title: an optional message string or callable generating a message, to print when the task is run. If
             nothing is provided, by default the task name is printed. If a string is provided, the task name will
@@ -430,6 +749,12 @@ class task(taskbase):
             `result_dep` to depend on the result of another task, `run_once` to run only once, `timeout` for time-based
             expiration, `config_changed`for changes in a "configuration" string or dictionary, and more...
             See https://pydoit.org/dependencies.html#uptodate
+        :param dir_dep: an optional directory path, `doit_api.dirdep.DirDep` (to filter files with include/exclude
+            patterns), or list of them. The task is not up-to-date if any file of these directory trees was created,
+            deleted or modified since its last execution. Changes are detected with an index of each tree persisted in
+            the '.doit_api' cache folder, so that only the files whose stat changed are read. Note that all the files
+        are still stat-ed at each check (about 0.2s for 50k files): to only rescan the folders whose modification
+        time changed (0.015s for 50k files), use `DirDep(path, trust_dir_mtime=True)` and read its limitations.
         :param targets: an optional list of strings or instances of any pathlib Path class indicating the files created
             by the task. They can be any file path (a file or folder). If a target does not exist the task will be
             executed. Two different tasks *can not* have the same target. See https://pydoit.org/tasks.html#targets
@@ -451,6 +776,53 @@ class task(taskbase):
             1 capture stdout only,
             2 do not capture anything (print everything immediately).
             Default is 1. See https://pydoit.org/tasks.html#verbosity
+        :param cost: an optional hint of the expected cost of this task (typically its duration in seconds), used to
+            dispatch expensive chains of tasks first when `doit_config(scheduling='critical_path')` is used and no
+            recorded duration is available. It is stored in the task's `meta` dictionary.
+        :param cache: if True, the targets of this task are stored in the local build cache after each execution, and
+            restored from it instead of executing the actions when the task runs again with the same actions, `file_dep`
+            contents, options and `getargs` values (for example after switching branches back and forth). The
+            `targets` are mandatory. See `doit_api.buildcache` and `build_cache_dir` in `doit_config`. Default: False.
+            WARNING: the actions are identified by the shell commands, and for python actions by the code of the
+            functions, the global variables they use and the helper functions of the same module (recursively). The
+            functions imported from other modules, the contents of mutable global variables (lists, dicts...), and the
+            scripts and programs executed by the commands are not included: declare them in `file_dep`, otherwise
+            outdated targets are restored when they change.
+        :param early_cutoff: if True, the targets of this task whose contents are byte-identical after it was executed
+            keep their previous modification time, and the result of the task is a signature of the contents of its
+            targets. The tasks depending on it (through `file_dep`, `result_dep` or `getargs`) are therefore not
+            executed when it rebuilt identical targets. The `targets` are mandatory. Default: False
+        :param memoize: if True, the values and result returned by the actions are stored in the local build cache, and
+            returned from it instead of executing the actions when the task runs again with the same actions (the code
+            of the python functions, the global variables they use and the helper functions of the same module),
+            `file_dep` contents, options and `getargs` values, for example in another branch or CI job sharing the
+            cache folder. For pure python computations, that have no `targets` (use `cache` otherwise). See
+            `build_cache_dir` in `doit_config`. Default: False. WARNING: as for `cache`, the functions imported from
+            other modules and the contents of mutable global variables are not part of the cache key: declare their
+            files in `file_dep`, otherwise outdated values are returned when they change.
+        :param code_dep: if True, the task is not up-to-date when its actions changed since its last execution: the
+            shell commands, or for python actions the bytecode, constants, default arguments and closure values of the
+            functions and their arguments (not their comments, line numbers or docstring contents). This only applies
+            to tasks that declare a `file_dep`, `uptodate` or `dir_dep`, since the others always run. As the bytecode
+            depends on the python version, these tasks also run again after an upgrade of python. Default: False
+        :param output_limit: the maximum number of characters of the stdout and stderr of each command action kept in
+            memory: above it only the last characters are kept (for the task result and the failure report), and the
+            full output is written to '.doit_api/output/<task>.<out|err>.log' (see `output_spill` in `doit_config`). Use
+            0 to keep all the output in memory. This does not apply to commands whose output is saved with `save_out`.
+            Default: `output_limit` in `doit_config`, or no limit
+        :param shell_session: set this to True or to setup commands (for example "source env.sh") to execute the shell
+            command actions in persistent shell sessions instead of a new shell each time (posix only). Sessions are
+            pooled per setup commands, that are executed once when each session starts, and each command runs in a
+            subshell of a session. See `doit_api.shells`. Default: None
+        :param env_profile: an optional environment activation script (for example "source env.sh"), or a
+            `doit_api.envprofile.EnvProfile`. The script is executed once, the environment variables it changes are
+            cached in the '.doit_api' folder, and the command actions are started with them instead of activating the
+            environment each time. It can not be used with `shell_session`. See `doit_api.envprofile`. Default: None
+        :param direct_exec: if True, the shell command actions provided as strings are executed without a shell when
+            they only contain simple commands (a program found in the PATH with literal arguments, several of them being
+            joined with '; '), which saves the start of a shell per command. Other commands are executed in a shell as
+            usual (posix only). It can not be used with `shell_session` nor `env_profile`. See
+            `doit_api.actions.split_simple_cmd`. Default: False
         """
         # base
         super(task, self).__init__(name=name, doc=doc, title=title)
@@ -460,25 +832,51 @@ class task(taskbase):
             raise TypeError("actions should be a list, found: %r" % actions)
         # for a in actions:
         #     validate_action(a)
-        self.actions = actions
+        self.actions = _wrap_async_actions(actions)
         self.tell_why_am_i_running = tell_why_am_i_running
 
-        # store other attributes
+        # store other attributes. Task references are resolved to names once here, not each time doit loads the task
         self.file_dep = file_dep
-        self.task_dep = task_dep
+        self.task_dep = replace_task_names(task_dep) if task_dep is not None else None
         self.uptodate = uptodate
+        if dir_dep is not None:
+            from .dirdep import to_dir_deps
+            dir_dep = to_dir_deps(dir_dep)
+        self.dir_dep = dir_dep
         self.targets = targets
         self.clean = clean
 
         # advanced ones
-        self.setup = setup
+        self.setup = replace_task_names(setup) if setup is not None else None
         self.teardown = teardown
         self.getargs = getargs
-        self.calc_dep = calc_dep
+        self.calc_dep = replace_task_names(calc_dep) if calc_dep is not None else None
         self.verbosity = verbosity
-
-        # finally attach the `create_doit_tasks` hook if needed
-        self.create_doit_tasks = self._create_doit_tasks_noargs
+        self.cost = cost
+        if cache and not targets:
+            raise ValueError("Task %r: cache=True requires targets" % name)
+        self.cache = cache
+        if early_cutoff and not targets:
+            raise ValueError("Task %r: early_cutoff=True requires targets" % name)
+        self.early_cutoff = early_cutoff
+        if memoize and targets:
+            raise ValueError("Task %r: memoize=True can not be used with targets, use cache=True instead" % name)
+        self.memoize = memoize
+        self.code_dep = code_dep
+        if output_limit is not None and output_limit < 0:
+            raise ValueError("Task %r: output_limit should be positive, found: %r" % (name, output_limit))
+        self.output_limit = output_limit
+        self.shell_session = shell_session
+        if env_profile is not None:
+            if shell_session:
+                raise ValueError("Task %r: env_profile can not be used with shell_session, use the activation script "
+                                 "as the shell_session setup instead" % name)
+            from .envprofile import to_env_profile
+            env_profile = to_env_profile(env_profile)
+        self.env_profile = env_profile
+        if direct_exec and (shell_session or env_profile is not None):
+            raise ValueError("Task %r: direct_exec can not be used with shell_session or env_profile" % name)
+        self.direct_exec = direct_exec
 
     def _create_doit_tasks_noargs(self):
         return self._create_doit_tasks()
@@ -490,25 +888,22 @@ class task(taskbase):
         task_dict = self.get_base_desc(is_subtask=is_subtask)
 
         # actions
-        if self.tell_why_am_i_running:
-            actions = [why_am_i_running] + self.actions
-        else:
-            actions = self.actions
-        task_dict.update(actions=actions)
+        task_dict.update(actions=self._get_doit_actions())
 
-        # task dep, setup, calc dep: support direct link
+        # task dep, setup, calc dep: already resolved to names (doit copies them)
         if self.task_dep is not None:
-            task_dict.update(task_dep=replace_task_names(self.task_dep))
+            task_dict.update(task_dep=self.task_dep)
         if self.setup is not None:
-            task_dict.update(setup=replace_task_names(self.setup))
+            task_dict.update(setup=self.setup)
         if self.calc_dep is not None:
-            task_dict.update(calc_dep=replace_task_names(self.calc_dep))
+            task_dict.update(calc_dep=self.calc_dep)
 
         # others: simply use if not none
         if self.file_dep is not None:
             task_dict.update(file_dep=self.file_dep)
-        if self.uptodate is not None:
-            task_dict.update(uptodate=self.uptodate)
+        uptodate = self._get_doit_uptodate()
+        if uptodate is not None:
+            task_dict.update(uptodate=uptodate)
         if self.targets is not None:
             task_dict.update(targets=self.targets)
         if self.clean is not None:
@@ -519,9 +914,53 @@ class task(taskbase):
             task_dict.update(getargs=self.getargs)
         if self.verbosity is not None:
             task_dict.update(verbosity=self.verbosity)
+        if self.cost is not None:
+            task_dict.update(meta=dict(cost=self.cost))
 
         return task_dict
 
+    def _get_doit_actions(self):
+        # type: (...) -> List[DoitAction]
+        """Returns the actions of the doit task: the actions of this task, wrapped according to its options"""
+        actions = self.actions
+        output_limit = self.output_limit if self.output_limit is not None else task.default_output_limit
+        if self.env_profile is not None:
+            from .envprofile import profile_cmd_actions
+            actions = profile_cmd_actions(actions, self.env_profile, output_limit)
+        elif self.shell_session:
+            from .shells import session_cmd_actions
+            setup = self.shell_session if isinstance(self.shell_session, str) else None
+            actions = session_cmd_actions(actions, setup, output_limit)
+        elif self.direct_exec:
+            from .actions import direct_cmd_actions
+            actions = direct_cmd_actions(actions, output_limit)
+        if output_limit:
+            from .actions import bound_cmd_actions
+            actions = bound_cmd_actions(actions, output_limit)
+        if self.cache or self.memoize:
+            # memoized tasks have no targets: only the values and result of the actions are cached
+            from .buildcache import CachedActions
+            actions = [CachedActions(actions)]
+        if self.early_cutoff:
+            from .actions import EarlyCutoffAction
+            actions = [EarlyCutoffAction(actions)]
+        if self.tell_why_am_i_running:
+            actions = [why_am_i_running] + actions
+        return actions
+
+    def _get_doit_uptodate(self):
+        # type: (...) -> Optional[List[Any]]
+        """Returns the `uptodate` of the doit task: the `uptodate` of this task, and the checks added by its options"""
+        uptodate = self.uptodate
+        if self.dir_dep is not None:
+            # directory trees are checked by `DirDep` uptodate callables
+            uptodate = list(uptodate or ()) + self.dir_dep
+        if self.code_dep and (self.file_dep or uptodate):
+            # changes in the actions are checked by a `CodeDep` uptodate callable
+            from .actions import CodeDep
+            uptodate = list(uptodate or ()) + [CodeDep(self.actions)]
+        return uptodate
+
 
 class taskgen(taskbase):
     """
@@ -560,10 +999,28 @@ class taskgen(taskbase):
             yield c_
     ```
 
-    `@taskgen` only accepts three optional arguments: `name` (that will be used for the base group name), doc, and
-    title.
+    `@taskgen` only accepts four optional arguments: `name` (that will be used for the base group name), doc,
+    title, and `lazy`.
+
+    With `lazy=True`, the decorated generator receives a `selected(subtask_name)` predicate, and it should only build the
+    subtasks for which it returns True. When the `DoitApiTaskLoader` is used, only the subtasks selected on the command
+    line (or in `default_tasks`), and the subtasks that the created tasks depend on, are then created:
 
+    ```python
+    @taskgen(lazy=True)
+    def mygroup(selected):
+        ''' hey!!! '''
+        for i in range(50000):
+            name = "echo%s" % i
+            if selected(name):
+                yield task(name=name, actions=["echo %s" % i])
+    ```
     """
+    __slots__ = ('func', 'lazy', 'preloaded')
+
+    # the hook for doit
+    create_doit_tasks = _DoitHook('_create_doit_tasks')
+
     def __init__(self,
                  _func=None,
                  # *,  (support for python 2: no kw only args)
@@ -571,7 +1028,9 @@ class taskgen(taskbase):
                  name=None,  # type: str
                  doc=None,   # type: str
                  # -- what the task is doing when run
-                 title=None  # type: Union[str, Callable]
+                 title=None,  # type: Union[str, Callable]
+                 # -- advanced
+                 lazy=False   # type: bool
                  ):
         """
 
@@ -583,22 +1042,39 @@ class taskgen(taskbase):
             If nothing is provided, by default the task name is printed. If a string is provided, the task name will
             automatically be printed before it. If a callable is provided it should receive a single `task` argument
             and return a string. See https://pydoit.org/tasks.html#title
+        :param lazy: if True, the decorated generator should accept a `selected(subtask_name)` predicate argument and
+            only build the subtasks for which it returns True. This predicate reflects the task selection of the
+            current doit command when the `DoitApiTaskLoader` is used, otherwise it always returns True. Note that
+            subtasks are selected by name only: if a task depends on a lazy subtask through a `file_dep`, it should also
+            declare an explicit `task_dep` on it. Default: False
         """
         # base
         super(taskgen, self).__init__(name=name, doc=doc, title=title)
 
         # this will be non-None if @taskgen is used as a decorator without arguments
         self.func = _func
+        self.lazy = lazy
+        if _func is not None:
+            # know the final name as soon as possible, so that other tasks can depend on this group
+            self.add_default_desc_from_fun(_func)
 
-        # late-rename so that doit doesn't try to call the unbound method.
-        self.create_doit_tasks = self._create_doit_tasks
+        # a tuple (task_dicts, error) if the generator was already evaluated by the DoitApiTaskLoader
+        self.preloaded = None
 
     def __call__(self, func):
         self.func = func  # When instantiated with kwargs & used as a decorator
+        self.add_default_desc_from_fun(func)
         return self
 
     def _create_doit_tasks(self):
         """Called by doit to know this task's definition"""
+        from inspect import isgeneratorfunction
+
+        if self.preloaded is not None:
+            # already evaluated concurrently by the loader (see `taskgen_workers` in `doit_config`): replay
+            for task_dict in self._replay_preloaded():
+                yield task_dict
+            return
 
         # validate decorated function - a generator
         if self.func is None:
@@ -610,11 +1086,232 @@ class taskgen(taskbase):
         self.add_default_desc_from_fun(self.func)
         yield self.get_base_desc(name=None)
 
-        for f in self.func():
-            if isinstance(f, dict):
-                yield f
+        if self.lazy:
+            selected = get_subtask_selector(self.name)
+            gen = self.func(selected if selected is not None else _select_all)
+        else:
+            selected = None
+            gen = self.func()
+
+        for task_dict in _iter_subtask_dicts(gen, selected):
+            yield task_dict
+
+    def _replay_preloaded(self):
+        """Yields the task dicts preloaded by the loader, then raises the error of the generator if any"""
+        task_dicts, error = self.preloaded
+        self.preloaded = None
+        for task_dict in task_dicts:
+            yield task_dict
+        if error is not None:
+            raise error
+
+
+def _iter_subtask_dicts(gen,      # type: Iterable[Any]
+                        selected  # type: Optional[Callable[[str], bool]]
+                        ):
+    """
+    Yields the task dicts of the subtasks yielded by `@taskgen` generator `gen`: dicts, `task`s, decorated functions
+    or `tasktable`s. If `selected` is provided, the subtasks whose name it does not select are skipped.
+    """
+    for f in gen:
+        if isinstance(f, tasktable):
+            for task_dict in f._create_doit_tasks(selected=selected):
+                yield task_dict
+        elif selected is not None and not selected(get_subtask_name(f)):
+            # the generator did not filter this one
+            continue
+        elif isinstance(f, dict):
+            yield f
+        else:
+            yield f._create_doit_tasks(is_subtask=True)
+
+
+def get_subtask_name(f):
+    """Returns the name of subtask `f` yielded by a `@taskgen` generator: a dict, a `task`, or a decorated function"""
+    if isinstance(f, dict):
+        return f.get('name')
+    elif isinstance(f, taskbase):
+        return f.name
+    else:
+        # a function decorated with @pytask or @cmdtask
+        return f._create_doit_tasks.__self__.name
+
+
+# ----------- task selection
+# The names or patterns of the tasks selected by the current doit command, or None if all tasks are needed.
+# This is set by the `DoitApiTaskLoader` while tasks are loaded, and used by lazy `@taskgen`s.
+_TASK_SELECTION = None
+
+
+def set_task_selection(patterns  # type: Optional[Sequence[str]]
+                       ):
+    # type: (...) -> Optional[Tuple[str, ...]]
+    """
+    Sets the names or patterns (with `*` wildcards) of the tasks selected by the current doit command. None means
+    that all tasks are selected.
+
+    :return: the previous selection, so that it can be restored
+    """
+    global _TASK_SELECTION
+    previous = _TASK_SELECTION
+    _TASK_SELECTION = None if patterns is None else tuple(patterns)
+    return previous
+
+
+def get_subtask_selector(basename  # type: str
+                         ):
+    # type: (...) -> Optional[Callable[[str], bool]]
+    """
+    Returns a predicate telling if a subtask of group `basename` is selected by the current task selection, given its
+    (short) name. Returns None if all subtasks of this group are selected.
+    """
+    from fnmatch import fnmatch
+
+    selection = _TASK_SELECTION
+    if selection is None or basename in selection:
+        return None
+
+    prefix = basename + ':'
+    patterns = [p for p in selection if p.startswith(prefix) or '*' in p]
+    if any(fnmatch(basename, p) for p in patterns if '*' in p):
+        # the whole group is selected
+        return None
+
+    exact = set(p[len(prefix):] for p in patterns if '*' not in p)
+    wildcards = [p for p in patterns if '*' in p]
+
+    def selected(subtask_name):
+        return subtask_name in exact or any(fnmatch(prefix + subtask_name, p) for p in wildcards)
+
+    return selected
+
+
+def _select_all(subtask_name):
+    """The predicate received by lazy task generators when all subtasks are selected"""
+    return True
+
+
+class tasktable(object):
+    """
+    A table of subtasks, to yield from a `@taskgen` generator when there are many similar subtasks. The per-subtask
+    fields are provided as parallel sequences ("columns"), and the other fields are shared by all subtasks:
+
+    ```python
+    from doit_api import taskgen, tasktable
+
+    @taskgen
+    def compile():
+        ''' compiles all files '''
+        srcs = glob("src/**/*.c", recursive=True)
+        yield tasktable(names=srcs,
+                        actions=[["gcc -c %s" % s] for s in srcs],
+                        file_dep=[[s] for s in srcs],
+                        targets=[[s[:-2] + ".o"] for s in srcs],
+                        verbosity=0)
+    ```
+
+    This is much faster than yielding one `task` per subtask: no intermediate object is created, and the shared fields
+    (title, uptodate, dependencies, verbosity...) are computed once and shared by all subtask dictionaries instead of
+    being copied.
+    """
+    __slots__ = ('names', 'actions', 'file_dep', 'targets', 'docs', 'shared')
+
+    def __init__(self,
+                 # -- columns: one element per subtask
+                 names,                       # type: Sequence[str]
+                 actions,                     # type: Sequence[List[DoitAction]]
+                 file_dep=None,               # type: Sequence[List[DoitPath]]
+                 targets=None,                # type: Sequence[List[DoitPath]]
+                 docs=None,                   # type: Sequence[str]
+                 # -- shared by all subtasks
+                 title=title_with_actions,    # type: Union[str, Callable]
+                 tell_why_am_i_running=True,  # type: bool
+                 clean=None,                  # type: Union[bool, List[DoitAction]]
+                 task_dep=None,               # type: List[DoitTask]
+                 uptodate=None,               # type: List[Optional[Union[bool, Callable, str]]]
+                 setup=None,                  # type: List[DoitTask]
+                 teardown=None,               # type: List[DoitAction]
+                 getargs=None,                # type: Dict[str, Tuple[str, str]]
+                 calc_dep=None,               # type: List[DoitTask]
+                 verbosity=None,              # type: int
+                 ):
+        """
+        Columns `names` and `actions` are mandatory, and `file_dep`, `targets` and `docs` are optional. All columns
+        that are provided should have the same length. Element `i` of each column describes subtask `i`: for example
+        `actions[i]` is the list of actions of subtask `names[i]`.
+
+        All other parameters are shared by all subtasks. See `task` for details.
+        """
+        n = len(names)
+        for col_name, col in (('actions', actions), ('file_dep', file_dep), ('targets', targets), ('docs', docs)):
+            if col is not None and len(col) != n:
+                raise ValueError("tasktable column '%s' has length %s, while there are %s names"
+                                 % (col_name, len(col), n))
+        self.names = names
+        self.actions = actions
+        self.file_dep = file_dep
+        self.targets = targets
+        self.docs = docs
+        self.shared = dict(title=title, tell_why_am_i_running=tell_why_am_i_running, clean=clean, task_dep=task_dep,
+                           uptodate=uptodate, setup=setup, teardown=teardown, getargs=getargs, calc_dep=calc_dep,
+                           verbosity=verbosity)
+
+    def __len__(self):
+        return len(self.names)
+
+    def get_shared_desc(self):
+        """Returns the dictionary of fields shared by all subtasks"""
+        shared = self.shared
+        common = dict()
+
+        # title: a single callable for all subtasks
+        title = shared['title']
+        if title is not None:
+            if isinstance(title, str):
+                def make_title(task):
+                    return "%s => %s" % (task.name, title)
+                common.update(title=make_title)
             else:
-                yield f._create_doit_tasks(is_subtask=True)
+                common.update(title=title)
+
+        # task dep, setup, calc dep: names are resolved once
+        for dep_name in ('task_dep', 'setup', 'calc_dep'):
+            if shared[dep_name] is not None:
+                common[dep_name] = replace_task_names(shared[dep_name])
+
+        # others: simply use if not none
+        for field in ('uptodate', 'clean', 'teardown', 'getargs', 'verbosity'):
+            if shared[field] is not None:
+                common[field] = shared[field]
+
+        return common
+
+    def _create_doit_tasks(self,
+                           selected=None  # type: Callable[[str], bool]
+                           ):
+        """Called by `@taskgen`: generates the subtask dictionaries (only the `selected` ones if provided)"""
+        common = self.get_shared_desc()
+        tell_why = self.shared['tell_why_am_i_running']
+        file_dep, targets, docs = self.file_dep, self.targets, self.docs
+
+        # doit extends the `uptodate` list in place when there are `getargs`: it can not be shared in that case
+        copy_uptodate = 'getargs' in common and 'uptodate' in common
+
+        for i, (name, actions) in enumerate(zip(self.names, self.actions)):
+            if selected is not None and not selected(name):
+                continue
+            task_dict = common.copy()
+            task_dict['name'] = name
+            task_dict['actions'] = [why_am_i_running] + actions if tell_why else actions
+            if file_dep is not None:
+                task_dict['file_dep'] = file_dep[i]
+            if targets is not None:
+                task_dict['targets'] = targets[i]
+            if docs is not None:
+                task_dict['doc'] = docs[i]
+            if copy_uptodate:
+                task_dict['uptodate'] = list(common['uptodate'])
+            yield task_dict
 
 
 # class TaskBase(object):
@@ -651,13 +1348,22 @@ def cmdtask(
            file_dep=None,               # type: List[DoitPath]
            task_dep=None,               # type: List[DoitTask]
            uptodate=None,               # type: List[Optional[Union[bool, Callable, str]]]
+           dir_dep=None,                # type: Union[DirDepLike, List[DirDepLike]]
            # -- advanced
            setup=None,                  # type: List[DoitTask]
            teardown=None,               # type: List[DoitAction]
            getargs=None,                # type: Dict[str, Tuple[str, str]]
            calc_dep=None,               # type: List[DoitTask]
            # -- misc
-           verbosity=None               # type: int
+           verbosity=None,              # type: int
+           cost=None,                   # type: float
+           cache=False,                 # type: bool
+           early_cutoff=False,          # type: bool
+           code_dep=False,              # type: bool
+           output_limit=None,           # type: int
+           shell_session=None,          # type: Union[bool, str]
+           env_profile=None,            # type: Union[str, EnvProfile]
+           direct_exec=False            # type: bool
 ):
     """
     A decorator to create a task containing a shell command action (returned by the decorated function), and
@@ -702,6 +1408,9 @@ def cmdtask(
      - a tuple (not list!) of strings or pathlib Paths (command to be executed without the shell).
      - a list of strings or tuples. Note that in this case strings can not be multiline.
 
+    With `direct_exec=True`, strings whose lines are all simple commands (a program with literal arguments, without
+    variables, redirections, pipes, globs or builtins) are executed without a shell, one line at a time.
+
     See [doit cmd-action](https://pydoit.org/tasks.html#cmd-action).
 
     You can specify actions to be done before and after that/these `actions` in `pre_actions` and `post_actions`.
@@ -745,6 +1454,12 @@ def cmdtask(
         `result_dep` to depend on the result of another task, `run_once` to run only once, `timeout` for time-based
         expiration, `config_changed`for changes in a "configuration" string or dictionary, and more...
         See https://pydoit.org/dependencies.html#uptodate
+    :param dir_dep: an optional directory path, `doit_api.dirdep.DirDep` (to filter files with include/exclude
+        patterns), or list of them. The task is not up-to-date if any file of these directory trees was created,
+        deleted or modified since its last execution. Changes are detected with an index of each tree persisted in
+        the '.doit_api' cache folder, so that only the files whose stat changed are read. Note that all the files
+        are still stat-ed at each check (about 0.2s for 50k files): to only rescan the folders whose modification
+        time changed (0.015s for 50k files), use `DirDep(path, trust_dir_mtime=True)` and read its limitations.
     :param targets: an optional list of strings or instances of any pathlib Path class indicating the files created
         by the task. They can be any file path (a file or folder). If a target does not exist the task will be
         executed. Two different tasks *can not* have the same target. See https://pydoit.org/tasks.html#targets
@@ -766,6 +1481,40 @@ def cmdtask(
         1 capture stdout only,
         2 do not capture anything (print everything immediately).
         Default is 1. See https://pydoit.org/tasks.html#verbosity
+    :param cost: an optional hint of the expected cost of this task (typically its duration in seconds), used to
+        dispatch expensive chains of tasks first when `doit_config(scheduling='critical_path')` is used and no
+        recorded duration is available. It is stored in the task's `meta` dictionary.
+    :param cache: if True, the targets of this task are stored in the local build cache after each execution, and
+        restored from it instead of executing the actions when the task runs again with the same actions, `file_dep`
+        contents, options and `getargs` values (for example after switching branches back and forth). The `targets`
+        are mandatory. See `doit_api.buildcache` and `build_cache_dir` in `doit_config`. Default: False. WARNING: the
+        functions imported from other modules, the contents of mutable global variables and the scripts and programs
+        executed by the commands are not part of the cache key: declare them in `file_dep`, otherwise outdated targets
+        are restored when they change (see `task`).
+    :param early_cutoff: if True, the targets of this task whose contents are byte-identical after it was executed
+        keep their previous modification time, and the result of the task is a signature of the contents of its
+        targets. The tasks depending on it (through `file_dep`, `result_dep` or `getargs`) are therefore not executed
+        when it rebuilt identical targets. The `targets` are mandatory. Default: False
+    :param code_dep: if True, the task is not up-to-date when the command returned by the decorated function (joined as
+        it is executed) or the other actions changed since its last execution. This only applies to tasks that declare a
+        `file_dep`, `uptodate` or `dir_dep`, since the others always run. As the bytecode of the python actions depends
+        on the python version, these tasks also run again after an upgrade of python. Default: False
+    :param output_limit: the maximum number of characters of the stdout and stderr of each command kept in memory:
+        above it only the last characters are kept, and the full output is written to a file of the '.doit_api/output'
+        folder. Use 0 to keep all the output in memory. Default: `output_limit` in `doit_config`, or no limit
+    :param shell_session: set this to True or to setup commands (for example "conda activate myenv") to execute the
+        commands in a pool of persistent shell sessions, where the setup commands are executed only once per session,
+        instead of a new shell each time (posix only). See `doit_api.shells`. Default: None
+    :param env_profile: an optional environment activation script (for example "source env.sh"), or a
+        `doit_api.envprofile.EnvProfile`, executed once: the environment variables it changes are cached, and the
+        commands are started with them instead of activating the environment each time. See `doit_api.envprofile`.
+        Default: None
+    :param direct_exec: if True, the commands that only contain simple commands (a program found in the PATH with
+        literal arguments: no variables, redirections, pipes, globs...), such as the lines of a multiline string without
+        shell syntax, are executed directly without starting a shell (posix only). Other commands are executed in a
+        shell as usual. Note that the programs are then used instead of the shell builtins (for example `/bin/echo`
+        instead of the `echo` builtin), and that a command killed by a signal fails instead of raising an error, as the
+        exit code is not reported by a shell. It can not be used with `shell_session` nor `env_profile`. Default: False
     """
 
     # our decorator
@@ -806,15 +1555,16 @@ def cmdtask(
                       title=title, actions=actions,
                       tell_why_am_i_running=tell_why_am_i_running,
                       targets=targets, clean=clean, file_dep=file_dep, task_dep=task_dep, uptodate=uptodate,
-                      setup=setup, teardown=teardown, getargs=getargs, calc_dep=calc_dep,
-                      verbosity=verbosity)
+                      dir_dep=dir_dep, setup=setup, teardown=teardown, getargs=getargs, calc_dep=calc_dep,
+                      verbosity=verbosity, cost=cost, cache=cache,
+                      early_cutoff=early_cutoff, code_dep=code_dep, output_limit=output_limit,
+                      shell_session=shell_session, env_profile=env_profile, direct_exec=direct_exec)
 
         # declare the fun
         f_task.add_default_desc_from_fun(f)
 
-        # move the hooks from f_task to f
+        # attach the hooks from f_task to f
         f.create_doit_tasks = f_task.create_doit_tasks
-        del f_task.create_doit_tasks
         f._create_doit_tasks = f_task._create_doit_tasks
 
         return f
@@ -844,13 +1594,19 @@ def pytask(
            file_dep=None,               # type: List[DoitPath]
            task_dep=None,               # type: List[DoitTask]
            uptodate=None,               # type: List[Optional[Union[bool, Callable, str]]]
+           dir_dep=None,                # type: Union[DirDepLike, List[DirDepLike]]
            # -- advanced
            setup=None,                  # type: List[DoitTask]
            teardown=None,               # type: List[DoitAction]
            getargs=None,                # type: Dict[str, Tuple[str, str]]
            calc_dep=None,               # type: List[DoitTask]
            # -- misc
-           verbosity=None               # type: int
+           verbosity=None,              # type: int
+           cost=None,                   # type: float
+           cache=False,                 # type: bool
+           early_cutoff=False,          # type: bool
+           memoize=False,               # type: bool
+           code_dep=False               # type: bool
            ):
     """
     A decorator to create a task containing a python action (the decorated function), and optional additional actions.
@@ -869,6 +1625,8 @@ def pytask(
     ```
 
     A minimal `doit` task consists of one or several actions. Here, the main action is a call to the decorated function.
+    It can be an `async def` function: its coroutine then runs on an event loop shared by all tasks (see `doit_api.aio`),
+    so that with a threaded doit runner (`doit run -n 8 -P thread`) several tasks can await I/O at the same time.
     You can specify actions to be done before and after that/these `actions` in `pre_actions` and `post_actions`.
     If `tell_why_i_am_running=True` (default) an additional action will be prepended to print the reason why the
     task is running if the task declared a `file_dep`, `task_dep`, `uptodate` or `targets`.
@@ -910,6 +1668,12 @@ def pytask(
         `result_dep` to depend on the result of another task, `run_once` to run only once, `timeout` for time-based
         expiration, `config_changed`for changes in a "configuration" string or dictionary, and more...
         See https://pydoit.org/dependencies.html#uptodate
+    :param dir_dep: an optional directory path, `doit_api.dirdep.DirDep` (to filter files with include/exclude
+        patterns), or list of them. The task is not up-to-date if any file of these directory trees was created,
+        deleted or modified since its last execution. Changes are detected with an index of each tree persisted in
+        the '.doit_api' cache folder, so that only the files whose stat changed are read. Note that all the files
+        are still stat-ed at each check (about 0.2s for 50k files): to only rescan the folders whose modification
+        time changed (0.015s for 50k files), use `DirDep(path, trust_dir_mtime=True)` and read its limitations.
     :param targets: an optional list of strings or instances of any pathlib Path class indicating the files created
         by the task. They can be any file path (a file or folder). If a target does not exist the task will be
         executed. Two different tasks *can not* have the same target. See https://pydoit.org/tasks.html#targets
@@ -931,6 +1695,33 @@ def pytask(
         1 capture stdout only,
         2 do not capture anything (print everything immediately).
         Default is 1. See https://pydoit.org/tasks.html#verbosity
+    :param cost: an optional hint of the expected cost of this task (typically its duration in seconds), used to
+        dispatch expensive chains of tasks first when `doit_config(scheduling='critical_path')` is used and no
+        recorded duration is available. It is stored in the task's `meta` dictionary.
+    :param cache: if True, the targets of this task are stored in the local build cache after each execution, and
+        restored from it instead of executing the actions when the task runs again with the same actions, `file_dep`
+        contents, options and `getargs` values (for example after switching branches back and forth). The `targets`
+        are mandatory. See `doit_api.buildcache` and `build_cache_dir` in `doit_config`. Default: False. WARNING: the
+        functions imported from other modules, the contents of mutable global variables and the scripts and programs
+        executed by the commands are not part of the cache key: declare them in `file_dep`, otherwise outdated targets
+        are restored when they change (see `task`).
+    :param early_cutoff: if True, the targets of this task whose contents are byte-identical after it was executed
+        keep their previous modification time, and the result of the task is a signature of the contents of its
+        targets. The tasks depending on it (through `file_dep`, `result_dep` or `getargs`) are therefore not executed
+        when it rebuilt identical targets. The `targets` are mandatory. Default: False
+    :param memoize: if True, the values and result returned by the decorated function (and the other actions) are
+        stored in the local build cache, and returned from it instead of calling the function when the task runs again
+        with the same function code (including the global variables it uses and the helper functions of the same
+        module), `file_dep` contents, options and `getargs` values, for example in another branch or CI job sharing
+        the cache folder. For pure computations, that have no `targets` (use `cache` otherwise). See `build_cache_dir`
+        in `doit_config`. Default: False. WARNING: the functions imported from other modules and the contents of
+        mutable global variables are not part of the cache key: declare their files in `file_dep`, otherwise outdated
+        values are returned when they change.
+    :param code_dep: if True, the task is not up-to-date when the decorated function (its bytecode, constants, default
+        arguments and closure values, not its comments, line numbers or docstring contents) or the other actions
+        changed since its last execution. This only applies to tasks that declare a `file_dep`, `uptodate` or `dir_dep`,
+        since the others always run. As the bytecode depends on the python version, these tasks also run again after
+        an upgrade of python. Default: False
     """
     # our decorator
     def _decorate(f  # type: Callable
@@ -957,15 +1748,15 @@ def pytask(
                       title=title, actions=actions,
                       tell_why_am_i_running=tell_why_am_i_running,
                       targets=targets, clean=clean, file_dep=file_dep, task_dep=task_dep, uptodate=uptodate,
-                      setup=setup, teardown=teardown, getargs=getargs, calc_dep=calc_dep,
-                      verbosity=verbosity)
+                      dir_dep=dir_dep, setup=setup, teardown=teardown, getargs=getargs, calc_dep=calc_dep,
+                      verbosity=verbosity, cost=cost, cache=cache,
+                      early_cutoff=early_cutoff, memoize=memoize, code_dep=code_dep)
 
         # declare the fun
         f_task.add_default_desc_from_fun(f)
 
-        # move the hooks from f_task to f
+        # attach the hooks from f_task to f
         f.create_doit_tasks = f_task.create_doit_tasks
-        del f_task.create_doit_tasks
         f._create_doit_tasks = f_task._create_doit_tasks
 
         return f
@@ -1021,7 +1812,7 @@ def get_multiline_actions(a_string):
     return [l for l in lines if len(l) > 0]
 
 
-OS_CMD_SEP = '& ' if platform.system() == 'Windows' else '; '
+OS_CMD_SEP = '& ' if sys.platform == 'win32' else '; '
 
 
 def join_cmds(cmds_list):
@@ -0,0 +1,340 @@
+"""
+An asyncio-based doit runner, used by `doit run` when the parallel type is 'async' (`doit run -n 500 -P async`, or
+`doit_config(num_process=500, parallel_type='async')`). It requires the `doit_api.loader.DoitApiTaskLoader` loader
+and python 3.5+.
+
+All tasks run in the main thread, on one event loop: the command actions are launched as asyncio subprocesses and
+their output pipes are multiplexed on the loop, so hundreds of I/O-bound commands can run at the same time without a
+thread or a process each. `num_process` is the number of tasks in progress, and `async_concurrency` (in `doit_config`)
+limits the number of commands running at the same time. Python actions, the command actions of tasks using `cache` or
+`early_cutoff`, and the ones of tasks using `shell_session` are executed synchronously as with the default runner, so
+they block the other tasks while they run (a `shell_session` is better used with the default runner). The activation
+script of an `env_profile` is also executed synchronously, when its environment is not cached yet.
+"""
+import asyncio
+import codecs
+import functools
+import io
+import os
+import subprocess
+import sys
+
+from doit.action import CmdAction
+from doit.exceptions import BaseFail, TaskError, TaskFailed
+from doit.runner import JobHold, MRunner
+
+from .actions import BoundedCmdAction, DirectCmdAction
+from .envprofile import ProfileCmdAction
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, IO, List, Optional, Tuple, Union  # noqa: F401
+    from doit.cmd_base import DoitCmdBase  # noqa: F401
+
+
+# the size of the chunks read from the command outputs, when they are not read line by line
+_CHUNK_SIZE = 64 * 1024
+
+
+def _set_child_watcher(loop):
+    """
+    Before python 3.12, asyncio waits for each subprocess in a thread by default: use a pidfd watcher instead where
+    available (linux), so that the command exits are also handled by the event loop. Returns the previous watcher, or
+    None if it was not changed.
+    """
+    if sys.version_info >= (3, 12) or not hasattr(asyncio, 'PidfdChildWatcher') or not hasattr(os, 'pidfd_open'):
+        return None
+    try:
+        os.close(os.pidfd_open(os.getpid()))
+    except OSError:
+        # not supported by the kernel
+        return None
+    previous = asyncio.get_child_watcher()
+    watcher = asyncio.PidfdChildWatcher()
+    watcher.attach_loop(loop)
+    asyncio.set_child_watcher(watcher)
+    return previous
+
+
+class AsyncRunner(MRunner):
+    """
+    A doit runner executing up to `num_process` tasks at the same time on an asyncio event loop, with at most
+    `concurrency` command actions running at the same time (default: `num_process`).
+    """
+
+    def __init__(self, dep_manager, reporter, continue_=False, always_execute=False, stream=None, num_process=1,
+                 concurrency=None):
+        MRunner.__init__(self, dep_manager, reporter, continue_=continue_, always_execute=always_execute,
+                         stream=stream, num_process=num_process)
+        if concurrency is not None and concurrency < 1:
+            raise ValueError("async_concurrency should be positive, found %r" % concurrency)
+        self.concurrency = concurrency or num_process
+
+    def run_tasks(self, task_dispatcher):
+        self._run_tasks_init(task_dispatcher)
+        loop = asyncio.new_event_loop()
+        previous_watcher = _set_child_watcher(loop)
+        try:
+            loop.run_until_complete(self._run_tasks_async())
+        finally:
+            if previous_watcher is not None:
+                asyncio.set_child_watcher(previous_watcher)
+            loop.close()
+
+    async def _run_tasks_async(self):
+        """Same as `MRunner.run_tasks`, with asyncio tasks instead of worker processes"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        running = set()
+        completed = []  # the nodes that completed, to send to the task dispatcher
+        while True:
+            # start as many tasks as free slots
+            self._start_jobs(running, completed, semaphore)
+            if not running:
+                break
+
+            done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            try:
+                for future in done:
+                    node, base_fail = future.result()
+                    self.process_task_result(node, base_fail)
+                    completed.append(node)
+            except BaseException:
+                for future in running:
+                    future.cancel()
+                raise
+
+    def _start_jobs(self, running, completed, semaphore):
+        """
+        Starts the next tasks of the dispatcher in `running`, as long as there are less than `num_process` of them,
+        sending it the `completed` nodes. Once the dispatcher has no more tasks, it keeps returning no job.
+        """
+        while len(running) < self.num_process:
+            job = self.get_next_job(completed.pop() if completed else None)
+            if job is None:
+                return
+            elif job.type is JobHold.type:
+                # the next tasks depend on running ones
+                self.free_proc = 0
+                if not completed:
+                    return
+            else:
+                running.add(asyncio.ensure_future(self._execute_node(self.task_dispatcher.nodes[job.name], semaphore)))
+
+    async def _execute_node(self, node, semaphore):
+        """Same as `execute_task`, executing the command actions asynchronously. Returns (node, failure)"""
+        task = node.task
+        if task.teardown:
+            self.teardown_list.append(task)
+        self.reporter.execute_task(task)
+
+        # same as `Task.execute`
+        task.executed = True
+        task.init_options()
+        out, err = self.stream._get_out_err(task.verbosity)
+        for action in task.actions:
+            execute_async = _ASYNC_EXECUTORS.get(type(action), None)
+            if execute_async is not None:
+                action_return = await execute_async(action, out, err, semaphore)
+            else:
+                action_return = action.execute(out, err)
+            if isinstance(action_return, BaseFail):
+                return node, action_return
+            task.result = action.result
+            task.values.update(action.values)
+        return node, None
+
+
+def use_async_runner(cmd,              # type: DoitCmdBase
+                     concurrency=None  # type: int
+                     ):
+    """
+    Makes doit command `cmd` (`doit run`) use an `AsyncRunner`. doit does not support custom runners: the command is
+    executed with the 'thread' parallel type, and its thread runner class is replaced by `AsyncRunner` meanwhile.
+
+    :param cmd: the doit command, with its loaded tasks
+    :param concurrency: the maximum number of command actions running at the same time. Default: the number of tasks
+        in progress (`num_process`)
+    """
+    from doit import cmd_run
+
+    execute = cmd._execute
+
+    @functools.wraps(execute)  # (doit passes the arguments declared in the signature of `_execute`)
+    def _execute(**params):
+        params['par_type'] = 'thread'
+        thread_runner = cmd_run.MThreadRunner
+        cmd_run.MThreadRunner = functools.partial(AsyncRunner, concurrency=concurrency)
+        try:
+            return execute(**params)
+        finally:
+            cmd_run.MThreadRunner = thread_runner
+
+    cmd._execute = _execute
+
+
+async def _read_output(process, stream, action, capture, realtime):
+    """Reads `stream` until the end, writing its decoded contents to `capture`, and to `realtime` if provided"""
+    decoder = codecs.getincrementaldecoder(action.encoding)(action.decode_error)
+    while True:
+        if action.buffering:
+            data = await stream.read(action.buffering)
+        else:
+            data = await stream.read(_CHUNK_SIZE)
+        try:
+            text = decoder.decode(data, final=not data)
+        except Exception:
+            # same as `CmdAction`: kill the process
+            process.terminate()
+            raise
+        if text:
+            capture.write(text)
+            if realtime:
+                realtime.write(text)
+                realtime.flush()
+        if not data:
+            return
+
+
+def _get_popen_kwargs(action,  # type: CmdAction
+                      out,
+                      err
+                      ):
+    # type: (...) -> Tuple[Dict[str, Any], Optional[IO]]
+    """
+    Returns the keyword arguments of the subprocess of command action `action` (same as `CmdAction.execute`), and the
+    devnull file opened for its outputs if they are discarded, to close after the command.
+    """
+    kwargs = action.pkwargs.copy()
+    if action.buffering:
+        env = kwargs['env'] = (kwargs.get('env', None) or os.environ).copy()
+        env['PYTHONUNBUFFERED'] = '1'
+
+    capture_io = action.task.io.capture if action.task else True
+    devnull = None
+    if capture_io:
+        kwargs['stdout'] = kwargs['stderr'] = subprocess.PIPE
+    elif capture_io is False:
+        kwargs['stdout'], kwargs['stderr'] = out, err
+    else:
+        kwargs['stdout'] = kwargs['stderr'] = devnull = open(os.devnull, "w")
+    return kwargs, devnull
+
+
+async def _create_process(action,  # type: CmdAction
+                          cmd,     # type: Union[str, List[str]]
+                          kwargs   # type: Dict[str, Any]
+                          ):
+    """Starts the asyncio subprocess of command `cmd`, in a shell if `action.shell` is True"""
+    if action.shell:
+        return await asyncio.create_subprocess_shell(cmd if isinstance(cmd, str) else subprocess.list2cmdline(cmd),
+                                                     **kwargs)
+    else:
+        return await asyncio.create_subprocess_exec(*(cmd if isinstance(cmd, list) else [cmd]), **kwargs)
+
+
+async def _capture_outputs(process, action, out, err):
+    """Reads the outputs of `process` until the end, and sets the `out`, `err` and `result` of `action`"""
+    if isinstance(action, BoundedCmdAction) and not action.save_out:
+        output, errput = action.new_capture('out'), action.new_capture('err')
+    else:
+        output, errput = io.StringIO(), io.StringIO()
+    await asyncio.gather(_read_output(process, process.stdout, action, output, out),
+                         _read_output(process, process.stderr, action, errput, err))
+    action.out, action.err = output.getvalue(), errput.getvalue()
+    action.result = action.out + action.err
+
+
+async def execute_cmd_action(action,         # type: CmdAction
+                             out=None,
+                             err=None,
+                             semaphore=None  # type: Optional[asyncio.Semaphore]
+                             ):
+    # type: (...) -> Optional[BaseFail]
+    """
+    Same as `CmdAction.execute`, with an asyncio subprocess: the outputs are captured by the event loop instead of two
+    threads. At most one command per slot of `semaphore` runs at the same time.
+    """
+    try:
+        cmd = action.expand_action()
+    except Exception as exc:
+        return TaskError("CmdAction Error creating command string", exc)
+
+    kwargs, devnull = _get_popen_kwargs(action, out, err)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(1)
+    try:
+        async with semaphore:
+            process = await _create_process(action, cmd, kwargs)
+            if kwargs['stdout'] is subprocess.PIPE:
+                await _capture_outputs(process, action, out, err)
+            await process.wait()
+    finally:
+        if devnull is not None:
+            devnull.close()
+        if isinstance(action, BoundedCmdAction):
+            action.close_captures()
+
+    # same as `CmdAction.execute`
+    if process.returncode > 125:
+        return TaskError("Command error: '%s' returned %s" % (cmd, process.returncode))
+    if process.returncode != 0:
+        return TaskFailed("Command failed: '%s' returned %s" % (cmd, process.returncode))
+    if action.save_out:
+        action.values[action.save_out] = action.out
+    return None
+
+
+async def execute_direct_cmd_action(action,         # type: DirectCmdAction
+                                    out=None,
+                                    err=None,
+                                    semaphore=None  # type: Optional[asyncio.Semaphore]
+                                    ):
+    # type: (...) -> Optional[BaseFail]
+    """Same as `DirectCmdAction.execute`, with asyncio subprocesses (see `execute_cmd_action`)"""
+    argvs = action.get_argvs()
+    if argvs is None:
+        return await execute_cmd_action(action, out, err, semaphore)
+
+    failure = None
+    outs, errs = [], []
+    try:
+        for i, argv in enumerate(argvs):
+            part = i if len(argvs) > 1 else None
+            action.select(argv, part=part)
+            try:
+                failure = await execute_cmd_action(action, out, err, semaphore)
+            except OSError:
+                action.select(argv, shell=True, part=part)
+                failure = await execute_cmd_action(action, out, err, semaphore)
+            outs.append(action.out)
+            errs.append(action.err)
+    finally:
+        action.select(None)
+    action.join_outputs(outs, errs)
+    return failure
+
+
+async def execute_profile_cmd_action(action,         # type: ProfileCmdAction
+                                     out=None,
+                                     err=None,
+                                     semaphore=None  # type: Optional[asyncio.Semaphore]
+                                     ):
+    # type: (...) -> Optional[BaseFail]
+    """
+    Same as `ProfileCmdAction.execute`, with an asyncio subprocess (see `execute_cmd_action`). The activation script is
+    executed synchronously, when its environment is not cached yet.
+    """
+    failure = action.set_profile_env()
+    if failure is not None:
+        return failure
+    return await execute_cmd_action(action, out, err, semaphore)
+
+
+# the command actions executed asynchronously, and the coroutine functions executing them. The others are executed
+# synchronously: python actions, and actions wrapping other actions or executing them in shell sessions
+_ASYNC_EXECUTORS = {
+    CmdAction: execute_cmd_action,
+    BoundedCmdAction: execute_cmd_action,
+    DirectCmdAction: execute_direct_cmd_action,
+    ProfileCmdAction: execute_profile_cmd_action,
+}
@@ -0,0 +1,278 @@
+"""
+Persistent shell sessions, used by the command actions of tasks with `shell_session` (see `task`).
+
+Instead of spawning a new shell for each command, the commands are sent to long-lived `/bin/sh` processes that run
+them in a subshell and then print a sentinel line with their exit code. The sessions are pooled per setup command (for
+example `source env.sh` or `conda activate myenv`), that each session executes once when it starts: thousands of small
+commands then pay neither for the creation of a shell process nor for the environment setup. Sessions are only
+available on posix systems, the commands are executed as usual elsewhere.
+
+Each command runs in the current working directory, with the environment variables of the session: the ones of the
+process when the session started, changed by the setup command. A session is not reused once the environment variables
+of the process (`os.environ`) changed, a new one is started instead.
+"""
+import codecs
+import io
+import os
+import re
+import select
+import subprocess
+import threading
+import uuid
+
+from doit.exceptions import TaskError, TaskFailed
+
+from .actions import BoundedCmdAction
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, IO, List, Optional  # noqa: F401
+
+
+# the idle sessions of each setup command, in the process that started them (a forked doit worker process can not use
+# the sessions of its parent)
+_POOLS = dict()  # type: Dict[Optional[str], List[ShellSession]]
+_POOLS_PID = None
+_LOCK = threading.Lock()
+
+# the size of the chunks read from the session outputs
+_READ_SIZE = 64 * 1024
+
+
+def quote(s):
+    # type: (str) -> str
+    """Quotes `s` as a single argument for a posix shell"""
+    return "'%s'" % s.replace("'", "'\"'\"'")
+
+
+class ShellError(Exception):
+    """Raised when a shell session can not be started, or exited while executing a command"""
+
+
+class ShellSession(object):
+    """
+    A long-lived `/bin/sh` process executing commands one at a time. Each command runs in a subshell with no input, so
+    that it can not change the directory, variables or input of the next ones. After each command, the session prints
+    a random sentinel followed by the exit code on its stdout, and the sentinel alone on its stderr.
+
+    :param setup: an optional command executed once in the session itself (not in a subshell), to set up the
+        environment of all the commands
+    :param environ: the environment variables of the session. Default: a copy of `os.environ`
+    """
+    __slots__ = ('setup', 'environ', 'process', 'sentinel', 'out_end', 'err_end')
+
+    def __init__(self,
+                 setup=None,   # type: str
+                 environ=None  # type: Dict[str, str]
+                 ):
+        self.setup = setup
+        self.environ = dict(os.environ) if environ is None else environ
+        sentinel = "__doit_api_%s__" % uuid.uuid4().hex
+        self.sentinel = sentinel
+        self.out_end = re.compile(re.escape(sentinel.encode('ascii')) + br" (\d+)\n")
+        self.err_end = re.compile(re.escape(sentinel.encode('ascii')) + br"\n")
+        self.process = subprocess.Popen(['/bin/sh'], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE, env=self.environ)
+        if setup:
+            output, errput = io.StringIO(), io.StringIO()
+            try:
+                returncode = self.run(setup, output, errput, subshell=False)
+            except BaseException:
+                self.close()
+                raise
+            if returncode != 0:
+                self.close()
+                raise ShellError("Shell session setup '%s' returned %s\n%s%s"
+                                 % (setup, returncode, output.getvalue(), errput.getvalue()))
+
+    def close(self):
+        """Terminates the session"""
+        try:
+            self.process.stdin.close()
+        except (IOError, OSError):
+            pass
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        self.process.stdout.close()
+        self.process.stderr.close()
+
+    def run(self,
+            cmd,                     # type: str
+            output,                  # type: IO
+            errput,                  # type: IO
+            out=None,                # type: IO
+            err=None,                # type: IO
+            encoding='utf-8',        # type: str
+            decode_error='replace',  # type: str
+            subshell=True            # type: bool
+            ):
+        # type: (...) -> int
+        """
+        Executes shell command `cmd` and returns its exit code. Its decoded stdout and stderr are written to `output`
+        and `errput`, and to `out` and `err` if provided.
+
+        :param subshell: if False the command is executed in the session itself, so that it can change the
+            environment of the next commands
+        """
+        if subshell:
+            # (the directory may change between tasks)
+            script = "(cd %s && eval %s) </dev/null\n" % (quote(os.getcwd()), quote(cmd))
+        else:
+            script = "eval %s </dev/null\n" % quote(cmd)
+        script += "printf '%%s %%d\\n' %s \"$?\"; printf '%%s\\n' %s >&2\n" % (self.sentinel, self.sentinel)
+        try:
+            self.process.stdin.write(script.encode(encoding))
+            self.process.stdin.flush()
+        except (IOError, OSError) as e:
+            raise ShellError("The shell session exited: %s" % e)
+
+        # read both outputs until their sentinel, without threads
+        decoder_cls = codecs.getincrementaldecoder(encoding)
+        streams = {  # fd: [end pattern, capture, realtime, decoder, pending data]
+            self.process.stdout.fileno(): [self.out_end, output, out, decoder_cls(decode_error), b""],
+            self.process.stderr.fileno(): [self.err_end, errput, err, decoder_cls(decode_error), b""],
+        }
+        returncode = None
+        while streams:
+            ready, _, _ = select.select(list(streams), [], [])
+            for fd in ready:
+                match = self._read_chunk(fd, streams[fd], cmd)
+                if match is not None:
+                    del streams[fd]
+                    if match.re is self.out_end:
+                        returncode = int(match.group(1))
+        return returncode
+
+    def _read_chunk(self,
+                    fd,      # type: int
+                    stream,  # type: List[Any]
+                    cmd      # type: str
+                    ):
+        """
+        Reads the next chunk of output `fd`, and writes its decoded contents to the capture and realtime outputs of
+        `stream` (see `run`). Returns the match of the sentinel line if it was found, None otherwise.
+        """
+        end, capture, realtime, decoder, pending = stream
+        data = os.read(fd, _READ_SIZE)
+        if not data:
+            raise ShellError("The shell session exited while executing '%s'" % cmd)
+        data = pending + data
+        match = end.search(data)
+        if match is not None:
+            text = decoder.decode(data[:match.start()], final=True)
+        else:
+            # the end of the data can be the beginning of the sentinel line (" 255\n")
+            keep = len(self.sentinel) + 5
+            text = decoder.decode(data[:-keep])
+            stream[4] = data[-keep:]
+        if text:
+            capture.write(text)
+            if realtime:
+                realtime.write(text)
+                realtime.flush()
+        return match
+
+
+def run_in_session(setup,  # type: Optional[str]
+                   cmd,    # type: str
+                   *args,
+                   **kwargs
+                   ):
+    # type: (...) -> int
+    """
+    Executes `cmd` in an idle session of the pool of `setup` (started if needed, or if the environment variables of the
+    process changed since the session started), see `ShellSession.run`. The session goes back to the pool afterwards,
+    unless an error happened.
+    """
+    global _POOLS, _POOLS_PID
+    environ = dict(os.environ)
+    with _LOCK:
+        if _POOLS_PID != os.getpid():
+            # first use, or forked process
+            import atexit
+            atexit.register(close_sessions)
+            _POOLS, _POOLS_PID = dict(), os.getpid()
+        idle = _POOLS.get(setup)
+        session = idle.pop() if idle else None
+    if session is not None and session.environ != environ:
+        # started before a change of the environment variables
+        session.close()
+        session = None
+    if session is None:
+        session = ShellSession(setup, environ)
+
+    try:
+        returncode = session.run(cmd, *args, **kwargs)
+    except BaseException:
+        session.close()
+        raise
+
+    with _LOCK:
+        _POOLS.setdefault(setup, []).append(session)
+    return returncode
+
+
+def close_sessions():
+    """Terminates all the idle sessions started by this process"""
+    with _LOCK:
+        if _POOLS_PID != os.getpid():
+            return
+        sessions = [s for idle in _POOLS.values() for s in idle]
+        _POOLS.clear()
+    for session in sessions:
+        session.close()
+
+
+class SessionCmdAction(BoundedCmdAction):
+    """
+    A doit shell command action executed in a persistent shell session of the pool of `setup` (see `task`). Commands
+    with subprocess arguments (`cwd`, `env`...) or `buffering`, and all commands on non-posix systems, are executed in
+    a new process as usual.
+    """
+
+    def __init__(self,
+                 action,          # type: str
+                 setup=None,      # type: str
+                 output_limit=0,  # type: int
+                 **kwargs
+                 ):
+        super(SessionCmdAction, self).__init__(action, output_limit, **kwargs)
+        self.setup = setup
+
+    def execute(self, out=None, err=None):
+        if os.name != 'posix' or not self.shell or self.pkwargs or self.buffering:
+            return super(SessionCmdAction, self).execute(out, err)
+
+        try:
+            cmd = self.expand_action()
+        except Exception as exc:
+            return TaskError("CmdAction Error creating command string", exc)
+
+        self._captures = dict()
+        output, errput = self.new_capture('out'), self.new_capture('err')
+        try:
+            returncode = run_in_session(self.setup, cmd, output, errput, out, err,
+                                        encoding=self.encoding, decode_error=self.decode_error)
+        except ShellError as exc:
+            return TaskError("Shell session error", exc)
+        finally:
+            self.close_captures()
+
+        # same as `CmdAction.execute`
+        if returncode > 125:
+            return TaskError("Command error: '%s' returned %s" % (cmd, returncode))
+        if returncode != 0:
+            return TaskFailed("Command failed: '%s' returned %s" % (cmd, returncode))
+        if self.save_out:
+            self.values[self.save_out] = self.out
+        return None
+
+
+def session_cmd_actions(actions,         # type: List[Any]
+                        setup=None,      # type: str
+                        output_limit=0   # type: int
+                        ):
+    # type: (...) -> List[Any]
+    """Returns `actions`, where the shell command actions provided as a string are `SessionCmdAction`s"""
+    return [SessionCmdAction(a, setup, output_limit or 0, shell=True) if isinstance(a, str) else a for a in actions]
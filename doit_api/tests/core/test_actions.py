@@ -0,0 +1,207 @@
+import os
+import sys
+
+import pytest
+
+pytestmark = pytest.mark.skipif(sys.version_info < (3, 6), reason="requires hashlib.blake2b and st_mtime_ns")
+
+
+def test_early_cutoff(tmp_path, monkeypatch):
+    """The dependents of a task rebuilding byte-identical targets are not executed"""
+    from doit.doit_cmd import DoitMain
+    from doit.tools import result_dep
+    from doit_api import task
+    from doit_api.loader import DoitApiTaskLoader
+
+    monkeypatch.chdir(tmp_path)
+    executions = []
+
+    def build(dependencies, targets):
+        executions.append('a')
+        # only depends on the length of the input
+        with open(dependencies[0]) as f:
+            length = len(f.read())
+        with open(targets[0], "w") as f:
+            f.write(u"%s" % length)
+
+    ns = dict(
+        # the timestamp checker would execute 'b' each time 'out.txt' is written
+        DOIT_CONFIG=dict(dep_file=str(tmp_path / "deps.db"), backend='json', check_file_uptodate='timestamp'),
+        a=task(name="a", actions=[build], file_dep=["in.txt"], targets=["out.txt"], early_cutoff=True),
+        b=task(name="b", actions=[lambda: executions.append('b')], file_dep=["out.txt"]),
+        c=task(name="c", actions=[lambda: executions.append('c')], uptodate=[result_dep("a")]),
+    )
+
+    def run(contents):
+        (tmp_path / "in.txt").write_text(contents)
+        assert DoitMain(DoitApiTaskLoader(ns)).run(['run', '--reporter', 'zero']) == 0
+        executed = sorted(executions)
+        del executions[:]
+        return executed
+
+    assert run(u"aa") == ['a', 'b', 'c']
+    mtime_ns = os.stat("out.txt").st_mtime_ns
+
+    # same length: the target is rewritten with the same contents
+    assert run(u"bb") == ['a']
+    assert os.stat("out.txt").st_mtime_ns == mtime_ns
+
+    # different length: the target changes
+    assert run(u"ccc") == ['a', 'b', 'c']
+    assert (tmp_path / "out.txt").read_text() == u"3"
+
+    with pytest.raises(ValueError):
+        task(name="d", actions=["echo"], early_cutoff=True)
+
+
+def test_code_dep(tmp_path, monkeypatch):
+    """Tasks with dependencies run again when their actions change"""
+    from doit.doit_cmd import DoitMain
+    from doit_api import cmdtask, pytask
+    from doit_api.loader import DoitApiTaskLoader
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "in.txt").write_text(u"in")
+
+    def make_namespace(src, cmd, code_dep=True):
+        ns = dict(executions=[])
+        exec(compile(src, "dodo.py", "exec"), ns)
+        f = pytask(file_dep=["in.txt"], code_dep=code_dep)(ns['f'])
+
+        @cmdtask(file_dep=["in.txt"], code_dep=code_dep)
+        def c():
+            return cmd
+
+        return dict(DOIT_CONFIG=dict(dep_file=str(tmp_path / "deps.db"), backend='json'), f=f, c=c), ns['executions']
+
+    def run(src, cmd="echo a", code_dep=True):
+        ns, executions = make_namespace(src, cmd, code_dep)
+        if os.path.exists("c.txt"):
+            os.remove("c.txt")
+        assert DoitMain(DoitApiTaskLoader(ns)).run(['run', '--reporter', 'zero']) == 0
+        return len(executions), os.path.exists("c.txt")
+
+    src = "def f():\n    executions.append(1)\n"
+    assert run(src, "echo a > c.txt") == (1, True)
+    assert run(src, "echo a > c.txt") == (0, False)
+    # comments, line numbers and the contents of docstrings are ignored (adding a docstring changes the bytecode)
+    assert run("\n\ndef f():\n    # comment\n    executions.append(1)\n", "echo a > c.txt") == (0, False)
+    assert run("def f():\n    \"\"\" doc \"\"\"\n    executions.append(1)\n", "echo a > c.txt") == (1, False)
+    assert run("def f():\n    \"\"\" edited \"\"\"\n    executions.append(1)\n", "echo a > c.txt") == (0, False)
+    # the code or command changed
+    assert run("def f():\n    executions.append(2)\n", "echo a > c.txt") == (1, False)
+    assert run("def f():\n    executions.append(2)\n", "echo b > c.txt") == (0, True)
+    # disabled (default)
+    assert run(src, "echo a > c.txt", code_dep=False) == (0, False)
+    assert 'uptodate' not in pytask(file_dep=["in.txt"])(lambda: None).create_doit_tasks()
+
+
+def test_callable_signature_stable():
+    """Callable signatures do not depend on the hash seed nor on memory addresses, and include closure values"""
+    import subprocess
+    from doit_api.actions import get_callable_signature
+
+    script = ("from doit_api.actions import get_callable_signature\n"
+              "o = object()\n"
+              "def f(x, y=o):\n"
+              "    return x in {'a', 'b', 'c', 'd'}\n"
+              "print(get_callable_signature(f))\n")
+    import doit_api
+    root = os.path.dirname(os.path.dirname(os.path.abspath(doit_api.__file__)))
+    signatures = set()
+    for seed in ("1", "2", "3"):
+        env = dict(os.environ, PYTHONHASHSEED=seed, PYTHONPATH=root)
+        signatures.add(subprocess.check_output([sys.executable, "-c", script], env=env))
+    assert len(signatures) == 1
+
+    def make(value):
+        state = []
+
+        def f():
+            state.append(value)
+        return f
+
+    f1 = make(1)
+    assert get_callable_signature(f1) == get_callable_signature(make(1))
+    assert get_callable_signature(f1) != get_callable_signature(make(2))
+    # the contents of mutable containers are ignored
+    sig = get_callable_signature(f1)
+    f1()
+    assert get_callable_signature(f1) == sig
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="requires posix shell commands")
+def test_output_limit(tmp_path, monkeypatch):
+    """Only the tail of large command outputs is kept in memory, the full output is written to a spill file"""
+    from doit.doit_cmd import DoitMain
+    from doit_api import task
+    from doit_api.actions import _get_spill_path
+    from doit_api.loader import DoitApiTaskLoader
+
+    monkeypatch.chdir(tmp_path)
+    cmd = "%s -c \"import sys; [print('line ' + str(i).zfill(5)) for i in range(10000)]; sys.exit(1)\"" % sys.executable
+    ns = dict(
+        DOIT_CONFIG=dict(dep_file=str(tmp_path / "deps.db"), backend='json', verbosity=0),
+        big=task(name="big", actions=[cmd], output_limit=100),
+        two=task(name="two", actions=[cmd.replace("sys.exit(1)", "print('first')"), "seq 1000"], output_limit=10),
+        parts=task(name="parts", actions=["seq 100; seq 200"], output_limit=10, direct_exec=True),
+    )
+    assert DoitMain(DoitApiTaskLoader(ns)).run(['run', '--output-file', 'report.txt', 'big']) == 1
+    assert DoitMain(DoitApiTaskLoader(ns)).run(['run', 'two', 'parts']) == 0
+
+    # the failure report contains the last lines
+    with open("report.txt") as f:
+        report = f.read()
+    assert "big <stdout>:\n[... 109900 characters not kept in memory" in report
+    assert "line 09999" in report
+    assert "line 09000" not in report
+
+    # the full output is in the spill file
+    def spilled(name):
+        with open(os.path.join(".doit_api", "output", name)) as f:
+            return f.read().splitlines()
+
+    lines = spilled("big.0.out.log")
+    assert len(lines) == 10000 and lines[-1] == "line 09999"
+    assert not os.path.exists(os.path.join(".doit_api", "output", "big.0.err.log"))
+
+    # each command has its own spill files
+    assert spilled("two.0.out.log")[-1] == "first" and spilled("two.1.out.log")[-1] == "1000"
+    assert spilled("parts.0-0.out.log")[-1] == "100" and spilled("parts.0-1.out.log")[-1] == "200"
+    assert _get_spill_path("a:b", "0", "out") != _get_spill_path("a_b", "0", "out")
+
+
+@pytest.mark.skipif(os.name != 'posix', reason="requires posix commands")
+def test_direct_cmd_action(tmp_path, monkeypatch):
+    """Simple shell commands are executed without a shell, with the same results"""
+    from doit.exceptions import TaskFailed
+    from doit_api import task
+    from doit_api.actions import DirectCmdAction, split_simple_cmd, split_simple_cmds
+
+    assert split_simple_cmd("printf '%s' a") is None
+    assert split_simple_cmd("echo 'hello world' -n") == ['echo', 'hello world', '-n']
+    for cmd in ("echo $HOME", "ls *.txt", "cat a > b", "cd /tmp", "FOO=1 env", "not_a_program_ever", "echo 'a"):
+        assert split_simple_cmd(cmd) is None
+    assert split_simple_cmds("echo a; echo 'b c'") == [['echo', 'a'], ['echo', 'b c']]
+    assert split_simple_cmds("echo 'a; b'; echo c") is None
+
+    # as in a shell, the exit code is the one of the last command
+    action = DirectCmdAction("printf a; false; printf b")
+    assert action.get_argvs() is not None
+    assert action.execute() is None
+    assert action.out == "ab" and action.shell
+    assert isinstance(DirectCmdAction("printf a; false").execute(), TaskFailed)
+
+    # scripts without shebang line are executed by the shell
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "script").write_text(u"echo from script\n")
+    os.chmod("script", 0o755)
+    action = DirectCmdAction("./script")
+    assert action.get_argvs() == [['./script']]
+    assert action.execute() is None
+    assert action.out == "from script\n"
+
+    # the other ways to start commands can not be combined with it
+    for options in (dict(shell_session=True), dict(shell_session="source env.sh"), dict(env_profile="source env.sh")):
+        with pytest.raises(ValueError):
+            task(name="t", actions=["echo"], direct_exec=True, **options)
@@ -0,0 +1,59 @@
+import sys
+
+import pytest
+
+pytestmark = pytest.mark.skipif(sys.version_info < (3, 7), reason="requires asyncio.get_running_loop")
+
+
+def test_async_pytask(tmp_path, monkeypatch):
+    """`async def` python actions run on the shared event loop, and overlap when doit uses threads"""
+    import asyncio
+    from doit.doit_cmd import DoitMain
+    from doit_api import pytask, task
+    from doit_api.aio import AsyncCallable, get_event_loop
+    from doit_api.loader import DoitApiTaskLoader
+
+    monkeypatch.chdir(tmp_path)
+    loops = []
+    events = dict()
+
+    def get_event(name):
+        # (created in the loop thread)
+        return events.setdefault(name, asyncio.Event())
+
+    async def wait_for(me, other):
+        loops.append(asyncio.get_running_loop())
+        get_event(me).set()
+        # both tasks need to run at the same time
+        await asyncio.wait_for(get_event(other).wait(), 5)
+
+    @pytask(targets=["out.txt"])
+    async def write(targets):
+        loops.append(asyncio.get_running_loop())
+        await asyncio.sleep(0)
+        with open(targets[0], "w") as f:
+            f.write(u"ok")
+        return dict(length=2)
+
+    @pytask(getargs=dict(length=("write", "length")))
+    async def read(length):
+        assert length == 2
+
+    ns = dict(
+        DOIT_CONFIG=dict(dep_file=str(tmp_path / "deps.db"), backend='json'),
+        a=task(name="a", actions=[(wait_for, ["a", "b"])]),
+        b=task(name="b", actions=[(wait_for, ["b", "a"])]),
+        write=write,
+        read=read,
+    )
+    assert isinstance(ns['a'].actions[0][0], AsyncCallable)
+    assert DoitMain(DoitApiTaskLoader(ns)).run(['run', '--reporter', 'zero', '-n', '2', '-P', 'thread']) == 0
+    assert (tmp_path / "out.txt").read_text() == u"ok"
+    assert loops == [get_event_loop()] * 3
+
+    # a failing coroutine fails the task
+    async def fail():
+        raise ValueError("nope")
+
+    ns = dict(DOIT_CONFIG=ns['DOIT_CONFIG'], fail=task(name="fail", actions=[fail]))
+    assert DoitMain(DoitApiTaskLoader(ns)).run(['run', '--reporter', 'zero']) != 0
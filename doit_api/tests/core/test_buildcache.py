@@ -0,0 +1,216 @@
+import os
+import sys
+
+import pytest
+
+pytestmark = pytest.mark.skipif(sys.version_info < (3, 6), reason="requires hashlib.blake2b and st_mtime_ns")
+
+
+@pytest.fixture
+def build_cache(tmp_path, monkeypatch):
+    """Uses an isolated build cache folder, set in the DOIT_CONFIG of the tests"""
+    from doit_api import buildcache
+    from doit_api.buildcache import BuildCache
+
+    # (restored after the test, as the loader sets them from the DOIT_CONFIG)
+    for name in ("cache_dir", "cache_size", "cache_link"):
+        monkeypatch.setattr(BuildCache, name, getattr(BuildCache, name))
+    monkeypatch.setattr(buildcache, "_CACHES", dict())
+    return BuildCache(str(tmp_path / "build_cache"))
+
+
+@pytest.mark.parametrize("link", ["copy", "hardlink"])
+def test_cached_task(tmp_path, monkeypatch, build_cache, link):
+    """The targets are restored from the cache when the task runs again with the same inputs"""
+    from doit.doit_cmd import DoitMain
+    from doit_api import doit_config, task
+    from doit_api.loader import DoitApiTaskLoader
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "in.txt").write_text(u"v1")
+    executions = []
+
+    def build(dependencies, targets):
+        executions.append(1)
+        with open(dependencies[0]) as f:
+            contents = f.read()
+        os.mkdir(targets[1])
+        for path in (targets[0], os.path.join(targets[1], "part.txt")):
+            with open(path, "w") as f:
+                f.write(contents.upper())
+        return dict(length=len(contents))
+
+    ns = dict(
+        DOIT_CONFIG=doit_config(dep_file=str(tmp_path / "deps.db"), backend='json', build_cache_dir=build_cache.path,
+                                build_cache_link=link),
+        a=task(name="a", actions=[build], file_dep=["in.txt"], targets=["out.txt", "out_dir"], cache=True),
+    )
+
+    def run(contents):
+        (tmp_path / "in.txt").write_text(contents)
+        if os.path.exists("out_dir"):
+            os.remove("out_dir/part.txt")
+            os.rmdir("out_dir")
+        assert DoitMain(DoitApiTaskLoader(ns)).run(['run', '--reporter', 'zero']) == 0
+        assert (tmp_path / "out.txt").read_text() == contents.upper()
+        assert (tmp_path / "out_dir" / "part.txt").read_text() == contents.upper()
+        n = len(executions)
+        del executions[:]
+        return n
+
+    assert run(u"v1") == 1
+    assert run(u"v2") == 1
+    # back to the first version: restored
+    assert run(u"v1") == 0
+    if link == "hardlink":
+        assert os.stat("out.txt").st_nlink > 1
+    assert run(u"v2") == 0
+    assert run(u"v3") == 1
+
+    # the values are restored too
+    with open("deps.db") as f:
+        assert '"length": 2' in f.read()
+
+    with pytest.raises(ValueError):
+        task(name="b", actions=["echo"], cache=True)
+
+
+def test_memoized_pytask(tmp_path, monkeypatch, build_cache):
+    """The values of a memoized python task are returned from the cache for the same code and getargs values"""
+    from doit.doit_cmd import DoitMain
+    from doit_api import doit_config, pytask, task
+    from doit_api.loader import DoitApiTaskLoader
+
+    monkeypatch.chdir(tmp_path)
+    calls = []
+
+    def read(dependencies):
+        with open(dependencies[0]) as f:
+            return dict(n=int(f.read()))
+
+    @pytask(getargs=dict(n=("read", "n")), memoize=True)
+    def square(n):
+        calls.append(n)
+        # large enough to be stored as an object
+        return dict(square=n * n, padding="x" * 10000)
+
+    ns = dict(
+        DOIT_CONFIG=doit_config(dep_file=str(tmp_path / "deps.db"), backend='json', build_cache_dir=build_cache.path),
+        read=task(name="read", actions=[read], file_dep=["in.txt"]),
+        square=square,
+    )
+
+    def run(n, offset=0):
+        (tmp_path / "in.txt").write_text(u"%s" % n)
+        if os.path.exists("deps.db"):
+            # as in a new clone, branch or CI job: nothing is up-to-date
+            os.remove("deps.db")
+        assert DoitMain(DoitApiTaskLoader(ns)).run(['run', '--reporter', 'zero']) == 0
+        with open("deps.db") as f:
+            assert '"square": %s' % (n * n + offset) in f.read()
+        executed = list(calls)
+        del calls[:]
+        return executed
+
+    assert run(2) == [2]
+    assert run(3) == [3]
+    assert run(2) == []
+    assert run(3) == []
+    assert build_cache.get_size() > 20000
+
+    # editing a helper function of the same module, or a global variable, gives another key
+    def set_module_square(offset, scale=1):
+        src = ("SCALE = %s\ndef offset():\n    return %s * SCALE\n"
+               "def square(n):\n    calls.append(n)\n    return dict(square=n * n + offset())\n" % (scale, offset))
+        mod = dict(calls=calls)
+        exec(compile(src, "dodo.py", "exec"), mod)
+        ns['square'] = pytask(name="square", getargs=dict(n=("read", "n")), memoize=True)(mod['square'])
+
+    set_module_square(0)
+    assert run(2) == [2]
+    assert run(2) == []
+    set_module_square(1)
+    assert run(2, offset=1) == [2]
+    set_module_square(1, scale=2)
+    assert run(2, offset=2) == [2]
+    set_module_square(0)
+    assert run(2) == []
+
+    with pytest.raises(ValueError):
+        task(name="b", actions=["echo"], targets=["b.txt"], memoize=True)
+
+
+def test_action_signature():
+    """Action signatures depend on the code of python actions, not on their line numbers"""
+    from functools import partial
+    from doit_api.buildcache import get_action_signature
+
+    def compile_fun(src, first_line):
+        ns = dict()
+        exec(compile("\n" * first_line + src, "dodo.py", "exec"), ns)
+        return ns['f']
+
+    f1 = compile_fun("def f(x=1):\n    return x + 1\n", 0)
+    f2 = compile_fun("def f(x=1):\n    # a comment\n    return x + 1\n", 10)
+    f3 = compile_fun("def f(x=1):\n    return x + 2\n", 0)
+    f4 = compile_fun("def f(x=2):\n    return x + 1\n", 0)
+    assert get_action_signature(f1) == get_action_signature(f2)
+    assert get_action_signature(f1) != get_action_signature(f3)
+    assert get_action_signature(f1) != get_action_signature(f4)
+    assert get_action_signature((f1, [1])) != get_action_signature((f1, [2]))
+    assert get_action_signature(partial(f1, 1)) != get_action_signature(partial(f1, 2))
+    assert get_action_signature("echo a") != get_action_signature("echo b")
+    assert get_action_signature(["echo", "a"]) == "cmd:['echo', 'a']"
+
+    # the global variables and the helper functions of the same module (recursively) are included
+    def compile_module(scale=2, inner="return 1", f="return os.path.join(str(helper()))"):
+        src = ("import os\nSCALE = %s\nitems = []\ndef inner():\n    %s\ndef helper():\n    return inner() * SCALE\n"
+               "def f():\n    items.append(1)\n    %s\n" % (scale, inner, f))
+        ns = dict()
+        exec(compile(src, "dodo.py", "exec"), ns)
+        return ns
+
+    ns = compile_module()
+    signature = get_action_signature(ns['f'])
+    assert get_action_signature(compile_module()['f']) == signature
+    assert get_action_signature(compile_module(scale=3)['f']) != signature
+    assert get_action_signature(compile_module(inner="return 2")['f']) != signature
+    # (but not the contents of mutable containers)
+    ns['items'].append(1)
+    assert get_action_signature(ns['f']) == signature
+    # recursive functions
+    assert get_action_signature(compile_module(f="return f() if items else helper()")['f']) != signature
+
+
+def test_eviction(tmp_path, monkeypatch):
+    """The least recently used entries are evicted, and the objects they used are deleted"""
+    from doit_api import buildcache
+    from doit_api.buildcache import BuildCache
+
+    monkeypatch.chdir(tmp_path)
+    cache = BuildCache(str(tmp_path / "cache"), max_size=250)
+    for i in range(3):
+        target = "t%s" % i
+        with open(target, "wb") as f:
+            f.write(os.urandom(100))
+        assert cache.store("key%s" % i, [target], {}, None)
+        # (entries and objects are kept during the grace period)
+        for path in (cache.get_entry_path("key%s" % i), cache.get_object_path(cache.get_entry("key%s" % i)
+                                                                               ['files'][0][1])):
+            os.utime(path, (1000 + i, 1000 + i))
+    assert cache.get_size() == 300
+    assert not cache.store("missing", ["nope"], {}, None)
+
+    # key1 was used recently
+    cache.get_entry("key1")
+    assert cache.evict() == 100
+    assert cache.get_entry("key0") is None
+    assert cache.get_entry("key1") is not None
+    assert cache.get_entry("key2") is not None
+    assert cache.get_size() == 200
+
+    # an entry whose object was deleted is a miss
+    monkeypatch.setattr(buildcache, "EVICTION_GRACE_PERIOD", 0)
+    assert cache.evict(max_size=0) == 200
+    os.remove("t1")
+    assert not cache.restore(dict(files=[["t1", "xxh3:0123", 0o644]], dirs=[]))
@@ -0,0 +1,203 @@
+import os
+import sys
+import threading
+
+import pytest
+
+pytestmark = pytest.mark.skipif(sys.version_info < (3, 6), reason="requires hashlib.blake2b and st_mtime_ns")
+
+
+def test_fast_checker(tmp_path, monkeypatch):
+    """The contents are only hashed when the modification time, size or inode changed"""
+    from doit_api import checkers
+    from doit_api.checkers import FastChecker, get_file_digest
+
+    small = tmp_path / "small.txt"
+    small.write_bytes(b"hello")
+    big = tmp_path / "big.bin"
+    big.write_bytes(os.urandom(checkers.MMAP_THRESHOLD + 10))
+
+    # mmap and plain reads give the same digest
+    monkeypatch.setattr(checkers, "MMAP_THRESHOLD", 10 ** 12)
+    big_digest = get_file_digest(str(big))
+    monkeypatch.undo()
+    assert get_file_digest(str(big)) == big_digest
+    assert big_digest.startswith(checkers.DEFAULT_DIGEST + ":")
+
+    checker = FastChecker()
+    hashed = []
+
+    def spy_digest(path, *args, **kwargs):
+        hashed.append(path)
+        return get_file_digest(path, *args, **kwargs)
+
+    monkeypatch.setattr(checkers, "get_file_digest", spy_digest)
+
+    path = str(small)
+    state = checker.get_state(path, None)
+    assert hashed == [path]
+    assert checker.get_state(path, state) is None
+    assert not checker.check_modified(path, os.stat(path), state)
+    assert len(hashed) == 1
+
+    # touched but not modified: hashed, unchanged
+    os.utime(path, ns=(0, 0))
+    assert not checker.check_modified(path, os.stat(path), state)
+    assert len(hashed) == 2
+
+    # same size, different contents
+    small.write_bytes(b"world")
+    os.utime(path, ns=(1, 1))
+    assert checker.check_modified(path, os.stat(path), state)
+
+    # different size: not hashed
+    small.write_bytes(b"hello world")
+    del hashed[:]
+    assert checker.check_modified(path, os.stat(path), state)
+    assert hashed == []
+
+    # a state saved by another checker (md5)
+    assert checker.check_modified(path, os.stat(path), (1.0, 11, "abc"))
+
+
+def test_fast_checker_config():
+    """`check_file_uptodate='fast'` selects the FastChecker"""
+    from doit_api import doit_config
+    from doit_api.checkers import FastChecker
+
+    assert doit_config(check_file_uptodate='fast')['check_file_uptodate'] is FastChecker
+    assert doit_config(check_file_uptodate='md5')['check_file_uptodate'] == 'md5'
+
+
+def test_hash_workers(tmp_path, monkeypatch):
+    """With `hash_workers`, the modified file dependencies are hashed concurrently before the up-to-date checks"""
+    from doit.doit_cmd import DoitMain
+    from doit_api import checkers, doit_config, task
+    from doit_api.loader import DoitApiTaskLoader
+
+    monkeypatch.chdir(tmp_path)
+    for i in range(10):
+        (tmp_path / ("in%s.txt" % i)).write_text(u"%s" % i)
+
+    # record the files hashed by the prefetching threads
+    prefetched = set()
+    get_file_digest = checkers.get_file_digest
+
+    def spy_digest(path, *args, **kwargs):
+        if threading.current_thread() is not threading.main_thread():
+            prefetched.add(path)
+        return get_file_digest(path, *args, **kwargs)
+
+    monkeypatch.setattr(checkers, "get_file_digest", spy_digest)
+
+    ns = dict(
+        DOIT_CONFIG=doit_config(hash_workers=4, dep_file=str(tmp_path / "deps.db"), backend='json'),
+        a=task(name="a", actions=["echo a > a.out"], targets=["a.out"], file_dep=["in%s.txt" % i for i in range(5)]),
+        b=task(name="b", actions=["echo b"], file_dep=["in%s.txt" % i for i in range(5, 10)] + ["a.out"]),
+    )
+
+    def run():
+        previous = checkers.set_signature_cache(checkers.SignatureCache())
+        try:
+            assert DoitMain(DoitApiTaskLoader(ns)).run(['run', '--reporter', 'zero']) == 0
+        finally:
+            checkers.set_signature_cache(previous)
+        result = set(prefetched)
+        prefetched.clear()
+        return result
+
+    # first run: all inputs (but not the targets of other tasks) are hashed in advance
+    assert run() == set("in%s.txt" % i for i in range(10))
+
+    # then only the modified files
+    os.utime("in3.txt", ns=(0, 10 ** 19))
+    assert run() == {"in3.txt"}
+    with open("deps.db") as f:
+        assert "in3.txt" in f.read()
+
+    # the checker must be the fast one
+    with pytest.raises(ValueError):
+        doit_config(hash_workers=4, check_file_uptodate='md5')
+
+
+def test_signature_cache(tmp_path):
+    """The signature cache is an LRU cache of digests keyed by path and stat, that can be saved and loaded"""
+    from doit_api.checkers import SignatureCache
+
+    path = str(tmp_path / "signatures.json")
+    cache = SignatureCache(path, max_size=2)
+    cache.set("a", (1, 2, 3), "xxh3:a")
+    cache.set("b", (1, 2, 3), "xxh3:b")
+    assert cache.get("a", (1, 2, 3)) == "xxh3:a"
+    assert cache.get("a", (1, 2, 4)) is None
+
+    # "b" is the least recently used
+    cache.set("c", (1, 2, 3), "xxh3:c")
+    assert "b" not in cache
+    assert len(cache) == 2
+
+    cache.save()
+    loaded = SignatureCache(path, max_size=1)
+    loaded.load()
+    assert list(loaded.entries) == ["c"]
+    assert loaded.get("c", (1, 2, 3)) == "xxh3:c"
+
+    # invalid files are ignored
+    with open(path, "w") as f:
+        f.write("{")
+    invalid = SignatureCache(path)
+    invalid.load()
+    assert len(invalid) == 0
+
+    with pytest.raises(ValueError):
+        SignatureCache(max_size=0)
+
+
+def test_signature_cache_config(tmp_path, monkeypatch):
+    """A file shared by several tasks is hashed once per run, and unchanged files are not read again in later runs"""
+    from doit.doit_cmd import DoitMain
+    from doit_api import checkers, doit_config, task
+    from doit_api.checkers import FastChecker, SignatureCache
+    from doit_api.loader import DoitApiTaskLoader
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(checkers, "_SIGNATURES", SignatureCache())
+    (tmp_path / "common.h").write_text(u"#define A 1")
+
+    hashed = []
+    get_file_digest = checkers.get_file_digest
+
+    def spy_digest(path, *args, **kwargs):
+        hashed.append(path)
+        return get_file_digest(path, *args, **kwargs)
+
+    monkeypatch.setattr(checkers, "get_file_digest", spy_digest)
+
+    config = doit_config(signature_cache=str(tmp_path / "sig.json"), dep_file=str(tmp_path / "deps.db"),
+                         backend='json')
+    assert config['check_file_uptodate'] is FastChecker
+    ns = dict(DOIT_CONFIG=config)
+    for name in "abc":
+        ns[name] = task(name=name, actions=["echo %s" % name], file_dep=["common.h"])
+
+    def run():
+        assert DoitMain(DoitApiTaskLoader(ns)).run(['run', '--reporter', 'zero']) == 0
+        checkers.get_signature_cache().save()
+        result = list(hashed)
+        del hashed[:]
+        return result
+
+    assert run() == ["common.h"]
+
+    # touched: checked by all tasks, but hashed once
+    os.utime("common.h", ns=(0, 10 ** 18))
+    assert run() == ["common.h"]
+
+    # a new task in a new run (the cache is reloaded from the file): not read again
+    monkeypatch.setattr(checkers, "_SIGNATURES", SignatureCache())
+    ns["d"] = task(name="d", actions=["echo d"], file_dep=["common.h"])
+    assert run() == []
+    assert "common.h" in checkers.get_signature_cache()
+
+    with pytest.raises(ValueError):
+        doit_config(signature_cache=True, check_file_uptodate='timestamp')
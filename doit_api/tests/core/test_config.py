@@ -118,3 +118,43 @@ Command %(failed)s: 'ech hi' returned %(failed_code)s
            failed_code=1 if win else 127,
            errmsg="'ech' is not recognized as an internal or external command, \n"
                   "operable program or batch file." if win else "/bin/sh: 1: ech: not found")
+
+
+@pytest.mark.skipif(sys.version_info < (3, 6), reason="DoitApiTaskLoader requires doit >= 0.36")
+@pytest.mark.parametrize("options, name", [("parallel_type='async'", "parallel_type='async'"),
+                                           ("manifest_cache=True", "manifest_cache"),
+                                           ("output_limit=10", "output_limit"),
+                                           (None, None)])
+def test_loader_options(tmp_path, monkeypatch, options, name):
+    """Tests that the options requiring the DoitApiTaskLoader are rejected when another task loader is used"""
+    from doit.cmd_base import DodoTaskLoader
+    from doit_api.loader import DoitApiTaskLoader
+
+    dodo_file = tmp_path / "dodo_loader_options.py"
+    dodo_file.write_text(u"from doit_api import doit_config\n"
+                         u"DOIT_CONFIG = doit_config(%s)\n" % (options or "verbosity=2"))
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    opt_values = {'dodoFile': str(dodo_file), 'cwdPath': None, 'seek_file': False}
+
+    def setup(task_loader):
+        sys.modules.pop("dodo_loader_options", None)
+        task_loader.setup(opt_values)
+        return task_loader.load_doit_config()
+
+    # the DoitApiTaskLoader accepts all options
+    assert len(setup(DoitApiTaskLoader())) == 1
+
+    # other loaders only accept the options of doit
+    if options is None:
+        assert setup(DodoTaskLoader()) == {'verbosity': 2}
+    else:
+        with pytest.raises(ValueError) as exc_info:
+            setup(DodoTaskLoader())
+        assert str(exc_info.value).startswith("doit_config: %s can only be used with the "
+                                              "`doit_api.loader.DoitApiTaskLoader` task loader, found DodoTaskLoader."
+                                              % name)
+
+    # when the loader is not known yet (module flow, e.g. `doit_api.loader.run(globals())`), nothing is checked
+    assert doit_config(parallel_type='async', output_limit=10) == {'par_type': 'async', 'output_limit': 10}
+    sys.modules.pop("dodo_loader_options", None)
@@ -0,0 +1,125 @@
+import os
+import sys
+
+import pytest
+
+pytestmark = pytest.mark.skipif(sys.version_info < (3, 6), reason="requires hashlib.blake2b and st_mtime_ns")
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    """Isolates the doit_api cache folder and the loaded directory indices"""
+    from doit_api import dirdep
+
+    monkeypatch.setenv("DOIT_API_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(dirdep, "_INDICES", dict())
+    return tmp_path / "cache"
+
+
+def test_dir_index(tmp_path, cache_dir, monkeypatch):
+    """The tree hash changes with the contents of the files, and only changed files are read"""
+    from doit_api import dirdep
+    from doit_api.dirdep import DirDep, DirIndex, get_index_path
+
+    root = tmp_path / "src"
+    (root / "a" / "b").mkdir(parents=True)
+    (root / "x.py").write_text(u"x")
+    (root / "a" / "y.py").write_text(u"y")
+    (root / "a" / "b" / "z.txt").write_text(u"z")
+
+    read = []
+    get_file_digest = dirdep.get_file_digest
+
+    def spy_digest(path, *args, **kwargs):
+        read.append(os.path.basename(path))
+        return get_file_digest(path, *args, **kwargs)
+
+    monkeypatch.setattr(dirdep, "get_file_digest", spy_digest)
+
+    dep = DirDep(str(root))
+    h0 = dep.get_hash()
+    assert sorted(read) == ["x.py", "y.py", "z.txt"]
+
+    # unchanged: nothing read, even from a reloaded index
+    del read[:]
+    assert dep.get_hash() == h0
+    dirdep._INDICES.clear()
+    assert dep.get_hash() == h0
+    assert read == []
+
+    # touched only: read again but same hash. An empty folder does not matter.
+    os.utime(str(root / "a" / "y.py"), ns=(0, 10 ** 18))
+    (root / "empty").mkdir()
+    assert dep.get_hash() == h0
+    assert read == ["y.py"]
+
+    # modified in place, deep in the tree
+    (root / "a" / "b" / "z.txt").write_text(u"Z")
+    h1 = dep.get_hash()
+    assert h1 != h0
+
+    # new and deleted files
+    (root / "a" / "b" / "w.txt").write_text(u"w")
+    h2 = dep.get_hash()
+    assert h2 not in (h0, h1)
+    (root / "a" / "b" / "w.txt").unlink()
+    assert dep.get_hash() == h1
+
+    # deleted folder: forgotten by the index
+    (root / "a" / "b" / "z.txt").unlink()
+    (root / "a" / "b").rmdir()
+    h3 = dep.get_hash()
+    index = DirIndex(get_index_path(dep))
+    index.load()
+    assert "a/b" not in index.nodes
+    assert "a" in index.nodes
+
+    # filters
+    assert DirDep(str(root), include=["*.py"]).get_hash() == h3
+    assert DirDep(str(root), exclude=["a"]).get_hash() != h3
+    assert DirDep(str(root), include=["*.txt"]).get_hash() is None
+
+    # trusting the folders modification times: files modified in place are not seen, new files are
+    trusting = DirDep(str(root), trust_dir_mtime=True)
+    h4 = trusting.get_hash()
+    assert h4 == h3
+    (root / "x.py").write_text(u"xx")
+    assert trusting.get_hash() == h4
+    (root / "new.py").write_text(u"new")
+    assert trusting.get_hash() != h4
+
+
+def test_dir_dep_task(tmp_path, cache_dir, monkeypatch):
+    """`dir_dep` makes a task depend on a directory tree"""
+    from doit.doit_cmd import DoitMain
+    from doit_api import task
+    from doit_api.dirdep import DirDep
+    from doit_api.loader import DoitApiTaskLoader
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "a.py").write_text(u"a")
+    (tmp_path / "src" / "a.pyc").write_text(u"a")
+
+    runs = []
+    ns = dict(
+        DOIT_CONFIG=dict(dep_file=str(tmp_path / "deps.db"), backend='json'),
+        a=task(name="a", actions=[lambda: runs.append("a")], dir_dep="src", tell_why_am_i_running=False),
+        b=task(name="b", actions=[lambda: runs.append("b")], dir_dep=[DirDep("src", exclude=["*.pyc"])],
+               uptodate=[True], tell_why_am_i_running=False),
+    )
+    assert ns['a'].dir_dep[0].path == "src"
+
+    def run():
+        assert DoitMain(DoitApiTaskLoader(ns)).run(['run', '--reporter', 'zero']) == 0
+        result = sorted(runs)
+        del runs[:]
+        return result
+
+    assert run() == ["a", "b"]
+    assert run() == []
+    (tmp_path / "src" / "a.pyc").write_text(u"b")
+    assert run() == ["a"]
+    (tmp_path / "src" / "sub").mkdir()
+    (tmp_path / "src" / "sub" / "b.py").write_text(u"b")
+    assert run() == ["a", "b"]
@@ -0,0 +1,83 @@
+import sys
+
+import pytest
+
+from doit_api import task, taskgen, pytask
+from doit_api.graph import TaskGraph
+
+
+def test_graph_from_task_dicts():
+    """Edges come from task_dep, setup, calc_dep and file_dep -> targets"""
+    tasks = [
+        dict(basename="a", actions=[], targets=["a.txt"]),
+        dict(basename="b", actions=[], file_dep=["a.txt", "src.txt"]),
+        dict(basename="c", actions=[], task_dep=["a"]),
+        dict(basename="d", actions=[], setup=["b"], calc_dep=["c"]),
+        dict(basename="e", actions=[], task_dep=["unknown"]),
+    ]
+    graph = TaskGraph.from_tasks(tasks)
+    assert graph.find_cycles() == []
+    assert graph.levels() == [["a", "e"], ["b", "c"], ["d"]]
+    assert graph.max_parallelism() == 2
+    assert graph.critical_path() == (3, ["a", "b", "d"])
+    assert graph.critical_path(cost=dict(c=10)) == (12, ["a", "c", "d"])
+    assert graph.remaining_costs(cost=dict(c=10)) == dict(a=12, b=2, c=11, d=1, e=1)
+
+
+def test_graph_cycles():
+    """Cycles (including self-dependencies) are all found"""
+    tasks = [dict(basename="a", task_dep=["b"]), dict(basename="b", task_dep=["c"]), dict(basename="c", task_dep=["a"]),
+             dict(basename="d", task_dep=["d"]), dict(basename="e", task_dep=["a"])]
+    graph = TaskGraph.from_tasks(tasks)
+    assert sorted(sorted(c) for c in graph.find_cycles()) == [["a", "b", "c"], ["d"]]
+    with pytest.raises(ValueError):
+        graph.levels()
+
+    # a long chain does not hit the recursion limit
+    n = sys.getrecursionlimit() * 2
+    graph = TaskGraph(["t%s" % i for i in range(n)], [("t%s" % i, "t%s" % (i + 1)) for i in range(n - 1)])
+    assert graph.find_cycles() == []
+    assert graph.critical_path()[0] == n
+
+
+@pytest.mark.skipif(sys.version_info < (3, 0), reason="doit version is 0.29 on python 2. Internal api is different.")
+def test_graph_from_doit_tasks():
+    """The graph can be built from the doit tasks loaded from doit_api objects, including wildcards and groups"""
+    from doit.loader import load_tasks
+
+    @pytask
+    def a():
+        pass
+
+    @taskgen
+    def gen():
+        for i in range(3):
+            yield task(name="s%s" % i, actions=["echo %s" % i], task_dep=[a])
+
+    b = task(name="b", actions=["echo b"], task_dep=["gen:*"])
+
+    graph = TaskGraph.from_tasks(load_tasks(dict(a=a, gen=gen, b=b)))
+    assert [sorted(lvl) for lvl in graph.levels()] == [["a"], ["gen:s0", "gen:s1", "gen:s2"], ["b", "gen"]]
+    assert graph.max_parallelism() == 3
+
+
+def test_graph_from_taskgen_dicts():
+    """The dictionaries yielded by a task generator are named '<basename>:<name>', and the group depends on them"""
+    @taskgen
+    def grp():
+        yield task(name="s1", actions=["echo 1"])
+        yield task(name="s2", actions=["echo 2"], task_dep=["grp:s1"])
+
+    last = dict(basename="last", actions=[], task_dep=["grp"])
+    graph = TaskGraph.from_tasks(list(grp.create_doit_tasks()) + [last])
+    assert sorted(graph.names) == ["grp", "grp:s1", "grp:s2", "last"]
+    assert graph.levels() == [["grp:s1"], ["grp:s2"], ["grp"], ["last"]]
+
+    # a subtask dictionary can also have a basename
+    graph = TaskGraph.from_tasks([dict(basename="g", name="s1"), dict(basename="t", task_dep=["g:s1"])])
+    assert graph.levels() == [["g:s1"], ["t"]]
+
+    # without basename, the full name is unknown
+    with pytest.raises(ValueError) as exc_info:
+        TaskGraph.from_tasks([dict(name="s1", actions=[])])
+    assert str(exc_info.value).startswith("Task dictionary 's1' has no basename")
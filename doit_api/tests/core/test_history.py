@@ -0,0 +1,63 @@
+import sys
+
+import pytest
+
+try:
+    from io import StringIO
+except ImportError:
+    from StringIO import StringIO
+
+
+pytestmark = pytest.mark.skipif(sys.version_info < (3, 3), reason="requires time.process_time")
+
+
+def test_history(tmp_path, monkeypatch):
+    """The history of task executions is recorded next to the dep file, and can be queried"""
+    from doit.cmd_base import ModuleTaskLoader
+    from doit.doit_cmd import DoitMain
+    from doit_api import doit_config, task, pytask
+    from doit_api.history import RunHistory, percentile
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "src.txt").write_text(u"a")
+
+    @pytask(file_dep=["src.txt"], targets=["out.txt"])
+    def build():
+        with open("out.txt", "w") as f:
+            f.write("b")
+
+    failing = task(name="failing", actions=["exit 1"])
+
+    DOIT_CONFIG = doit_config(history=True, dep_file=str(tmp_path / "deps.db"), reporter='zero')
+    assert DOIT_CONFIG['history'] == str(tmp_path / "deps.db.history.sqlite")
+
+    for _ in range(2):
+        out = StringIO()
+        saved = sys.stdout
+        sys.stdout = out
+        try:
+            DoitMain(ModuleTaskLoader(locals())).run(['run', '--continue'])
+        finally:
+            sys.stdout = saved
+        # 'zero' reporter
+        assert out.getvalue() == ""
+
+    with RunHistory(DOIT_CONFIG['history']) as history:
+        rows = history.conn.execute("SELECT run_id, task, status, wall_time IS NULL, cpu_time IS NULL "
+                                    "FROM task_runs ORDER BY run_id, task").fetchall()
+        assert rows == [(1, 'build', 'success', 0, 0), (1, 'failing', 'failure', 0, 0),
+                        (2, 'build', 'up-to-date', 1, 1), (2, 'failing', 'failure', 0, 0)]
+
+        assert [name for name, _ in history.slowest_tasks()] in (['build', 'failing'], ['failing', 'build'])
+        assert len(history.slowest_tasks(last_runs=1)) == 1
+        assert len(history.get_trend('failing')) == 2
+        assert sorted(history.get_percentiles(q=95)) == ['build', 'failing']
+        assert list(history.get_task_costs()) == ['build']
+
+        # retention
+        history.add_run(0, 1, [('x', 0, 1.0, None, 'success')], max_runs=2)
+        assert history.conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0] == 2
+
+    assert percentile([5, 1, 4, 2, 3], 95) == 5
+    assert percentile([5, 1, 4, 2, 3], 50) == 3
+    assert percentile([1], 0) == 1
@@ -0,0 +1,46 @@
+import subprocess
+import sys
+
+import pytest
+
+
+def _importtime(code):
+    """Runs `code` in a fresh interpreter with `-X importtime` and returns the {module: cumulative_us} dict"""
+    res = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    timings = dict()
+    for line in res.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        try:
+            timings[module.strip()] = int(cumulative)
+        except ValueError:
+            # header line
+            pass
+    return timings
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason="lazy mode requires module-level __getattr__ (python 3.7+)")
+def test_import_is_lazy():
+    """Importing the package should not import doit, setuptools_scm, nor our own `main` module"""
+    timings = _importtime("import doit_api")
+    assert "doit_api" in timings
+    for forbidden in ("doit_api.main", "doit", "setuptools_scm", "inspect", "typing", "platform"):
+        assert forbidden not in timings, "%s was imported by `import doit_api`" % forbidden
+
+    # benchmark: the package itself (alone) should be very fast to import. Generous bound for slow CI machines.
+    assert timings["doit_api"] < 50000
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason="lazy mode requires module-level __getattr__ (python 3.7+)")
+def test_lazy_symbols():
+    """Symbols and version are resolved on first access"""
+    import doit_api
+    from doit_api.main import task
+
+    assert doit_api.task is task
+    assert "task" in dir(doit_api)
+    assert isinstance(doit_api.__version__, str)
+    with pytest.raises(AttributeError):
+        doit_api.does_not_exist
@@ -0,0 +1,373 @@
+import sys
+from textwrap import dedent
+
+import pytest
+
+try:
+    from io import StringIO
+except ImportError:
+    from StringIO import StringIO
+
+
+pytestmark = pytest.mark.skipif(sys.version_info < (3, 0), reason="the loader requires doit >= 0.36")
+
+
+DODO = """
+from doit_api import doit_config, task, taskgen
+
+DOIT_CONFIG = doit_config(manifest_cache='manifest.json')
+
+a = task(name="a", actions=["echo a"], doc="the a", file_dep=["a.txt"])
+
+@taskgen
+def gen():
+    ''' the gen '''
+    with open("gen_calls.txt", "a") as f:
+        f.write("x")
+    for i in range(3):
+        yield task(name="sub%s" % i, actions=["echo %s" % i], task_dep=[a], targets=["t%s.txt" % i])
+"""
+
+
+def _run_doit(args, expected_res=0):
+    from doit.doit_cmd import DoitMain
+    from doit_api.loader import DoitApiTaskLoader
+
+    out = StringIO()
+    saved = sys.stdout
+    sys.stdout = out
+    try:
+        res = DoitMain(DoitApiTaskLoader()).run(args)
+    finally:
+        sys.stdout = saved
+    assert res == expected_res
+    return out.getvalue()
+
+
+def test_manifest_cache(tmp_path, monkeypatch):
+    """`doit list` is answered from the manifest when the dodo file does not change"""
+    monkeypatch.chdir(tmp_path)
+    dodo = tmp_path / "dodo_manifest.py"
+    dodo.write_text(dedent(DODO))
+    (tmp_path / "a.txt").write_text(u"a")
+
+    def gen_calls():
+        try:
+            return len((tmp_path / "gen_calls.txt").read_text())
+        except IOError:
+            return 0
+
+    args = ['list', '--all', '--deps', '-f', str(dodo)]
+    out1 = _run_doit(args)
+    assert gen_calls() == 1
+    assert (tmp_path / "manifest.json").exists()
+
+    # second time: the generator is not called and the output is the same
+    out2 = _run_doit(args)
+    assert gen_calls() == 1
+    assert out2 == out1
+    assert "gen:sub2" in out2
+    assert " -  a.txt" in out2
+
+    # list --status needs the real tasks
+    _run_doit(['list', '--status', '-f', str(dodo)])
+    assert gen_calls() == 2
+
+    # modifying the dodo file invalidates the manifest
+    dodo.write_text(dedent(DODO) + "\n# modified\n")
+    sys.modules.pop("dodo_manifest", None)
+    _run_doit(args)
+    assert gen_calls() == 3
+
+
+DODO_INFO = """
+from doit_api import doit_config, task, taskgen
+
+DOIT_CONFIG = doit_config(manifest_cache='manifest.json')
+
+@taskgen
+def gen():
+    with open("gen_calls.txt", "a") as f:
+        f.write("x")
+    yield task(name="a", actions=["echo a"], doc="the a", file_dep=["a.txt"], targets=["a.out"], verbosity=2)
+    yield task(name="b", actions=["echo b"], task_dep=["gen:a"], uptodate=[True])
+    yield dict(name="p", actions=["echo %(x)s"], meta={'k': [1, 2]},
+               params=[{'name': 'x', 'long': 'x', 'default': 'y', 'help': 'the x'}])
+    yield dict(name="q", actions=["echo %(x)s"], params=[{'name': 'x', 'long': 'x', 'default': 1, 'type': int}])
+"""
+
+
+def test_manifest_info(tmp_path, monkeypatch):
+    """`doit info` and `doit help <task>` are answered from the manifest when it contains what they show"""
+    monkeypatch.chdir(tmp_path)
+    dodo = tmp_path / "dodo_manifest_info.py"
+    dodo.write_text(dedent(DODO_INFO))
+    (tmp_path / "a.txt").write_text(u"a")
+
+    def gen_calls():
+        return len((tmp_path / "gen_calls.txt").read_text())
+
+    def run_twice(args, expected_res=0, from_manifest=True):
+        """runs `args` with the real tasks then with the manifest, and checks that the output is the same"""
+        (tmp_path / "manifest.json").unlink()
+        out1 = _run_doit(args, expected_res)
+        n_calls = gen_calls()
+        out2 = _run_doit(args, expected_res)
+        assert gen_calls() == (n_calls if from_manifest else n_calls + 1)
+        assert out2 == out1
+        return out2
+
+    _run_doit(['list', '-f', str(dodo)])
+    assert gen_calls() == 1
+
+    # the status of a task without uptodate checkers is computed with the stored file_dep and targets
+    out = run_twice(['info', '-f', str(dodo), 'gen:a'], expected_res=1)
+    assert "the a" in out and "status     : run" in out and "verbosity  : 2" in out
+    # a task with uptodate checkers needs the real tasks, unless the status is hidden
+    run_twice(['info', '-f', str(dodo), 'gen:b'], from_manifest=False)
+    out = run_twice(['info', '--no-status', '-f', str(dodo), 'gen:b'])
+    assert "gen:a" in out and "status" not in out
+    # json-able parameters and meta are stored, other ones need the real tasks
+    out = run_twice(['info', '-f', str(dodo), 'gen:p'], expected_res=1)
+    assert "'k': [1, 2]" in out and "the x" in out
+    out = run_twice(['help', '-f', str(dodo), 'gen:p'])
+    assert "the x" in out
+    run_twice(['help', '-f', str(dodo), 'gen:q'], from_manifest=False)
+
+    sys.modules.pop("dodo_manifest_info", None)
+
+
+class _FakeCmd(object):
+    def __init__(self, name):
+        self.name = name
+        self.execute_tasks = name == 'run'
+
+
+def test_lazy_taskgen(tmp_path, monkeypatch):
+    """Only the selected subtasks of a lazy taskgen, and the ones that the created tasks depend on, are created"""
+    from doit.doit_cmd import DoitMain
+    from doit_api import doit_config, task, taskgen, pytask
+    from doit_api.loader import DoitApiTaskLoader
+
+    monkeypatch.chdir(tmp_path)
+    built = []
+
+    @taskgen(lazy=True)
+    def gen(selected):
+        """ a lazy generator """
+        for i in range(1000):
+            name = "s%s" % i
+            if selected(name):
+                built.append(name)
+                yield task(name=name, actions=["echo %s" % i],
+                           task_dep=["gen:s%s" % (i + 2)] if i in (5, 7) else None)
+
+    @pytask(task_dep=["gen:s500"])
+    def other():
+        pass
+
+    ns = dict(gen=gen, other=other,
+              DOIT_CONFIG=doit_config(default_tasks=["other"], dep_file=str(tmp_path / "deps.db"), backend='json',
+                                      verbosity=0))
+
+    def run(*args):
+        del built[:]
+        return DoitMain(DoitApiTaskLoader(ns)).run(list(args))
+
+    # selected subtask and its dependencies (recursively), and the dependencies of the other tasks (doit checks them)
+    assert run('run', 'gen:s5') == 0
+    assert sorted(built) == ["s5", "s500", "s7", "s9"]
+
+    # wildcard
+    assert run('run', 'gen:s99*') == 0
+    assert sorted(built) == ["s500", "s99", "s990", "s991", "s992", "s993", "s994", "s995", "s996", "s997", "s998",
+                             "s999"]
+
+    # default tasks are used by `run`
+    assert run('run') == 0
+    assert built == ["s500"]
+
+    # whole group, commands listing everything, or unknown argument (maybe a target): everything is built
+    assert run('run', 'gen') == 0
+    assert len(built) == 1000
+    assert run('list', '--all') == 0
+    assert len(built) == 1000
+    assert run('run', 'some/target.txt') == 3
+    assert len(built) == 1000
+
+
+@pytest.mark.parametrize("executor", ['thread', 'process'])
+def test_taskgen_workers(executor):
+    """Task generators evaluated concurrently produce the same tasks, in the same order, as serial evaluation"""
+    if executor == 'process' and sys.platform == 'win32':
+        pytest.skip("fork is not available")
+
+    from doit_api import doit_config, task, taskgen
+    from doit_api.loader import DoitApiTaskLoader
+
+    def make_gen(i):
+        def gen():
+            for j in range(3):
+                yield task(name="s%s" % j, actions=["echo %s %s" % (i, j)])
+        gen.__name__ = "gen%s" % i
+        return taskgen(gen)
+
+    def load(**config):
+        ns = dict(("gen%s" % i, make_gen(i)) for i in range(5))
+        ns["DOIT_CONFIG"] = doit_config(**config)
+        loader = DoitApiTaskLoader(ns)
+        loader.setup({})
+        loader.load_doit_config()
+        return [(t.name, t.task_dep, [getattr(a, '_action', None) for a in t.actions])
+                for t in loader.load_tasks(_FakeCmd('list'), [])]
+
+    expected = load()
+    assert len(expected) == 20
+    assert load(taskgen_workers=4, taskgen_executor=executor) == expected
+
+    # errors are raised as in serial evaluation
+    @taskgen
+    def broken():
+        yield task(name="ok", actions=["echo ok"])
+        raise ValueError("broken generator")
+
+    loader = DoitApiTaskLoader(dict(gen0=make_gen(0), broken=broken,
+                                    DOIT_CONFIG=doit_config(taskgen_workers=2, taskgen_executor=executor)))
+    loader.setup({})
+    loader.load_doit_config()
+    with pytest.raises(ValueError, match="broken generator"):
+        loader.load_tasks(_FakeCmd('list'), [])
+    assert broken.preloaded is None
+
+
+def test_dangling_task_references():
+    """Non-existent task names are reported before the task generators are run, or once they have run"""
+    from doit import create_after
+    from doit.exceptions import InvalidTask
+    from doit_api import task, taskgen, pytask
+    from doit_api.loader import DoitApiTaskLoader
+
+    calls = []
+
+    @taskgen
+    def gen():
+        calls.append(1)
+        yield task(name="s", actions=["echo s"])
+
+    @pytask(task_dep=["gen:s", "gen:*"])
+    def ok():
+        pass
+
+    def make_loader(**ns):
+        loader = DoitApiTaskLoader(ns)
+        loader.setup({})
+        loader.load_doit_config()
+        return loader
+
+    assert len(make_loader(gen=gen, ok=ok).load_tasks(_FakeCmd('list'), [])) == 3
+    assert len(calls) == 1
+
+    typo = task(name="typo", actions=[], setup=["gne:s"])
+    with pytest.raises(InvalidTask, match="Task 'typo' setup 'gne:s' does not exist"):
+        make_loader(ok=ok, typo=typo).load_tasks(_FakeCmd('list'), [])
+
+    # a doit task generator may define any basename: no check
+    def task_other():
+        yield dict(basename="gne", name="s", actions=[])
+
+    assert len(make_loader(gen=gen, typo=typo, task_other=task_other).load_tasks(_FakeCmd('list'), [])) == 5
+
+    # and so may a plain doit task function or a @taskgen, with a `basename` in a dict
+    def task_foo():
+        return dict(basename="bar", actions=[])
+
+    @taskgen
+    def gen2():
+        yield dict(basename="baz", actions=[])
+
+    uses_bar = task(name="uses_bar", actions=[], task_dep=["bar", "baz"])
+    assert len(make_loader(task_foo=task_foo, gen2=gen2, uses_bar=uses_bar).load_tasks(_FakeCmd('list'), [])) == 4
+
+    # the references of all tasks are then checked once the generators have run, and reported at once
+    @taskgen
+    def gen3():
+        yield task(name="s", actions=[], calc_dep=["gen3:nope"])
+
+    uses_typos = task(name="uses_typos", actions=[], task_dep=["bar", "gen:t"], setup=["gne:s"])
+    with pytest.raises(InvalidTask) as exc_info:
+        make_loader(task_foo=task_foo, gen=gen, gen3=gen3, uses_typos=uses_typos).load_tasks(_FakeCmd('list'), [])
+    assert sorted(str(exc_info.value).splitlines()) == ["Task 'gen3:s' calc_dep 'gen3:nope' does not exist.",
+                                                        "Task 'uses_typos' setup 'gne:s' does not exist.",
+                                                        "Task 'uses_typos' task_dep 'gen:t' does not exist."]
+
+    # except the references to the subtasks of delayed task creators, created when they run
+    @create_after(creates=["late"])
+    def task_late():
+        yield dict(name="s", actions=[])
+
+    uses_late = task(name="uses_late", actions=[], task_dep=["late:s"])
+    assert len(make_loader(gen=gen, task_late=task_late, uses_late=uses_late).load_tasks(_FakeCmd('run'), [])) == 4
+
+
+def test_task_options():
+    """The options used by the tasks are applied by the loader from its DOIT_CONFIG, not by `doit_config`"""
+    from doit_api import doit_config, task
+    from doit_api.actions import BoundedCmdAction
+    from doit_api.buildcache import BuildCache
+    from doit_api.history import HistoryReporter
+    from doit_api.loader import DoitApiTaskLoader
+
+    config = doit_config(output_limit=10, output_spill=False, build_cache_link='hardlink', history="h.sqlite")
+    assert task.default_output_limit is None and BoundedCmdAction.spill and BuildCache.cache_link == 'copy'
+    assert HistoryReporter.history_file is None and config['reporter'].history_file == "h.sqlite"
+
+    def load(**ns):
+        loader = DoitApiTaskLoader(ns)
+        loader.setup({})
+        loader.load_doit_config()
+        return loader.load_tasks(_FakeCmd('list'), [])
+
+    t = task(name="t", actions=["echo"])
+    try:
+        load(DOIT_CONFIG=config, t=t)
+        assert (task.default_output_limit, BoundedCmdAction.spill, BuildCache.cache_link) == (10, False, 'hardlink')
+    finally:
+        # reset to the defaults
+        load(t=t)
+    assert (task.default_output_limit, BoundedCmdAction.spill, BuildCache.cache_link) == (None, True, 'copy')
+
+
+def test_critical_path_scheduling():
+    """With scheduling='critical_path', `run` dispatches the tasks with the most expensive remaining chain first"""
+    from doit_api import doit_config, task, taskgen
+    from doit_api.loader import DoitApiTaskLoader
+
+    @taskgen
+    def cheap():
+        for i in range(3):
+            yield task(name="c%s" % i, actions=["echo %s" % i])
+
+    long1 = task(name="long1", actions=["echo 1"], cost=10)
+    long2 = task(name="long2", actions=["echo 2"], cost=10, task_dep=[long1])
+    final = task(name="final", actions=["echo final"], task_dep=[cheap, long2])
+
+    def load(cmd_name='run', **config):
+        loader = DoitApiTaskLoader(dict(cheap=cheap, long1=long1, long2=long2, final=final,
+                                        DOIT_CONFIG=doit_config(**config)))
+        loader.setup({})
+        loader.load_doit_config()
+        return loader.load_tasks(_FakeCmd(cmd_name), [])
+
+    # (note: doit sorts task creators by source line number, which is the line of our hook for `task` objects)
+    definition_order = [t.name for t in load()]
+    assert definition_order != ['long1', 'long2', 'cheap:c0', 'cheap:c1', 'cheap:c2', 'final', 'cheap']
+    assert [t.name for t in load('list', scheduling='critical_path')] == definition_order
+
+    tasks = load(scheduling='critical_path')
+    assert [t.name for t in tasks] == ['long1', 'long2', 'cheap:c0', 'cheap:c1', 'cheap:c2', 'final', 'cheap']
+    assert dict((t.name, t) for t in tasks)['final'].task_dep == ['long2', 'cheap']
+    assert tasks[0].meta == dict(cost=10)
+
+    # recorded costs take precedence over the hints
+    tasks = load(scheduling='critical_path', task_costs={'cheap:c1': 100})
+    assert [t.name for t in tasks][:3] == ['cheap:c1', 'long1', 'long2']
@@ -1,6 +1,6 @@
 import pickle
 
-from doit_api import task, pytask
+from doit_api import task, taskgen, pytask
 
 
 def test_pickle_simple():
@@ -25,3 +25,19 @@ def test_pickle_simple_decorator():
     pkl = pickle.dumps(mytask)
     t2 = pickle.loads(pkl)
     assert t2.create_doit_tasks()['actions'][1] == mytask
+
+
+def test_pickle_all_protocols():
+    """ `task` and `taskgen` use __slots__: make sure that they can be pickled with all protocols """
+    t = task(actions=["echo"], name="t", file_dep=["a.txt"])
+    for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+        t2 = pickle.loads(pickle.dumps(t, protocol=protocol))
+        assert t2.file_dep == ["a.txt"]
+        assert t2.create_doit_tasks()['basename'] == "t"
+
+
+def test_no_hook_on_classes():
+    """ doit inspects all symbols in the dodo file: the hook should only exist on instances """
+    assert not hasattr(task, 'create_doit_tasks')
+    assert not hasattr(taskgen, 'create_doit_tasks')
+    assert not hasattr(task(actions=["echo"], name="t"), '__dict__')
@@ -0,0 +1,97 @@
+import sys
+import time
+
+import pytest
+
+pytestmark = pytest.mark.skipif(sys.version_info < (3, 5) or sys.platform == 'win32',
+                                reason="requires asyncio and posix shell commands")
+
+
+def test_async_runner(tmp_path, monkeypatch):
+    """With parallel_type='async', command actions run concurrently on one event loop"""
+    from doit.action import CmdAction
+    from doit.doit_cmd import DoitMain
+    from doit_api import doit_config, task, taskgen
+    from doit_api.loader import DoitApiTaskLoader
+
+    monkeypatch.chdir(tmp_path)
+    results = dict()
+
+    def check(out):
+        results['out'] = out
+
+    def make_namespace(concurrency):
+        @taskgen
+        def sleep():
+            for i in range(8):
+                yield task(name="s%s" % i, actions=["sleep 0.25"])
+
+        return dict(
+            DOIT_CONFIG=doit_config(dep_file=str(tmp_path / "deps.db"), backend='json', num_process=8,
+                                    parallel_type='async', async_concurrency=concurrency),
+            sleep=sleep,
+            echo=task(name="echo", actions=[CmdAction("printf 'hello\\nworld'", save_out='out')],
+                      task_dep=["sleep"]),
+            check=task(name="check", actions=[check], getargs=dict(out=("echo", "out"))),
+        )
+
+    def run(concurrency):
+        start = time.time()
+        assert DoitMain(DoitApiTaskLoader(make_namespace(concurrency))).run(['run', '--reporter', 'zero']) == 0
+        return time.time() - start
+
+    # 8 commands of 0.25s: at most 2 at the same time, or all at the same time
+    assert run(2) >= 1.0
+    assert run(None) < 1.0
+    assert results['out'] == "hello\nworld"
+
+    # failures
+    ns = dict(DOIT_CONFIG=doit_config(dep_file=str(tmp_path / "deps.db"), backend='json', num_process=2,
+                                      parallel_type='async'),
+              fail=task(name="fail", actions=["seq 1000; exit 1"], output_limit=10),
+              ok=task(name="ok", actions=["true"]))
+    assert DoitMain(DoitApiTaskLoader(ns)).run(['run', '--reporter', 'zero', '--continue']) == 1
+    with open(str(tmp_path / ".doit_api" / "output" / "fail.0.out.log")) as f:
+        assert f.read().split() == [str(i) for i in range(1, 1001)]
+
+    with pytest.raises(ValueError):
+        doit_config(parallel_type='fibers')
+
+
+def test_async_concurrency_and_failures(tmp_path, monkeypatch):
+    """`async_concurrency` bounds the running commands, and with `--continue` the independent tasks run after a failure"""
+    from doit.doit_cmd import DoitMain
+    from doit_api import doit_config, task, taskgen
+    from doit_api import envprofile
+    from doit_api.loader import DoitApiTaskLoader
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(envprofile, '_KEYS', dict())
+    monkeypatch.setattr(envprofile, '_CHANGES', dict())
+
+    @taskgen
+    def work():
+        for i in range(9):
+            yield task(name="w%s" % i, actions=["echo + >> log.txt; sleep 0.1; echo - >> log.txt"])
+
+    ns = dict(
+        DOIT_CONFIG=doit_config(dep_file=str(tmp_path / "deps.db"), backend='json', num_process=8,
+                                parallel_type='async', async_concurrency=3),
+        work=work,
+        fail=task(name="fail", actions=["exit 1"]),
+        after=task(name="after", actions=["touch after.txt"], task_dep=["fail"]),
+        profile=task(name="profile", actions=["echo $GREETING > profile.txt"], env_profile="export GREETING=hi"),
+    )
+    # (doit returns 2 as 'after' can not run)
+    assert DoitMain(DoitApiTaskLoader(ns)).run(['run', '--reporter', 'zero', '--continue']) == 2
+
+    # at most 3 commands at the same time
+    running, max_running = 0, 0
+    for line in (tmp_path / "log.txt").read_text().split():
+        running += 1 if line == "+" else -1
+        max_running = max(max_running, running)
+    assert max_running == 3
+
+    # the tasks that do not depend on the failed one were executed
+    assert (tmp_path / "profile.txt").read_text() == u"hi\n"
+    assert not (tmp_path / "after.txt").exists()
@@ -0,0 +1,122 @@
+import os
+
+import pytest
+
+pytestmark = pytest.mark.skipif(os.name != 'posix', reason="requires a posix shell")
+
+
+def test_shell_session(tmp_path, monkeypatch):
+    """Command actions run in persistent shell sessions, set up once per session"""
+    from doit.doit_cmd import DoitMain
+    from doit_api import cmdtask, task, taskgen
+    from doit_api.loader import DoitApiTaskLoader
+    from doit_api.shells import close_sessions
+
+    monkeypatch.chdir(tmp_path)
+    setup = "echo setup >> setup.log; export GREETING=hello"
+
+    @taskgen
+    def greet():
+        for i in range(5):
+            # changes of directory or variables do not leak to the next commands
+            yield task(name="g%s" % i, actions=["echo $GREETING $FOO > out%s.txt; cd /; FOO=bar" % i],
+                       shell_session=setup)
+
+    @cmdtask(shell_session=True, task_dep=["greet"])
+    def multiline():
+        return """
+        echo "it's" > multi.txt
+        printf 'no newline' >> multi.txt
+        """
+
+    ns = dict(
+        DOIT_CONFIG=dict(dep_file=str(tmp_path / "deps.db"), backend='json', verbosity=0),
+        greet=greet, multiline=multiline,
+        fail=task(name="fail", actions=["echo failing >&2; exit 3"], shell_session=setup),
+        env=task(name="env", actions=["echo $CHANGED > env.txt"], shell_session=setup),
+    )
+    try:
+        assert DoitMain(DoitApiTaskLoader(ns)).run(['run', 'multiline']) == 0
+        assert DoitMain(DoitApiTaskLoader(ns)).run(['run', '--output-file', 'report.txt', 'fail']) == 1
+        # the sessions were set up once
+        assert (tmp_path / "setup.log").read_text() == u"setup\n"
+
+        # a new session is started when the environment changed
+        monkeypatch.setenv("CHANGED", "yes")
+        assert DoitMain(DoitApiTaskLoader(ns)).run(['run', 'env']) == 0
+        assert (tmp_path / "env.txt").read_text() == u"yes\n"
+        assert (tmp_path / "setup.log").read_text() == u"setup\nsetup\n"
+    finally:
+        close_sessions()
+
+    for i in range(5):
+        assert (tmp_path / ("out%s.txt" % i)).read_text() == u"hello\n"
+    assert (tmp_path / "multi.txt").read_text() == u"it's\nno newline"
+    report = (tmp_path / "report.txt").read_text()
+    assert "returned 3" in report and "fail <stderr>:\nfailing\n" in report
+
+
+def test_session_output():
+    """The outputs are read until the sentinels, whatever their size and encoding"""
+    import io
+    from doit_api.shells import ShellError, ShellSession
+
+    session = ShellSession()
+    try:
+        output, errput = io.StringIO(), io.StringIO()
+        assert session.run("seq 100000; printf 'caf\\303\\251' >&2", output, errput) == 0
+        assert output.getvalue() == "".join("%s\n" % i for i in range(1, 100001))
+        assert errput.getvalue() == u"caf\xe9"
+
+        with pytest.raises(ShellError):
+            ShellSession("exit 1")
+    finally:
+        session.close()
+
+
+def test_env_profile(tmp_path, monkeypatch):
+    """The environment changes of an activation script are captured once, cached, and renewed when its inputs change"""
+    from doit.doit_cmd import DoitMain
+    from doit_api import cmdtask, task, taskgen
+    from doit_api import envprofile
+    from doit_api.loader import DoitApiTaskLoader
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(envprofile, '_KEYS', dict())
+    monkeypatch.setattr(envprofile, '_CHANGES', dict())
+    monkeypatch.setenv("TO_REMOVE", "1")
+    (tmp_path / "env.sh").write_text(u"echo activated >> activations.log; export GREETING=hello; unset TO_REMOVE\n")
+
+    @taskgen
+    def greet():
+        for i in range(3):
+            yield task(name="g%s" % i, actions=["echo $GREETING ${TO_REMOVE:-removed} > out%s.txt" % i],
+                       env_profile=". ./env.sh")
+
+    @cmdtask(env_profile=envprofile.EnvProfile("exit 1"))
+    def fail():
+        return "true"
+
+    ns = dict(DOIT_CONFIG=dict(dep_file=str(tmp_path / "deps.db"), backend='json', verbosity=0), greet=greet,
+              fail=fail)
+
+    def run(*args):
+        envprofile._KEYS.clear()
+        envprofile._CHANGES.clear()
+        return DoitMain(DoitApiTaskLoader(ns)).run(['run', '--reporter', 'zero'] + list(args))
+
+    assert run('greet') == 0
+    for i in range(3):
+        assert (tmp_path / ("out%s.txt" % i)).read_text() == u"hello removed\n"
+    # cached on disk
+    assert run('greet') == 0
+    assert (tmp_path / "activations.log").read_text() == u"activated\n"
+    # the script changed
+    (tmp_path / "env.sh").write_text(u"echo activated >> activations.log; export GREETING=bye\n")
+    assert run('greet') == 0
+    assert (tmp_path / "out0.txt").read_text() == u"bye 1\n"
+    assert (tmp_path / "activations.log").read_text() == u"activated\nactivated\n"
+
+    assert run('fail') == 2
+    with pytest.raises(ValueError):
+        task(name="t", actions=["true"], env_profile="true", shell_session=True)
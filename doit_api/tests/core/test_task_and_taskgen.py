@@ -1,6 +1,8 @@
 import platform
 import sys
 
+import pytest
+
 try:
     from io import StringIO
 except ImportError:
@@ -12,7 +14,7 @@ from doit.cmd_list import List
 from doit.cmd_run import Run
 from doit_api.tests.conftest import CmdFactory
 
-from doit_api import task, taskgen, pytask, why_am_i_running, cmdtask
+from doit_api import task, taskgen, tasktable, pytask, why_am_i_running, cmdtask
 
 
 def test_task(monkeypatch, depfile_name, capsys):
@@ -203,3 +205,74 @@ hello variant
 hello sub
 hello variant
 """
+
+
+def test_tasktable():
+    """Tests that a table of subtasks can be yielded from a taskgen"""
+
+    @pytask
+    def a():
+        print("hello !")
+
+    @taskgen
+    def tbl():
+        """ a table """
+        names = ["f%s" % i for i in range(3)]
+        yield tasktable(names=names,
+                        actions=[["echo %s" % n] for n in names],
+                        targets=[["%s.txt" % n] for n in names],
+                        docs=["doc of %s" % n for n in names],
+                        title="shared title",
+                        task_dep=[a],
+                        uptodate=[True],
+                        verbosity=2)
+
+    with pytest.raises(ValueError):
+        tasktable(names=["a", "b"], actions=[["echo"]])
+
+    if sys.version_info < (3, 0):
+        # doit version is 0.29 on python 2. Internal api is different.
+        return
+
+    loader = ModuleTaskLoader(locals())
+    loader.setup({})
+    loader.load_doit_config()
+    task_list = loader.load_tasks(Command(), [])
+    tasks = dict((t.name, t) for t in task_list)
+    assert sorted(tasks) == ['a', 'tbl', 'tbl:f0', 'tbl:f1', 'tbl:f2']
+    assert tasks['tbl'].task_dep == ['tbl:f0', 'tbl:f1', 'tbl:f2']
+
+    f1 = tasks['tbl:f1']
+    assert f1.doc == "doc of f1"
+    assert f1.targets == ["f1.txt"]
+    assert f1.task_dep == ['a']
+    assert f1.verbosity == 2
+    assert f1.title() == "tbl:f1 => shared title"
+    assert f1.actions[0].py_callable == why_am_i_running
+    assert f1.actions[1]._action == "echo f1"
+
+    # shared fields are shared, not copied
+    assert tasks['tbl:f0'].custom_title is f1.custom_title
+
+
+def test_task_references():
+    """Task references are resolved to their final names once, when tasks are defined"""
+
+    @pytask(name="custom")
+    def a():
+        pass
+
+    def task_build_task_x():
+        return dict(actions=[])
+
+    @taskgen(doc="a group")
+    def gen():
+        yield task(name="s", actions=["echo s"])
+
+    b = task(name="b", actions=[], task_dep=[a, task_build_task_x, gen, "gen:s"], setup=[a], calc_dep=[gen])
+    assert b.task_dep == ["custom", "build_task_x", "gen", "gen:s"]
+    assert b.setup == ["custom"]
+    assert b.calc_dep == ["gen"]
+
+    with pytest.raises(TypeError):
+        task(name="c", actions=[], task_dep=[1])
@@ -0,0 +1,69 @@
+import os
+import sys
+
+import pytest
+
+from doit_api.utils import find_missing_path
+
+
+@pytest.mark.skipif(sys.version_info < (3, 5), reason="os.scandir is not available")
+def test_find_missing_path(tmp_path, monkeypatch):
+    """Directories containing many paths are listed, once per run as long as they are not modified"""
+    from doit_api import utils
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(utils, "_DIR_LISTINGS", dict())
+    old = os.stat(str(tmp_path)).st_mtime - 10
+    for d in ("a", "b"):
+        (tmp_path / d).mkdir()
+        for i in range(100):
+            (tmp_path / d / ("f%s.txt" % i)).write_text(u"x")
+        os.utime(d, (old, old))
+    (tmp_path / "top.txt").write_text(u"x")
+
+    scanned = []
+    original_scandir = os.scandir
+
+    def scandir(path):
+        scanned.append(path)
+        return original_scandir(path)
+
+    monkeypatch.setattr(os, "scandir", scandir)
+
+    # only the directories containing many paths are listed
+    paths = ["top.txt", "a/"] + ["a/f%s.txt" % i for i in range(100)] + [str(tmp_path / "b" / "f1.txt")]
+    assert find_missing_path(paths) is None
+    assert scanned == [str(tmp_path / "a")]
+
+    # the listing is reused while the directory is not modified, even from another working directory
+    del scanned[:]
+    assert find_missing_path(["a/f%s.txt" % i for i in range(100)]) is None
+    monkeypatch.chdir(tmp_path / "b")
+    assert find_missing_path(["../a/f%s.txt" % i for i in range(100)] + ["a/f0.txt"]) == "a/f0.txt"
+    monkeypatch.chdir(tmp_path)
+    assert scanned == []
+
+    # a modified directory is listed again, and a recently modified one is not reused
+    os.remove("a/f3.txt")
+    assert find_missing_path(["a/f%s.txt" % i for i in range(100)]) == "a/f3.txt"
+    assert find_missing_path(["a/f%s.txt" % i for i in range(100)]) == "a/f3.txt"
+    assert scanned == [str(tmp_path / "a")] * 2
+
+    # a few paths in a large directory are checked with `os.path.exists`, and listings are cleared between runs
+    os.utime("a", (old, old))
+    del scanned[:]
+    assert find_missing_path(["a/f%s.txt" % i for i in range(64, 100)]) is None
+    assert scanned == []
+    utils.clear_dir_listings()
+    assert find_missing_path(["a/f%s.txt" % i for i in range(4, 100)]) is None
+    assert scanned == [str(tmp_path / "a")]
+
+    # missing files and directories
+    paths = ["a/f%s.txt" % i for i in range(4, 100)]
+    assert find_missing_path(paths[:50] + ["a/nope.txt"] + paths[50:]) == "a/nope.txt"
+    assert find_missing_path(["nodir/f0.txt"]) == "nodir/f0.txt"
+
+    # dangling symlinks do not exist
+    if hasattr(os, "symlink") and sys.platform != "win32":
+        os.symlink("does_not_exist", "a/link")
+        assert find_missing_path(["a/link"]) == "a/link"
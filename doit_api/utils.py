@@ -0,0 +1,167 @@
+import os
+import time
+from collections import Counter
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Dict, Iterable, Optional, Set, Tuple  # noqa: F401
+
+# the default folder where doit_api stores its caches (relative to the current working directory, that is by default
+# the folder containing the dodo.py file). It can be changed with the DOIT_API_CACHE_DIR environment variable.
+DEFAULT_CACHE_DIR = '.doit_api'
+
+
+def get_cache_path(*parts):
+    """
+    Returns the path to a file or folder inside the doit_api cache folder. The cache folder is created if needed.
+
+    :param parts: the path elements, relative to the cache folder
+    :return: the path
+    """
+    cache_dir = os.environ.get('DOIT_API_CACHE_DIR', DEFAULT_CACHE_DIR)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    return os.path.join(cache_dir, *parts)
+
+
+def atomic_write(path, data):
+    """
+    Writes `data` (bytes) to `path` atomically: a temporary file is written in the same folder and then renamed, so
+    that concurrent readers (other doit processes) never see a partially written file.
+
+    :param path: the destination file path
+    :param data: the bytes to write
+    """
+    parent = os.path.dirname(path)
+    if parent and not os.path.isdir(parent):
+        try:
+            os.makedirs(parent)
+        except OSError:
+            # created concurrently
+            if not os.path.isdir(parent):
+                raise
+
+    tmp_path = "%s.%s.tmp" % (path, os.getpid())
+    with open(tmp_path, mode='wb') as f:
+        f.write(data)
+    try:
+        os.replace(tmp_path, path)
+    except AttributeError:
+        # python 2: no os.replace. os.rename is atomic on posix but fails on windows if the destination exists
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(tmp_path, path)
+
+
+# `find_missing_path` only lists a directory when at least this number of paths are checked in it, and at least this
+# ratio of its number of entries once it is known: otherwise calling `os.path.exists` on each path is faster
+_LISTING_MIN_PATHS = 64
+_LISTING_MIN_RATIO = 0.25
+
+# a listing is only reused if its directory was not modified in the seconds before it was made: a change in the same
+# mtime tick would not be detected otherwise
+_RACY_DELAY = 2
+
+# the directory listings made by `find_missing_path` during the current run: {absolute path: (mtime, names)}. The
+# mtime is None when the listing is only kept to know the size of the directory.
+_DIR_LISTINGS = dict()  # type: Dict[str, Tuple[Optional[float], Set[str]]]
+
+
+def clear_dir_listings():
+    """Clears the directory listings kept by `find_missing_path`. The `DoitApiTaskLoader` calls it before each run."""
+    _DIR_LISTINGS.clear()
+
+
+def _get_dir_listing(dir_path  # type: str
+                     ):
+    """
+    Returns the set of names of the entries (except symlinks) of directory `dir_path`, or None if it can not be listed.
+    """
+    names = set()
+    try:
+        for entry in os.scandir(dir_path):
+            # symlinks may be dangling: they are not in the set, so that `os.path.exists` is used for them
+            if not entry.is_symlink():
+                names.add(entry.name)
+    except OSError:
+        return None
+    return names
+
+
+def _get_listing_for(dir_path,  # type: str
+                     n_paths    # type: int
+                     ):
+    # type: (...) -> Optional[Set[str]]
+    """
+    Returns the names of the entries of directory `dir_path`, to check `n_paths` paths located in it: the listing kept
+    from a previous call if the directory was not modified since then, otherwise a new listing if it is faster than
+    calling `os.path.exists` on each path. Returns None if the paths should be checked with `os.path.exists`.
+    """
+    if n_paths < _LISTING_MIN_PATHS:
+        return None
+    key = os.path.abspath(dir_path or os.curdir)
+    try:
+        mtime = os.stat(key).st_mtime
+    except OSError:
+        return None
+    kept = _DIR_LISTINGS.get(key)
+    if kept is not None and kept[0] == mtime:
+        return kept[1]
+    if kept is not None and n_paths < len(kept[1]) * _LISTING_MIN_RATIO:
+        return None
+
+    names = _get_dir_listing(key)
+    if names is not None:
+        _DIR_LISTINGS[key] = (mtime if time.time() - mtime > _RACY_DELAY else None, names)
+    return names
+
+
+def _split_posix(p  # type: str
+                 ):
+    """A faster `os.path.split` for posix paths (no trailing slashes removal in the directory part)"""
+    dir_path, sep, name = p.rpartition('/')
+    if sep and not dir_path:
+        # root
+        dir_path = '/'
+    return dir_path, name
+
+
+def find_missing_path(paths  # type: Iterable[str]
+                      ):
+    # type: (...) -> Optional[str]
+    """
+    Returns the first path in `paths` that does not exist, or None if they all exist. This is equivalent to checking
+    `os.path.exists` on each path, but the directories containing many of the paths are listed with `os.scandir`
+    instead, so that thousands of paths located in a few directories only cost a few system calls. The listings are
+    kept until `clear_dir_listings` is called, and only reused while the modification time of their directory is
+    unchanged, so that the files created or removed by the tasks that ran in the meantime are seen.
+
+    A path that is not found in the listing of its directory is confirmed with `os.path.exists`, so that
+    case-insensitive file systems and files created in the meantime are correctly handled.
+    """
+    paths = list(paths)
+    if len(paths) < _LISTING_MIN_PATHS or not hasattr(os, 'scandir'):
+        # no directory contains enough paths to be listed (or python < 3.5)
+        for p in paths:
+            if not os.path.exists(p):
+                return p
+        return None
+
+    split = _split_posix if os.sep == '/' and not os.altsep else os.path.split
+    paths = [p if isinstance(p, str) else os.fspath(p) for p in paths]
+    splits = [split(p) for p in paths]
+    counts = Counter(dir_path for dir_path, _ in splits)
+
+    listings = dict()  # type: Dict[str, Optional[Set[str]]]
+    for p, (dir_path, name) in zip(paths, splits):
+        if name:
+            try:
+                names = listings[dir_path]
+            except KeyError:
+                names = listings[dir_path] = _get_listing_for(dir_path, counts[dir_path])
+            if names is not None and name in names:
+                continue
+        # trailing separator, few paths in this directory, or not in the listing
+        if not os.path.exists(p):
+            return p
+    return None